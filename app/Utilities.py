@@ -6,21 +6,59 @@ import re
 import openpyxl
 import os
 import shutil
-from typing import Dict, Any
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+from functools import lru_cache
+from typing import Dict, Any, Callable, Optional
+
+from json_repair import extract_json, extract_json_objects
 # logger_setup.py
 import logging
 
 logger = logging.getLogger("myapp")
 logging.basicConfig(level=logging.INFO)
 
+# Extraction budget for CV PDFs (0 = unlimited). The prompt only needs the CV body,
+# not the publication lists some applicants append.
+DEFAULT_PDF_MAX_PAGES = 30
+DEFAULT_PDF_MAX_CHARS = 100000
+PDF_MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", DEFAULT_PDF_MAX_PAGES))
+PDF_MAX_CHARS = int(os.getenv("PDF_MAX_CHARS", DEFAULT_PDF_MAX_CHARS))
+
+# Separates the pages of extracted PDF text. A marker line rather than a form feed:
+# the text ends up in the UI, rule extraction and Excel cells, and Excel rejects
+# control characters.
+PAGE_BREAK = "\n\n--- page break ---\n\n"
 
 
+def iter_pdf_pages(uploaded_pdf, max_pages=PDF_MAX_PAGES, max_chars=PDF_MAX_CHARS):
+    """
+    Lazily yields the text of each non-empty PDF page, extracting every page once.
 
-def extract_text_from_pdf(uploaded_pdf):
-    """Extracts text from a PDF file."""
+    Stops after max_pages pages or max_chars characters (0 disables a limit);
+    the page that crosses max_chars is cut off at the limit.
+    """
     pdf_reader = PyPDF2.PdfReader(uploaded_pdf)
-    text = "\n".join([page.extract_text() for page in pdf_reader.pages if page.extract_text()])
-    return text
+    total_chars = 0
+    for index, page in enumerate(pdf_reader.pages):
+        if max_pages and index >= max_pages:
+            logger.info(f"PDF truncated after {max_pages} of {len(pdf_reader.pages)} pages")
+            return
+        if max_chars and total_chars >= max_chars:
+            return
+        text = page.extract_text()
+        if not text:
+            continue
+        if max_chars and total_chars + len(text) > max_chars:
+            logger.info(f"PDF truncated at {max_chars} characters on page {index + 1}")
+            yield text[:max_chars - total_chars]
+            return
+        total_chars += len(text)
+        yield text
+
+
+def extract_text_from_pdf(uploaded_pdf, max_pages=PDF_MAX_PAGES, max_chars=PDF_MAX_CHARS):
+    """Extracts text from a PDF file, pages separated by PAGE_BREAK."""
+    return PAGE_BREAK.join(iter_pdf_pages(uploaded_pdf, max_pages=max_pages, max_chars=max_chars))
 
 def extract_text_from_word(uploaded_word):
     """Extracts text from a Word document."""
@@ -28,30 +66,26 @@ def extract_text_from_word(uploaded_word):
     text = "\n".join([para.text for para in doc.paragraphs if para.text])
     return text
 
-def generate_prompt(pdf_text, word_text):
-    return f"""
-Return a single valid JSON object only. Do not include markdown, explanations, thinking steps, or code blocks.
-
-Extract the following fields from the applicant's CV and job application text:
+PROMPT_FIELDS = [
+    "Full-name",
+    "Date-of-birth",
+    "Gender",
+    "Nationality",
+    "Country-Contact",
+    "E-Mail",
+    "Phone-number",
+    "Holds-Master-Degree",
+    "Year-of-graduation-Master",
+    "Languages",
+    "Skills and competences",
+    "Research Experience",
+    "Holds-Doctoral-Degree",
+    "Fits mobility rules?",
+    "English Proficiency?",
+    "Visa required?"
+]
 
-- "Full-name"
-- "Date-of-birth"
-- "Gender"
-- "Nationality"
-- "Country-Contact"
-- "E-Mail"
-- "Phone-number"
-- "Holds-Master-Degree"
-- "Year-of-graduation-Master"
-- "Languages"
-- "Skills and competences"
-- "Research Experience"
-- "Holds-Doctoral-Degree"
-- "Fits mobility rules?"
-- "English Proficiency?"
-- "Visa required?"
-
-**Rules**:
+PROMPT_RULES = """**Rules**:
 - If a field is missing or unclear, write `"Unknown"`.
 - The values for the following must be `"Yes"` or `"No"`:
   - Holds-Master-Degree
@@ -61,34 +95,77 @@ Extract the following fields from the applicant's CV and job application text:
   - Visa required?
 - Set `"Visa required?"` to `"No"` if the nationality is from any EU country (e.g., France, Germany, etc.); otherwise, `"Yes"`.
 - Set `"English Proficiency?"` to `"Yes"` only if C1/C2, IELTS ≥ 6.5, or TOEFL ≥ 90 is mentioned.
-- Do **not** include any lists, nested objects, or numbered keys. All values must be strings.
+- Do **not** include any lists, nested objects, or numbered keys. All values must be strings."""
+
+
+def _prompt_field_list(fields):
+    return "\n".join(f'- "{field}"' for field in fields)
+
+
+def _prompt_json_template(fields, extra_fields=(), indent="  "):
+    lines = [f'{indent}"{name}": {value}' for name, value in extra_fields]
+    lines += [f'{indent}"{field}": "..."' for field in fields]
+    closing_indent = indent[:-2]
+    return f"{closing_indent}{{\n" + ",\n".join(lines) + f"\n{closing_indent}}}"
+
+
+# Static instructions, identical for every job. Sent as the system prompt, so the
+# server can reuse their processed prefix instead of re-reading them per job; a job
+# whose other fields are already known narrows the list in its own message instead.
+EXTRACTION_INSTRUCTIONS = f"""Return a single valid JSON object only. Do not include markdown, explanations, thinking steps, or code blocks.
+
+Extract the following fields from the applicant's CV and job application text:
+
+{_prompt_field_list(PROMPT_FIELDS)}
+
+If the message with the documents says which fields to return, return exactly those fields instead, in the structure it gives; the other fields are already known.
+
+{PROMPT_RULES}
 
 Return ONLY a JSON object in this structure:
 
-{{
-  "Full-name": "...",
-  "Date-of-birth": "...",
-  "Gender": "...",
-  "Nationality": "...",
-  "Country-Contact": "...",
-  "E-Mail": "...",
-  "Phone-number": "...",
-  "Holds-Master-Degree": "...",
-  "Year-of-graduation-Master": "...",
-  "Languages": "...",
-  "Skills and competences": "...",
-  "Research Experience": "...",
-  "Holds-Doctoral-Degree": "...",
-  "Fits mobility rules?": "...",
-  "English Proficiency?": "...",
-  "Visa required?": "..."
-}}
-
-Begin the response with `curly braces` and return nothing else.
+{_prompt_json_template(PROMPT_FIELDS)}
 
----
+Begin the response with `curly braces` and return nothing else."""
+
+BATCH_EXTRACTION_INSTRUCTIONS = f"""Return a single valid JSON array only. Do not include markdown, explanations, thinking steps, or code blocks.
 
-CV TEXT:
+You will get the documents of several applicants. Each applicant has a CV and a job application text.
+Extract the following fields for EACH applicant separately, using only that applicant's documents:
+
+{_prompt_field_list(PROMPT_FIELDS)}
+
+{PROMPT_RULES}
+
+Return ONLY a JSON array with one object per applicant, in the same order as the applicants,
+each in this structure ("Applicant" is the applicant's number as an integer):
+
+[
+{_prompt_json_template(PROMPT_FIELDS, extra_fields=[("Applicant", 1)], indent="    ")},
+  ...
+]
+
+Begin the response with `[` and return nothing else."""
+
+
+def generate_document_prompt(pdf_text, word_text, fields=None):
+    """
+    The per-job part of the prompt (to be sent with EXTRACTION_INSTRUCTIONS as system prompt).
+
+    Args:
+        fields (list, optional): Restricts the answer to these fields, when the others
+            are already known; this overrides the field list of the instructions
+    """
+    if fields is not None and list(fields) != PROMPT_FIELDS:
+        return f"""FIELDS TO RETURN: the other fields are already known. Instead of all fields listed in the instructions, return a JSON object with ONLY these {len(fields)} fields:
+{_prompt_field_list(fields)}
+
+in this structure:
+
+{_prompt_json_template(fields)}
+
+{generate_document_prompt(pdf_text, word_text)}"""
+    return f"""CV TEXT:
 {pdf_text}
 
 JOB APPLICATION TEXT:
@@ -96,45 +173,205 @@ JOB APPLICATION TEXT:
 """
 
 
+def generate_prompt(pdf_text, word_text, fields=None):
+    """Instructions and documents as one prompt."""
+    return f"""
+{EXTRACTION_INSTRUCTIONS}
+
+---
+
+{generate_document_prompt(pdf_text, word_text, fields)}"""
+
+
+# Characters of a rejected answer quoted back to the model when asking again
+JSON_RETRY_QUOTE_CHARS = 4000
+
+
+def generate_json_retry_prompt(document_prompt, response, error):
+    """
+    Follow-up to document_prompt whose answer held no valid JSON: quotes the end of
+    that answer (where a cut-off shows) with the parse error and asks again.
+    """
+    quoted = (response or "")[-JSON_RETRY_QUOTE_CHARS:]
+    return f"""{document_prompt}
+YOUR PREVIOUS ANSWER (last {len(quoted)} characters):
+{quoted}
+
+This answer could not be used: {error}.
+Answer again with the complete JSON object only."""
+
+
+def generate_batch_document_prompt(documents):
+    """
+    The per-batch part of a batch prompt (to be sent with BATCH_EXTRACTION_INSTRUCTIONS
+    as system prompt). The answer is a JSON array with one object per applicant, in
+    order, each tagged with its "Applicant" number.
+
+    Args:
+        documents (list): (pdf_text, word_text) tuples
+    """
+    applicants = "\n\n".join(
+        f"=== APPLICANT {number} ===\n\nCV TEXT:\n{pdf_text}\n\nJOB APPLICATION TEXT:\n{word_text}"
+        for number, (pdf_text, word_text) in enumerate(documents, 1)
+    )
+    return f"""There are {len(documents)} applicants, return exactly {len(documents)} objects.
+
+{applicants}
+"""
+
+
+def generate_batch_prompt(documents):
+    """Batch instructions and documents as one prompt (see generate_batch_document_prompt)."""
+    return f"""
+{BATCH_EXTRACTION_INSTRUCTIONS}
+
+---
+
+{generate_batch_document_prompt(documents)}"""
+
+
 def fix_trailing_commas(json_text):
     """Removes trailing commas before } or ] to fix JSON format."""
     return re.sub(r',\s*([\]}])', r'\1', json_text)
 
-def fix_unclosed_brackets(json_text):
-    """Ensures all opening { or [ have matching closing } or ]."""
-    open_curly, close_curly = json_text.count('{'), json_text.count('}')
-    open_square, close_square = json_text.count('['), json_text.count(']')
+def get_json(response_text):
+    """
+    Extracts the JSON object from an LLM response, repairing common defects
+    (see json_repair.extract_json). Returns the dict, or None if there is none.
+    """
+    extraction = extract_json(response_text)
+    if extraction.data is None:
+        logger.warning("No valid JSON object found in the response")
+    elif extraction.fixes:
+        logger.info(f"Repaired JSON in the response: {', '.join(extraction.fixes)}")
+    return extraction.data
 
-    json_text += '}' * (open_curly - close_curly)
-    json_text += ']' * (open_square - close_square)
-    
-    return json_text
 
-def get_json(response_text):
-    """Extracts and fixes JSON before parsing."""
-    # First try to find JSON inside code blocks
-    json_match = re.search(r'```(?:json)?\s*(\{(?:[^{}]*|\{.*?\})*\})\s*```', response_text, re.DOTALL)
+class IncrementalJSONDetector:
+    """
+    Detects the first complete top-level JSON object in streamed LLM output.
 
-    if not json_match:
-        # Fallback to finding raw JSON
-        json_match = re.search(r'\{(?:[^{}]*|\{.*?\})*\}', response_text, re.DOTALL)
+    Text inside ``<think>...</think>`` is skipped, braces inside JSON strings are
+    ignored, and a balanced candidate only counts once it parses (after removing
+    trailing commas). Each character is scanned once, so
+    feeding a whole response costs O(n).
+    """
+    THINK_OPEN = "<think>"
+    THINK_CLOSE = "</think>"
+
+    def __init__(self):
+        self.buffer = ""
+        self.result = None
+        self.end = None  # buffer index just past the detected object
+        self._pos = 0
+        self._in_think = False
+        self._start = None
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, chunk: str):
+        """Adds streamed text. Returns the parsed object once one is complete, else None."""
+        self.buffer += chunk
+        if self.result is not None:
+            return self.result
+
+        buf = self.buffer
+        i, n = self._pos, len(buf)
+        while i < n:
+            if self._in_think:
+                end = buf.find(self.THINK_CLOSE, i)
+                if end == -1:
+                    # Keep a tail so a closing tag split across chunks is still found.
+                    i = max(i, n - len(self.THINK_CLOSE) + 1)
+                    break
+                i = end + len(self.THINK_CLOSE)
+                self._in_think = False
+                continue
 
-    if json_match:
-        json_text = json_match.group(1) if '```' in json_match.group(0) else json_match.group(0)
+            ch = buf[i]
+            if self._start is None:
+                if ch == "<":
+                    if buf.startswith(self.THINK_OPEN, i):
+                        self._in_think = True
+                        i += len(self.THINK_OPEN)
+                        continue
+                    # A fixed-size window: slicing the rest of the buffer at every "<" is quadratic
+                    if self.THINK_OPEN.startswith(buf[i:i + len(self.THINK_OPEN)]):
+                        break  # possibly a split "<think>" tag, wait for more text
+                elif ch == "{":
+                    self._start, self._depth = i, 1
+                i += 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == "{":
+                self._depth += 1
+            elif ch == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    candidate = fix_trailing_commas(buf[self._start:i + 1])
+                    self._start = None
+                    try:
+                        parsed = json.loads(candidate)
+                    except json.JSONDecodeError:
+                        parsed = None
+                    if isinstance(parsed, dict):
+                        self.result = parsed
+                        i += 1
+                        self.end = i
+                        break
+            i += 1
+
+        self._pos = i
+        return self.result
+
+
+def get_json_array(response_text, expected):
+    """
+    Splits the response to a batch prompt (see generate_batch_prompt) into one
+    object per applicant.
 
-        #Apply fixes before parsing
-        json_text = fix_trailing_commas(json_text)
-        json_text = fix_unclosed_brackets(json_text)
+    Every top-level object is parsed on its own, with the same repairs as get_json
+    (see json_repair.extract_json_objects), so one malformed element does not lose
+    the others. Elements are placed by their "Applicant" number; untagged elements
+    are only placed by position when none are tagged and exactly the expected
+    number arrived (an element that does not parse keeps its position as None).
 
+    Returns:
+        list: expected entries, each the applicant's dict or None if it is missing or invalid
+    """
+    results = [None] * expected
+    found, untagged = 0, []
+    for extraction in extract_json_objects(response_text):
+        found += 1
+        element = extraction.data
+        if element is None:
+            logger.warning(f"Invalid element in the batch response: {extraction.error}")
+            untagged.append(None)
+            continue
+        if extraction.fixes:
+            logger.info(f"Repaired JSON in the batch response: {', '.join(extraction.fixes)}")
+        number = element.pop("Applicant", None)
         try:
-            return json.loads(json_text)
-        except json.JSONDecodeError as e:
-            print(f"Error decoding JSON: {e}")
-            print(f"Problematic snippet: {json_text[max(0, e.pos - 40): min(len(json_text), e.pos + 40)]}")
-            return None
-    else:
-        print("No valid JSON block found in the response.")
-        return None
+            index = int(number) - 1
+        except (TypeError, ValueError):
+            untagged.append(element)
+            continue
+        if 0 <= index < expected and results[index] is None:
+            results[index] = element
+
+    if untagged and len(untagged) == found == expected:
+        results = untagged
+    return results
 
 
 def flatten_json(nested_json, parent_key='', sep='_'):
@@ -185,6 +422,16 @@ def extract_combined_headers(ws, header_rows=[4, 5, 6]):
         headers.append(" ".join(combined).strip() if combined else None)
     return headers
 
+# Minimum scores of English tests that count as proficient
+ENGLISH_TEST_THRESHOLDS = {
+    'ielts': 6.5,
+    'toefl': 90,
+    'pte': 61,
+    'duolingo': 110,
+    'cambridge': 180,
+    'cae': 180
+}
+
 def check_english_proficiency_from_text(text):
     if not text:
         return "Filled manually"
@@ -194,16 +441,7 @@ def check_english_proficiency_from_text(text):
     if "c1" in text or "c2" in text:
         return "Yes"
 
-    patterns = {
-        'ielts': 6.5,
-        'toefl': 90,
-        'pte': 61,
-        'duolingo': 110,
-        'cambridge': 180,
-        'cae': 180
-    }
-
-    for exam, threshold in patterns.items():
+    for exam, threshold in ENGLISH_TEST_THRESHOLDS.items():
         match = re.search(rf"{exam}[^0-9]*([\d\.]+)", text)
         if match:
             try:
@@ -296,40 +534,26 @@ field_map = {
 
 # --- Excel Injection Function ---
 
-def inject_standardized_json_to_excel(json_data: Dict[str, Any], template_path: str, output_path: str) -> None:
-    """
-    Injects standardized JSON data into an Excel file, appending to existing data.
-    
-    This function takes JSON data extracted from CVs and application forms, standardizes it,
-    and appends it to an existing Excel file. If the output file doesn't exist, it creates
-    a new one from the template.
-    
-    Args:
-        json_data (Dict[str, Any]): The JSON data to inject, containing applicant information
-        template_path (str): Path to the Excel template file
-        output_path (str): Path where the Excel file should be saved/appended to
-        
-    Raises:
-        FileNotFoundError: If the template file doesn't exist
-        ValueError: If the JSON data is invalid or missing required fields
-        Exception: For any other errors during Excel operations
-    """
-    # If output file doesn't exist, copy from template
-    if not os.path.exists(output_path):
-        if not os.path.exists(template_path):
-            raise FileNotFoundError(f"Template file not found at {template_path}")
-        shutil.copy(template_path, output_path)
-        logger.info(f"Created new output file from template at: {output_path}")
+# Data rows in the template start below the three header rows (4-6)
+FIRST_DATA_ROW = 7
 
-    try:
-        # Load the workbook
-        wb = openpyxl.load_workbook(output_path)
-        ws = wb.active
 
-        # Get headers
-        headers = extract_combined_headers(ws)
-        normalized_headers = [normalize_text(h) if h else "" for h in headers]
+def find_next_empty_row(ws, start_row=FIRST_DATA_ROW):
+    """Returns the first row at or below start_row whose first column is empty."""
+    row = start_row
+    while ws.cell(row=row, column=1).value:
+        row += 1
+    return row
+
+
+MANUAL_VALUE = "Filled manually"
+
 
+class _RowContext:
+    """Per-record values shared by all column extractors."""
+    __slots__ = ("flat_json", "first_name", "last_name", "language_info")
+
+    def __init__(self, json_data: Dict[str, Any]):
         # Flatten the JSON data
         flat_json = {}
         for k, v in json_data.items():
@@ -338,65 +562,174 @@ def inject_standardized_json_to_excel(json_data: Dict[str, Any], template_path:
                     flat_json[f"{normalize_text(k)}_{normalize_text(subk)}"] = subv
             else:
                 flat_json[normalize_text(k)] = v
+        self.flat_json = flat_json
 
         # Extract name information
         full_name = json_data.get("Full-name", "") or json_data.get("Name", "")
         if not full_name:
             raise ValueError("Missing required field: Full-name")
-        first_name, last_name = split_full_name(full_name)
+        self.first_name, self.last_name = split_full_name(full_name)
 
         # Extract language information
         language_info = json_data.get("Languages", "")
         if isinstance(language_info, dict):
             language_info = " ".join(language_info.values())
+        self.language_info = language_info
 
-        # Find the next empty row
-        row = 7  # Start after headers
-        while ws.cell(row=row, column=1).value:
-            row += 1
 
-        # Write data to each column
-        for col_idx, header in enumerate(headers, 1):
-            if not header:
-                ws.cell(row=row, column=col_idx, value="Filled manually")
-                continue
+# Header fragments with a dedicated handler, checked in order before field_map aliases
+SPECIAL_COLUMN_HANDLERS = [
+    ("first name", lambda row: row.first_name),
+    ("last name", lambda row: row.last_name),
+    ("english proficiency", lambda row: check_english_proficiency_from_text(row.language_info)),
+    ("holds/will hold a master degree", lambda row: detect_master_degree(row.flat_json)),
+    ("holds doctoral degree?", lambda row: detect_doctoral_degree(row.flat_json)),
+    ("visa required?", lambda row: detect_visa_required(row.flat_json)),
+]
 
-            norm_header = normalize_text(header)
-            value = "Filled manually"
-
-            # Map fields based on header
-            for expected, aliases in field_map.items():
-                expected_norm = normalize_text(expected)
-                if expected_norm in norm_header:
-                    for alias in aliases:
-                        alias = normalize_text(alias)
-                        for flat_key, flat_val in flat_json.items():
-                            if alias in flat_key:
-                                value = flat_val
-                                break
-                        if value != "Filled manually":
-                            break
+
+def _alias_extractor(aliases):
+    """Returns the first flattened value whose key contains one of the (normalized) aliases."""
+    def extract(row):
+        value = MANUAL_VALUE
+        for alias in aliases:
+            for flat_key, flat_val in row.flat_json.items():
+                if alias in flat_key:
+                    value = flat_val
                     break
+            if value != MANUAL_VALUE:
+                break
+        return value
+    return extract
+
 
-            # Special handling for specific fields
-            if "first name" in norm_header:
-                value = first_name
-            elif "last name" in norm_header:
-                value = last_name
-            elif "english proficiency" in norm_header:
-                value = check_english_proficiency_from_text(language_info)
-            elif "holds/will hold a master degree" in norm_header:
-                value = detect_master_degree(flat_json)
-            elif "holds doctoral degree?" in norm_header:
-                value = detect_doctoral_degree(flat_json)
-            elif "visa required?" in norm_header:
-                value = detect_visa_required(flat_json)
+def _manual_extractor(row):
+    return MANUAL_VALUE
 
+
+class TemplatePlan:
+    """
+    Column-to-field mapping compiled once from the template headers.
+
+    Every column is resolved up front to one extractor (a special handler, a
+    pre-normalized alias list, or "Filled manually"), so building a row is a
+    single pass over the columns.
+    """
+
+    def __init__(self, headers):
+        self.headers = list(headers)
+        self.extractors = [self._compile_column(header) for header in self.headers]
+
+    @staticmethod
+    def _compile_column(header: Optional[str]) -> Callable[[_RowContext], Any]:
+        if not header:
+            return _manual_extractor
+
+        norm_header = normalize_text(header)
+        for fragment, handler in SPECIAL_COLUMN_HANDLERS:
+            if fragment in norm_header:
+                return handler
+
+        for expected, aliases in field_map.items():
+            if normalize_text(expected) in norm_header:
+                return _alias_extractor(tuple(normalize_text(alias) for alias in aliases))
+        return _manual_extractor
+
+    def build_row(self, json_data: Dict[str, Any]) -> list:
+        """
+        Maps one applicant's JSON data onto the template columns.
+
+        Control characters Excel cannot store (e.g. form feeds from page breaks)
+        are removed, so a row openpyxl would reject never reaches the export.
+
+        Raises:
+            ValueError: If the JSON data is missing the applicant's name
+        """
+        row = _RowContext(json_data)
+        values = []
+        for extract in self.extractors:
+            value = extract(row)
             # Handle list values
             if isinstance(value, list):
                 value = "; ".join(map(str, value))
+            if isinstance(value, str):
+                value = ILLEGAL_CHARACTERS_RE.sub("", value)
+            values.append(value)
+        return values
+
+
+@lru_cache(maxsize=16)
+def compile_template_plan(headers: tuple) -> TemplatePlan:
+    """Returns the (cached) plan for a tuple of combined headers."""
+    return TemplatePlan(headers)
+
+
+@lru_cache(maxsize=16)
+def _load_template_plan(template_path: str, mtime: float) -> TemplatePlan:
+    wb = openpyxl.load_workbook(template_path)
+    return compile_template_plan(tuple(extract_combined_headers(wb.active)))
+
+
+def get_template_plan(template_path: str) -> TemplatePlan:
+    """Returns the plan for an Excel template, recompiled only when the file changes."""
+    return _load_template_plan(os.path.abspath(template_path), os.path.getmtime(template_path))
+
+
+def build_excel_row(json_data: Dict[str, Any], headers) -> list:
+    """
+    Maps one applicant's JSON data onto the template columns.
+
+    Args:
+        json_data (Dict[str, Any]): The JSON data extracted for one applicant
+        headers (list): Combined header text per column, as returned by extract_combined_headers
+
+    Returns:
+        list: One cell value per column
+
+    Raises:
+        ValueError: If the JSON data is missing the applicant's name
+    """
+    return compile_template_plan(tuple(headers)).build_row(json_data)
+
+
+def inject_standardized_json_to_excel(json_data: Dict[str, Any], template_path: str, output_path: str) -> None:
+    """
+    Injects standardized JSON data into an Excel file, appending to existing data.
+    
+    This function takes JSON data extracted from CVs and application forms, standardizes it,
+    and appends it to an existing Excel file. If the output file doesn't exist, it creates
+    a new one from the template. It loads and saves the whole workbook for one record;
+    use excel_export.ExcelBatchWriter to append many records per save.
+    
+    Args:
+        json_data (Dict[str, Any]): The JSON data to inject, containing applicant information
+        template_path (str): Path to the Excel template file
+        output_path (str): Path where the Excel file should be saved/appended to
+        
+    Raises:
+        FileNotFoundError: If the template file doesn't exist
+        ValueError: If the JSON data is invalid or missing required fields
+        Exception: For any other errors during Excel operations
+    """
+    # If output file doesn't exist, copy from template
+    if not os.path.exists(output_path):
+        if not os.path.exists(template_path):
+            raise FileNotFoundError(f"Template file not found at {template_path}")
+        shutil.copy(template_path, output_path)
+        logger.info(f"Created new output file from template at: {output_path}")
+
+    try:
+        # Load the workbook
+        wb = openpyxl.load_workbook(output_path)
+        ws = wb.active
+
+        # Build the row before touching the sheet
+        headers = extract_combined_headers(ws)
+        values = build_excel_row(json_data, headers)
 
-            # Write the value to the cell
+        # Find the next empty row and write data to each column
+        row = find_next_empty_row(ws)
+        for col_idx, value in enumerate(values, 1):
             ws.cell(row=row, column=col_idx, value=value)
 
         # Save the workbook
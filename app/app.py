@@ -1,52 +1,93 @@
 import streamlit as st
 from datetime import datetime
-import requests
 import os
 import json
-import threading
-from dotenv import load_dotenv
-from Utilities import (
-    extract_text_from_pdf,
-    extract_text_from_word,
-    
-)
+import time
+import pandas as pd
+from extraction_pool import extract_documents_parallel, extract_document_text_cached
+from metrics import STAGES, summarize_timings, format_eta
+from pairing import pair_documents
+from upload_store import spool_upload, prune_uploads
 
 
 import sys, os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
-# Initialize database manager
-from shared_database import db
+from shared_database import get_db
+from llm_client import get_llm_client
+from Utilities import get_template_plan
+from worker import start_embedded_worker
+from database.Status import TEMPLATE_EXCEL_PATH
+from database.db_manager import QueueFullError, FAILED_STATUSES
+
+
+# Long-lived objects are created once per server process and shared by every
+# session and rerun; a rerun itself only renders.
+@st.cache_resource
+def get_database():
+    return get_db()
 
 
+@st.cache_resource
+def get_llm():
+    """The HTTP client the embedded worker also uses (one pooled session)."""
+    return get_llm_client()
 
-# Load environment variables from .env file
-load_dotenv()
 
+@st.cache_resource
+def get_worker():
+    """
+    The embedded background worker. Set EMBEDDED_WORKER=0 when running dedicated
+    `python worker.py` processes instead.
+    """
+    if os.getenv("EMBEDDED_WORKER", "1") != "1":
+        return None
+    return start_embedded_worker()
 
-# Default Ollama API URL if not set in .env
-DEFAULT_API_URL = "http://localhost:11434/api/generate"
-DEFAULT_MODEL = "deepseek-r1:14b"  # Using mistral model
 
-# Load Ollama API URL from environment variable or use default
-OLLAMA_API_URL = os.getenv("OLLAMA_API_URL", DEFAULT_API_URL)
-OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", DEFAULT_MODEL)
+@st.cache_resource
+def get_export_plan():
+    """Compiles the Excel template's column plan before the first job needs it."""
+    return get_template_plan(TEMPLATE_EXCEL_PATH)
+
+
+db = get_database()
+llm = get_llm()
+worker = get_worker()
+get_export_plan()
 
 # Display model information on the side
-st.sidebar.info(f"Using model: {OLLAMA_MODEL}")
-st.sidebar.info(f"API endpoint: {OLLAMA_API_URL}")
+st.sidebar.info(f"Using model: {llm.model}")
+st.sidebar.info(f"API endpoint: {llm.api_url}")
+
+# Queued jobs are scheduled fairly between submitters; without a name each
+# browser session counts as its own submitter
+if "session_submitter" not in st.session_state:
+    st.session_state.session_submitter = f"session-{os.urandom(3).hex()}"
+submitter = st.sidebar.text_input("Your name (for fair queueing)").strip() or st.session_state.session_submitter
+
+if "uploads_pruned" not in st.session_state:
+    prune_uploads()
+    st.session_state.uploads_pruned = True
 
-### Create extractions directory if it doesn't exist for the extracted files we can make one for each application
-###with full name
 
-extractions_dir = os.path.join(os.path.dirname(__file__), "extractions")
-os.makedirs(extractions_dir, exist_ok=True)
+def spooled_upload(uploaded_file):
+    """Copies an upload to the on-disk store once per session (keyed by Streamlit's file id)."""
+    spooled = st.session_state.setdefault("spooled_uploads", {})
+    stored = spooled.get(uploaded_file.file_id)
+    if stored is None or not os.path.exists(stored.path):
+        stored = spool_upload(uploaded_file, uploaded_file.name)
+        spooled[uploaded_file.file_id] = stored
+    return stored
 
-from database.Status import Status
 
-# Start background processor in a separate thread using the Status class
-status = Status()
-processor_thread = threading.Thread(target=status.process_all_pending_jobs, daemon=True)
-processor_thread.start()
+def extracted_text(stored):
+    """(text, extraction seconds) of a spooled upload, extracted once per file hash per session."""
+    texts = st.session_state.setdefault("extracted_texts", {})
+    if stored.file_hash not in texts:
+        started = time.perf_counter()
+        text = extract_document_text_cached(stored.name, stored, db)
+        texts[stored.file_hash] = (text, time.perf_counter() - started)
+    return texts[stored.file_hash]
 
 
 unique_key = "download_button_" + str(datetime.now().strftime("%Y%m%d%H%M%S"))
@@ -61,7 +102,7 @@ st.download_button(
 )
 
 # Add tabs for different functionalities
-tab1, tab2, tab3 = st.tabs(["Upload Documents", "View Previous Extractions","Bulk Upload"])
+tab1, tab2, tab3, tab4 = st.tabs(["Upload Documents", "View Previous Extractions","Bulk Upload", "Performance"])
 with tab1:
     # File uploaders for PDF and Word files
     pdf_file = st.file_uploader("Upload a CV (PDF or Word)", type=["pdf", "docx"])
@@ -71,17 +112,15 @@ with tab1:
     st.caption("You can paste the job application instead of uploading a Word document.")
 
     if pdf_file and (word_file or manual_word_text):
-        # Extract text from job application
-        word_text = extract_text_from_word(word_file) if word_file else manual_word_text
+        # Extract text from job application (preview and submit share one extraction)
+        word_text, word_seconds = extracted_text(spooled_upload(word_file)) if word_file else (manual_word_text, 0.0)
 
         # Extract text based on CV file type
-        if pdf_file.name.endswith(".pdf"):
-            pdf_text = extract_text_from_pdf(pdf_file)
-        elif pdf_file.name.endswith(".docx"):
-            pdf_text = extract_text_from_word(pdf_file)
+        if pdf_file.name.endswith(".pdf") or pdf_file.name.endswith(".docx"):
+            pdf_text, pdf_seconds = extracted_text(spooled_upload(pdf_file))
         else:
             st.error("Unsupported CV file type. Please upload a PDF or Word document.")
-            pdf_text = ""
+            pdf_text, pdf_seconds = "", 0.0
 
         with st.expander("View Extracted Text"):
             st.text_area("PDF Text", pdf_text, height=200)
@@ -89,13 +128,9 @@ with tab1:
 
         if st.button("Submit Job for Processing"):
             try:
-                with st.spinner("Extracting and validating text..."):
-                    # Extract text again for safety (in case of refresh or button hit early)
-                    word_text = extract_text_from_word(word_file) if word_file else manual_word_text
-                    pdf_text = extract_text_from_pdf(pdf_file) if pdf_file.name.endswith(".pdf") else extract_text_from_word(pdf_file)
-
-                    # Debugging aid
-                    print(f"[DEBUG] PDF text length: {len(pdf_text)} | Word text length: {len(word_text)}")
+                with st.spinner("Validating text..."):
+                    # The texts extracted for the preview above
+                    extraction_seconds = word_seconds + pdf_seconds
 
                     # Validate content
                     if not pdf_text.strip():
@@ -110,10 +145,19 @@ with tab1:
                         pdf_file.name,
                         word_file.name if word_file else "manual_input.txt",
                         pdf_text,
-                        word_text
+                        word_text,
+                        stage_timings={"text_extraction": extraction_seconds},
+                        submitter=submitter
                     )
+                    if worker:
+                        worker.notify()
                     st.success(f"Job {job_id} added to the queue! It will be processed in the background.")
+                    place, eta = db.get_queue_etas([job_id]).get(job_id, (None, None))
+                    if place:
+                        st.caption(f"Place in queue: {place}, estimated to finish in {format_eta(eta)}")
                     st.info("Check the 'View Previous Extractions' tab for updates on processing status.")
+            except QueueFullError as e:
+                st.warning(f"{e}. Your files are kept for this session; submit again later.")
             except Exception as e:
                 st.error(f"Error adding job to queue: {str(e)}")
     else:
@@ -130,19 +174,32 @@ with tab2:
     if st.button("↻ Refresh"):
         st.rerun()
 
-    # Fetch all processed jobs from the database
-    extractions = db.get_all_extractions()
+    filter_col, search_col, size_col = st.columns([1, 2, 1])
+    status_filter = filter_col.selectbox("Status", ["All", "pending", "processing", "done", "failed", "dead_letter"])
+    search = search_col.text_input("Search file names")
+    page_size = size_col.selectbox("Per page", [10, 25, 50, 100], index=1)
+
+    status_arg = None if status_filter == "All" else status_filter
+    total = db.count_extractions(status=status_arg, search=search)
+    page_count = max(1, -(-total // page_size))
+    page = st.number_input("Page", min_value=1, max_value=page_count, value=1, step=1)
+    offset = (page - 1) * page_size
+
+    # Fetch only the summary columns of the current page
+    extractions = db.list_extractions(limit=page_size, offset=offset, status=status_arg, search=search)
+    stage_timings = db.get_stage_timings(extraction["id"] for extraction in extractions)
+    queue_etas = db.get_queue_etas(
+        [extraction["id"] for extraction in extractions if extraction["status"] == "pending"])
 
     if not extractions:
         st.info("No previous extractions found.")
     else:
+        st.caption(f"Showing {offset + 1}-{offset + len(extractions)} of {total}")
         for extraction in extractions:
             job_id = extraction.get("id")
             pdf_filename = extraction.get("pdf_filename")
             word_filename = extraction.get("word_filename")
             status = extraction.get("status")
-            excel_file_path = extraction.get("excel_file_path")
-            debug_output = extraction.get("debug_output")
             timestamp = extraction.get("timestamp")
 
             # Create a unique key for each expander
@@ -155,64 +212,91 @@ with tab2:
                     "pending": "🟡",
                     "processing": "🔵",
                     "done": "🟢",
-                    "failed": "🔴"
+                    "failed": "🔴",
+                    "dead_letter": "⚫"
                 }.get(status, "⚪")
                 st.write(f"**Status:** {status_color} `{status}`")
-
-                if status == "done" and excel_file_path and os.path.exists(excel_file_path):
-                    with open(excel_file_path, "rb") as f:
-                        if status == "done" and debug_output:
-                            try:
-                                debug_data = json.loads(debug_output)
-
-                                # First agent download
-                                if "raw_response" in debug_data:
-                                    st.text_area("First LLM Response (Initial Extraction)", debug_data["raw_response"], height=200)
-                                    st.download_button(
-                                        label="⬇ Download First Agent Response",
-                                        data=debug_data["raw_response"],
-                                        file_name=f"job_{job_id}_first_agent.json",
-                                        mime="application/json",
-                                        key=f"download_first_{job_id}"
-                                    )
-
-                                # Second agent download
-                                if "refined_response" in debug_data:
-                                    st.text_area("Second LLM Response (Refined)", debug_data["refined_response"], height=200)
-                                    st.download_button(
-                                        label="⬇ Download Second Agent Response",
-                                        data=debug_data["refined_response"],
-                                        file_name=f"job_{job_id}_second_agent.json",
-                                        mime="application/json",
-                                        key=f"download_second_{job_id}"
-                                    )
-
-                            except Exception as e:
-                                st.warning(f"Failed to load LLM debug data: {e}")
-
-
-                       
-
-                        # Show raw LLM response for debugging
+                if extraction.get("retry_at") and status == "pending":
+                    st.caption(f"Attempt {extraction['attempts']} failed, retry scheduled at {extraction['retry_at'][:19]} UTC")
+                if job_id in queue_etas:
+                    place, eta = queue_etas[job_id]
+                    st.caption(f"Place in queue: {place}, estimated to finish in {format_eta(eta)}")
+                if extraction.get("prompt_tokens"):
+                    st.caption(f"Prompt: ~{extraction['prompt_tokens']} tokens "
+                               f"({extraction.get('prompt_tokens_saved') or 0} saved by compaction)")
+                if job_id in stage_timings:
+                    job_timings = stage_timings[job_id]
+                    st.caption("Stages: " + ", ".join(
+                        f"{stage} {job_timings[stage] / 1000:.2f}s" for stage in STAGES if stage in job_timings))
+
+                # Debug payloads hold full LLM responses; only load them when asked for
+                debug_output = None
+                if status == "processing" or (
+                        status in ("done",) + FAILED_STATUSES and st.toggle("Show LLM output", key=f"show_debug_{job_id}")):
+                    debug_output = db.get_debug_output(job_id)
+
+                if status == "done":
                     if debug_output:
                         try:
                             debug_data = json.loads(debug_output)
+
+                            # First agent download
                             if "raw_response" in debug_data:
-                                    st.text_area("LLM Output", debug_data["raw_response"], height=1000)
+                                st.text_area("First LLM Response (Initial Extraction)", debug_data["raw_response"],
+                                             height=200, key=f"first_output_{job_id}")
+                                st.download_button(
+                                    label="⬇ Download First Agent Response",
+                                    data=debug_data["raw_response"],
+                                    file_name=f"job_{job_id}_first_agent.json",
+                                    mime="application/json",
+                                    key=f"download_first_{job_id}"
+                                )
+
+                            # Second agent download
+                            if "refined_response" in debug_data:
+                                st.text_area("Second LLM Response (Refined)", debug_data["refined_response"],
+                                             height=200, key=f"second_output_{job_id}")
+                                st.download_button(
+                                    label="⬇ Download Second Agent Response",
+                                    data=debug_data["refined_response"],
+                                    file_name=f"job_{job_id}_second_agent.json",
+                                    mime="application/json",
+                                    key=f"download_second_{job_id}"
+                                )
+
                         except Exception as e:
-                            st.warning(f"Failed to display raw response: {e}")
-                elif status == "failed" and debug_output:
-                    try:
-                        error_msg = json.loads(debug_output).get("error", "Unknown error")
-                        st.error(f"Error: {error_msg}")
-                    except:
-                        st.error(f"Error: {debug_output}")
+                            st.warning(f"Failed to load LLM debug data: {e}")
+                elif status in FAILED_STATUSES:
+                    if debug_output:
+                        try:
+                            debug_data = json.loads(debug_output)
+                            st.error(f"Error: {debug_data.get('error', 'Unknown error')}")
+                            if debug_data.get("raw_response"):
+                                st.text_area("Last LLM Output", debug_data["raw_response"], height=300,
+                                             key=f"failed_output_{job_id}")
+                        except Exception:
+                            st.error(f"Error: {debug_output}")
+                        for attempt in db.get_attempt_log(job_id):
+                            st.caption(f"Attempt {attempt['attempt']} ({attempt['at']} UTC): {attempt['error']}")
+                    # The stored texts are reused, so nothing has to be uploaded again
+                    if st.button("↻ Retry", key=f"retry_{job_id}"):
+                        if db.requeue_jobs([job_id]) and worker:
+                            worker.notify()
+                        st.rerun()
                 elif status in ["pending", "processing"]:
                     st.info("Job is being processed. Please wait or refresh to check the status.")
+                    if status == "processing" and debug_output:
+                        try:
+                            progress = json.loads(debug_output)
+                            if "partial_response" in progress:
+                                st.caption(f"Receiving LLM response: {progress.get('received_chars', 0)} characters so far")
+                                st.text_area("Partial LLM Output", progress["partial_response"], height=200, key=f"partial_{job_id}")
+                        except Exception:
+                            pass
 
 with tab3:
     st.header("Bulk Upload (Multiple CV + Application Pairs)")
-    st.caption("Upload files in pairs: one CV (.pdf/.docx) and one application (.docx). Each pair will be processed as one job.")
+    st.caption("Upload CVs (.pdf/.docx) and applications (.docx) in any order. Files are paired by name (e.g. Jane_Doe_CV.pdf + Jane_Doe_Application.docx); each pair is processed as one job.")
 
     uploaded_files = st.file_uploader("Upload Files (PDF + DOCX)", type=["pdf", "docx"], accept_multiple_files=True)
 
@@ -220,46 +304,126 @@ with tab3:
         if not uploaded_files or len(uploaded_files) < 2:
             st.warning("Please upload at least two files (one CV and one application).")
         else:
-            submitted = 0
-            unmatched = []
-
-            # Group files in sets of two
-            for i in range(0, len(uploaded_files), 2):
-                pair = uploaded_files[i:i+2]
-                if len(pair) != 2:
-                    unmatched.append(pair[0].name)
+            # Pair each CV with its application by file name, not upload order
+            pairing = pair_documents([f.name for f in uploaded_files])
+            pairs = [(uploaded_files[cv_index], uploaded_files[app_index]) for cv_index, app_index in pairing.pairs]
+            unmatched = [uploaded_files[index].name for index in pairing.unmatched]
+
+            # Spool the files to disk and parse the ones not seen this session in parallel
+            # (children read them from disk), then queue every complete pair in one transaction
+            texts = {}
+            extraction_seconds = {}
+            memo = st.session_state.setdefault("extracted_texts", {})
+            documents = []
+            file_hashes = {}
+            for index, (cv_file, app_file) in enumerate(pairs):
+                for role, uploaded_file in (("cv", cv_file), ("application", app_file)):
+                    stored = spooled_upload(uploaded_file)
+                    if stored.file_hash in memo:
+                        texts[(index, role)], seconds = memo[stored.file_hash]
+                        extraction_seconds[index] = extraction_seconds.get(index, 0.0) + seconds
+                    else:
+                        file_hashes[(index, role)] = stored.file_hash
+                        documents.append(((index, role), uploaded_file.name, stored))
+
+            failed_pairs = set()
+            progress = st.progress(0.0, text="Extracting text...")
+            for done, result in enumerate(extract_documents_parallel(documents, store=db), 1):
+                progress.progress(done / len(documents), text=f"Extracted {done}/{len(documents)} files")
+                index, role = result.key
+                if index in failed_pairs:
                     continue
-
-                # Identify CV and application
-                cv_file = next((f for f in pair if f.name.lower().endswith(".pdf") or f.name.lower().endswith(".docx")), None)
-                app_file = next((f for f in pair if f.name.lower().endswith(".docx")), None)
-
-                if not cv_file or not app_file:
-                    unmatched.extend([f.name for f in pair])
+                if result.error:
+                    failed_pairs.add(index)
+                    cv_file, app_file = pairs[index]
+                    st.error(f"Failed to process files: {cv_file.name}, {app_file.name}\nReason: {result.error}")
                     continue
+                texts[result.key] = result.text
+                memo[file_hashes[result.key]] = (result.text, result.seconds)
+                extraction_seconds[index] = extraction_seconds.get(index, 0.0) + result.seconds
 
-                try:
-                    pdf_text = extract_text_from_pdf(cv_file) if cv_file.name.endswith(".pdf") else extract_text_from_word(cv_file)
-                    word_text = extract_text_from_word(app_file)
-
-                    db.add_job(
-                        pdf_filename=cv_file.name,
-                        word_filename=app_file.name,
-                        pdf_content=pdf_text,
-                        word_content=word_text
-                    )
-
-                    preview = word_text[:40].replace("\n", " ") + ("..." if len(word_text) > 40 else "")
-                    st.success(f"Job submitted: {cv_file.name} + {app_file.name}\nPreview: {preview}")
-                    submitted += 1
-                except Exception as e:
-                    st.error(f"Failed to process files: {cv_file.name}, {app_file.name}\nReason: {e}")
-                    continue
+            ready = [index for index in range(len(pairs)) if index not in failed_pairs]
+            try:
+                job_ids = db.add_jobs([
+                    {
+                        "pdf_filename": pairs[index][0].name,
+                        "word_filename": pairs[index][1].name,
+                        "pdf_content": texts[(index, "cv")],
+                        "word_content": texts[(index, "application")],
+                        "stage_timings": {"text_extraction": extraction_seconds.get(index, 0.0)}
+                    }
+                    for index in ready
+                ], submitter=submitter) if ready else []
+            except QueueFullError as e:
+                # Texts stay memoized for this session, so a later retry does not re-parse
+                st.warning(f"{e}. No jobs were added; submit again later.")
+                job_ids, ready = [], []
+
+            if ready and not job_ids:
+                st.error("Failed to add the jobs to the queue.")
+            for index in ready[:len(job_ids)]:
+                cv_file, app_file = pairs[index]
+                word_text = texts[(index, "application")]
+                preview = word_text[:40].replace("\n", " ") + ("..." if len(word_text) > 40 else "")
+                st.success(f"Job submitted: {cv_file.name} + {app_file.name}\nPreview: {preview}")
+            submitted = len(job_ids)
 
             if unmatched:
                 st.warning(f"Some files were skipped: {', '.join(unmatched)}")
 
             if submitted:
-                st.info(f"{submitted} job(s) added to the queue.")
+                if worker:
+                    worker.notify()
+                last_place, last_eta = db.get_queue_etas([job_ids[-1]]).get(job_ids[-1], (None, None))
+                eta_note = f" The last one is estimated to finish in {format_eta(last_eta)}." if last_place else ""
+                st.info(f"{submitted} job(s) added to the queue.{eta_note}")
             else:
-                st.warning("No valid file pairs were submitted.")
\ No newline at end of file
+                st.warning("No valid file pairs were submitted.")
+
+with tab4:
+    st.header("Throughput and Latency")
+    st.caption("Measured by every worker sharing this database. Prometheus metrics: `python metrics_server.py`.")
+
+    if st.button("↻ Refresh", key="refresh_performance"):
+        st.rerun()
+
+    window_label = st.selectbox("Window", ["Last 15 minutes", "Last hour", "Last 24 hours"], index=1)
+    window_minutes = {"Last 15 minutes": 15, "Last hour": 60, "Last 24 hours": 1440}[window_label]
+
+    status_counts = db.count_jobs_by_status()
+    finished = pd.DataFrame(db.get_finished_jobs(window_minutes),
+                            columns=["id", "finished_at", "status", "duration_ms"])
+    done = finished[finished["status"] == "done"]
+
+    queue_col, done_col, failed_col, rate_col, latency_col = st.columns(5)
+    queue_col.metric("Queued / running", f"{status_counts.get('pending', 0)} / {status_counts.get('processing', 0)}")
+    done_col.metric("Done", len(done))
+    failed_col.metric("Failed", int(finished["status"].isin(FAILED_STATUSES).sum()))
+    rate_col.metric("Jobs per minute", f"{len(done) / window_minutes:.2f}")
+    if done["duration_ms"].notna().any():
+        durations = done["duration_ms"].dropna() / 1000
+        latency_col.metric("Job time p50 / p95", f"{durations.median():.1f}s / {durations.quantile(0.95):.1f}s")
+    else:
+        latency_col.metric("Job time p50 / p95", "-")
+    queue_etas = db.get_queue_etas()
+    if queue_etas:
+        _, drain_eta = max(queue_etas.values(), key=lambda entry: entry[0])
+        st.caption(f"The current queue is estimated to be worked off in {format_eta(drain_eta)}.")
+
+    if not finished.empty:
+        finished["finished_at"] = pd.to_datetime(finished["finished_at"])
+        per_minute = pd.crosstab(finished["finished_at"].dt.floor("min"), finished["status"])
+        st.subheader("Finished jobs per minute (UTC)")
+        st.line_chart(per_minute)
+
+    stage_summary = summarize_timings(db.get_recent_stage_timings(window_minutes))
+    if stage_summary:
+        st.subheader("Time per stage")
+        stages = pd.DataFrame(stage_summary).set_index("stage")
+        st.bar_chart(stages["total_ms"] / 1000)
+        st.dataframe(stages.rename(columns={
+            "count": "Jobs", "mean_ms": "Mean (ms)", "median_ms": "Median (ms)",
+            "p95_ms": "p95 (ms)", "total_ms": "Total (ms)"
+        }), use_container_width=True)
+    else:
+        st.info("No stage timings recorded in this window.")
@@ -1,23 +1,46 @@
 import os
 import sys
+import json
 import time
+import random
 import shutil
-import requests
 import logging
+import threading
 from dotenv import load_dotenv
 from datetime import datetime
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Callable, List, Tuple
+from concurrent.futures import ThreadPoolExecutor
 
 from Utilities import (
+    PROMPT_FIELDS,
+    EXTRACTION_INSTRUCTIONS,
+    BATCH_EXTRACTION_INSTRUCTIONS,
     generate_prompt,
-    get_json,
-    inject_standardized_json_to_excel
+    generate_batch_prompt,
+    generate_document_prompt,
+    generate_batch_document_prompt,
+    generate_json_retry_prompt,
+    get_json_array
 )
+from json_repair import extract_json
+from excel_export import SaveCallback, get_export_writer
+from llm_client import LLMClient, LLMError, get_llm_client, OLLAMA_API_URL, MODEL_NAME, LLM_KEEP_ALIVE
+from prompt_compaction import compact_documents, estimate_tokens, PROMPT_TOKEN_BUDGET
+from metrics import StageTimer
+from rule_extraction import (
+    extract_rule_fields,
+    resolved_fields,
+    missing_fields,
+    RULE_EXTRACTION,
+    RULE_MIN_CONFIDENCE
+)
+from database.extraction_cache import ExtractionCache, CACHE_BYPASS
+from database.db_manager import JOB_MAX_ATTEMPTS, JOB_TIME_BUDGET
 
 # Add parent dir to path for shared_database import
 parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(parent_dir)
-from shared_database import db
+from shared_database import get_db
 
 # Environment
 load_dotenv()
@@ -30,11 +53,34 @@ logger = logging.getLogger(__name__)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 EXTRACTIONS_DIR = os.path.join(BASE_DIR, "extractions")
 TEMPLATE_EXCEL_PATH = os.path.join(EXTRACTIONS_DIR, "ExcelTemplate.xlsx")
-OUTPUT_EXCEL_PATH = os.path.join(EXTRACTIONS_DIR, "Final_Applications_Export.xlsx")
+OUTPUT_EXCEL_PATH = os.getenv("OUTPUT_EXCEL_PATH", os.path.join(EXTRACTIONS_DIR, "Final_Applications_Export.xlsx"))
 
 # Ensure required folders exist
 os.makedirs(EXTRACTIONS_DIR, exist_ok=True)
 
+# Minimum seconds between partial-response writes while streaming
+PROGRESS_INTERVAL = 2.0
+
+# Batch mode: up to LLM_BATCH_SIZE jobs whose compacted documents stay below
+# LLM_BATCH_MAX_TOKENS share one prompt (1 = every job gets its own request)
+DEFAULT_BATCH_SIZE = 1
+DEFAULT_BATCH_MAX_TOKENS = 1500
+LLM_BATCH_SIZE = int(os.getenv("LLM_BATCH_SIZE", DEFAULT_BATCH_SIZE))
+LLM_BATCH_MAX_TOKENS = int(os.getenv("LLM_BATCH_MAX_TOKENS", DEFAULT_BATCH_MAX_TOKENS))
+
+# Failed jobs are retried until they were claimed JOB_MAX_ATTEMPTS times, then
+# dead-lettered. Before attempt n+1 a job waits JOB_RETRY_BASE * 2^(n-1) seconds
+# (at most JOB_RETRY_MAX, jittered so failed jobs do not return all at once).
+# Each attempt may take JOB_TIME_BUDGET seconds (LLM queueing and request retries
+# included), so a hanging server cannot hold a worker for the client's full timeout.
+DEFAULT_RETRY_BASE = 30.0
+DEFAULT_RETRY_MAX = 900.0
+JOB_RETRY_BASE = float(os.getenv("JOB_RETRY_BASE", DEFAULT_RETRY_BASE))
+JOB_RETRY_MAX = float(os.getenv("JOB_RETRY_MAX", DEFAULT_RETRY_MAX))
+# Follow-up requests quoting the parse error when an answer holds no valid JSON
+DEFAULT_JSON_REPROMPTS = 1
+JSON_REPROMPTS = int(os.getenv("JSON_REPROMPTS", DEFAULT_JSON_REPROMPTS))
+
 # Ensure template exists
 if not os.path.exists(TEMPLATE_EXCEL_PATH):
     logger.error(f"Template not found: {TEMPLATE_EXCEL_PATH}")
@@ -45,121 +91,459 @@ if not os.path.exists(OUTPUT_EXCEL_PATH):
     shutil.copy(TEMPLATE_EXCEL_PATH, OUTPUT_EXCEL_PATH)
     logger.info(f"Created output Excel file: {OUTPUT_EXCEL_PATH}")
 
-# API setup
-DEFAULT_API_URL = "http://localhost:11434/api/generate"
-DEFAULT_MODEL = "deepseek-r1:14b"
-OLLAMA_API_URL = os.getenv("OLLAMA_API_URL", DEFAULT_API_URL)
-MODEL_NAME = os.getenv("OLLAMA_MODEL", DEFAULT_MODEL)
 
-MAX_RETRIES = 3
+class JobFailure(Exception):
+    """A job attempt failed. Permanent failures (e.g. a job without text) are not retried."""
+
+    def __init__(self, error: str, diagnostics: Optional[Dict[str, Any]] = None, permanent: bool = False):
+        super().__init__(error)
+        self.error = error
+        self.diagnostics = diagnostics or {}
+        self.permanent = permanent
+
+
+def retry_delay(attempts: int, base: Optional[float] = None, maximum: Optional[float] = None) -> float:
+    """
+    Seconds to wait after the given number of failed attempts (exponential, jittered).
+    base and maximum default to JOB_RETRY_BASE and JOB_RETRY_MAX as they are when called.
+    """
+    base = JOB_RETRY_BASE if base is None else base
+    maximum = JOB_RETRY_MAX if maximum is None else maximum
+    return min(base * 2 ** max(0, attempts - 1), maximum) * random.uniform(0.5, 1.0)
 
 
 class Status:
-    def __init__(self):
-        self.db = db
+    def __init__(self, llm: Optional[LLMClient] = None, bypass_cache: bool = CACHE_BYPASS,
+                 token_budget: int = PROMPT_TOKEN_BUDGET, batch_size: int = LLM_BATCH_SIZE,
+                 batch_max_tokens: int = LLM_BATCH_MAX_TOKENS, keep_alive: Optional[str] = LLM_KEEP_ALIVE,
+                 rule_extraction: bool = RULE_EXTRACTION, rule_min_confidence: float = RULE_MIN_CONFIDENCE,
+                 max_attempts: int = JOB_MAX_ATTEMPTS, time_budget: float = JOB_TIME_BUDGET,
+                 retry_base: float = JOB_RETRY_BASE, retry_max: float = JOB_RETRY_MAX,
+                 json_reprompts: int = JSON_REPROMPTS):
+        self.db = get_db()
+        self.llm = llm or get_llm_client()
+        self.token_budget = token_budget
+        self.batch_size = max(1, batch_size)
+        self.batch_max_tokens = batch_max_tokens
+        self.keep_alive = keep_alive
+        self.rule_extraction = rule_extraction
+        self.rule_min_confidence = rule_min_confidence
+        self.max_attempts = max(1, max_attempts)
+        self.time_budget = time_budget
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.json_reprompts = max(0, json_reprompts)
+        self.cache = ExtractionCache(self.db.db_path)
+        # When bypassed, the model is always called; fresh responses still refresh the cache.
+        self.bypass_cache = bypass_cache
         self.template_path = TEMPLATE_EXCEL_PATH
         self.output_path = OUTPUT_EXCEL_PATH
+        # Shared by every Status in this process; one thread owns the workbook
+        self.excel_writer = get_export_writer(self.template_path, self.output_path)
+
+    def _generate_prompt(self, pdf_text: str, word_text: str, fields: Optional[List[str]] = None) -> str:
+        return generate_prompt(pdf_text, word_text, fields)
+
+    def _get_llm_response(self, prompt: str, job_id: Optional[int] = None,
+                          system: Optional[str] = None, timer: Optional[StageTimer] = None,
+                          deadline: Optional[float] = None) -> str:
+        on_progress = self._progress_reporter(job_id) if job_id is not None else None
+        timeout = None
+        if deadline is not None:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                raise JobFailure(f"Time budget of {self.time_budget:.0f}s used up before the LLM request")
+        return self.llm.generate(prompt, timeout=timeout, on_progress=on_progress, system=system,
+                                 keep_alive=self._keep_alive(), on_timing=timer.add if timer else None)
+
+    def _keep_alive(self) -> Optional[str]:
+        """Pins the model while more jobs are queued; otherwise the server default applies."""
+        if self.keep_alive and self.db.count_extractions(status="pending") > 0:
+            return self.keep_alive
+        return None
+
+    def warmup(self) -> bool:
+        """Loads the model and its instruction prefix ahead of the first job."""
+        system = BATCH_EXTRACTION_INSTRUCTIONS if self.batch_size > 1 else EXTRACTION_INSTRUCTIONS
+        return self.llm.warmup(system=system, keep_alive=self.keep_alive)
+
+    def _progress_reporter(self, *job_ids: int) -> Callable[[str], None]:
+        """Returns a callback that saves streamed output at most every PROGRESS_INTERVAL seconds."""
+        last_report = [0.0]
+
+        def report(partial_response: str) -> None:
+            now = time.monotonic()
+            if now - last_report[0] >= PROGRESS_INTERVAL:
+                last_report[0] = now
+                for job_id in job_ids:
+                    self.db.update_job_progress(job_id, partial_response)
+
+        return report
+
+    def process_job(self, job_id: int, deadline: Optional[float] = None,
+                    resolved: Optional[Dict[str, str]] = None, timer: Optional[StageTimer] = None):
+        """
+        Extracts one job's fields and builds its Excel row; records the time spent per stage.
 
-    def _generate_prompt(self, pdf_text: str, word_text: str) -> str:
-        return generate_prompt(pdf_text, word_text)
+        Args:
+            deadline (float, optional): time.monotonic() by which the attempt must be over
+            resolved (dict, optional): Rule results already computed for the job (see run_batch)
+            timer (StageTimer, optional): Timer holding stages already run for the job, not yet recorded
 
-    def _get_llm_response(self, prompt: str) -> str:
+        Returns:
+            tuple: (extracted fields, raw LLM response or None if rules resolved everything,
+                the job's Excel row for excel_writer.submit_row)
+
+        Raises:
+            JobFailure: The attempt failed; nothing is recorded in the job yet
+        """
+        timer = timer or StageTimer()
         try:
-            logger.info("Sending request to LLM API...")
-            response = requests.post(
-                OLLAMA_API_URL,
-                json={
-                    "model": MODEL_NAME,
-                    "prompt": prompt,
-                    "stream": False
-                },
-                headers={"Content-Type": "application/json"},
-                timeout=3000
-            )
-            if response.status_code != 200:
-                raise Exception(f"API returned {response.status_code}: {response.text}")
-            data = response.json()
-            return data.get("response", "")
-        except Exception as e:
-            logger.error(f"LLM request failed: {e}")
+            return self._process_job(job_id, timer, deadline, resolved)
+        except JobFailure:
             raise
+        except Exception as e:
+            logger.error(f"Error processing job {job_id}: {e}")
+            raise JobFailure(f"Processing exception: {e}")
+        finally:
+            self.db.record_stage_timings(job_id, timer.timings)
+
+    def _process_job(self, job_id: int, timer: StageTimer, deadline: Optional[float] = None,
+                     resolved: Optional[Dict[str, str]] = None):
+        job_data = self.db.get_job_data(job_id)
+        if not job_data:
+            logger.warning(f"No job data for ID {job_id}")
+            raise JobFailure("Job data not found", permanent=True)
+
+        pdf_text = job_data.get("pdf_content", "")
+        word_text = job_data.get("word_content", "")
+
+        if not pdf_text or not word_text:
+            logger.warning(f"Missing text for job {job_id}")
+            raise JobFailure("CV or application text is missing", permanent=True)
+
+        if resolved is None:
+            resolved = self._rule_fields(job_id, pdf_text, word_text, timer)
+        fields = missing_fields(resolved)
+        if not fields:
+            logger.info(f"All fields of job {job_id} resolved by rules, skipping LLM call")
+            json_data, response = dict(resolved), None
+        else:
+            json_data, response = self._llm_fields(job_id, pdf_text, word_text, fields, timer, deadline)
+            # Confident rule values win over the model's answer
+            json_data.update(resolved)
 
-    def process_job(self, job_id: int) -> Optional[Dict[str, Any]]:
         try:
-            job_data = self.db.get_job_data(job_id)
-            if not job_data:
-                logger.warning(f"No job data for ID {job_id}")
-                return None
+            row = self.excel_writer.build_row(json_data)
+        except Exception as e:
+            logger.error(f"Invalid Excel row for job {job_id}: {e}")
+            raise JobFailure(f"Excel save failed: {e}", {"raw_response": response})
+        logger.info(f"Successfully processed job {job_id}")
+        return json_data, response, row
 
-            pdf_text = job_data.get("pdf_content", "")
-            word_text = job_data.get("word_content", "")
+    def _rule_fields(self, job_id: int, pdf_text: str, word_text: str,
+                     timer: Optional[StageTimer] = None) -> Dict[str, str]:
+        """Runs the rule-based extractors, records their findings and returns the confident values."""
+        if not self.rule_extraction:
+            return {}
+        with (timer or StageTimer()).stage("rule_extraction"):
+            fields = extract_rule_fields(pdf_text, word_text)
+        self.db.record_rule_fields(job_id, {field: value._asdict() for field, value in fields.items()})
+        resolved = resolved_fields(fields, self.rule_min_confidence)
+        if resolved:
+            logger.info(f"Job {job_id}: {len(resolved)} of {len(PROMPT_FIELDS)} fields resolved by rules")
+        return resolved
 
-            if not pdf_text or not word_text:
-                logger.warning(f"Missing text for job {job_id}")
-                return None
+    def _llm_fields(self, job_id: int, pdf_text: str, word_text: str, fields: List[str], timer: StageTimer,
+                    deadline: Optional[float] = None):
+        """
+        Asks the LLM for the given fields and returns (json_data, raw response). An answer
+        without valid JSON is followed up (up to json_reprompts times) with the parse error.
 
-            prompt = self._generate_prompt(pdf_text, word_text)
-            response = self._get_llm_response(prompt)
+        Raises:
+            JobFailure: The request failed, or no answer held valid JSON
+        """
+        with timer.stage("prompt_build"):
+            compacted = compact_documents(pdf_text, word_text, self.token_budget)
+            report = compacted.report
+            prompt = self._generate_prompt(compacted.pdf_text, compacted.word_text, fields)
+            document_prompt = generate_document_prompt(compacted.pdf_text, compacted.word_text, fields)
+        logger.info(f"Job {job_id}: document text {report.original_tokens} -> {report.compacted_tokens} "
+                    f"tokens (saved {report.saved_tokens}, {report.truncated_sections} section(s) "
+                    f"truncated, {report.dropped_sections} dropped)")
+        self.db.record_prompt_stats(job_id, estimate_tokens(prompt), report.saved_tokens)
 
-            print(f"[DEBUG] Raw LLM response for job {job_id}:\n{response[:3000]}")  # Only show first 500 chars
+        cache_key = self.cache.make_key(prompt, self.llm.model)
+        response = None if self.bypass_cache else self.cache.get(cache_key)
+        from_cache = response is not None
+        if from_cache:
+            logger.info(f"Cache hit for job {job_id}, skipping LLM call")
+        else:
+            # Instructions go in the system prompt: a fixed prefix the server can reuse
+            response = self._request_fields(document_prompt, job_id, timer, deadline)
 
-            json_data = get_json(response)
-            if not json_data:
-                logger.error(f"Invalid JSON for job {job_id}")
-                self.db.update_job_status(
-                    job_id,
-                    status="failed",
-                    debug_output={"error": "Invalid JSON", "raw_response": response}
-                )
-                return None
+        # The response itself is kept in debug_output; applicant data stays out of the log
+        logger.debug(f"Job {job_id}: LLM response of {len(response)} characters{' (cached)' if from_cache else ''}")
 
-            try:
-                inject_standardized_json_to_excel(json_data, self.template_path, self.output_path)
-                logger.info(f"Successfully processed job {job_id}")
-                return json_data
-            except Exception as e:
-                logger.error(f"Failed to write to Excel for job {job_id}: {e}")
-                self.db.update_job_status(
-                    job_id,
-                    status="failed",
-                    debug_output={"error": f"Excel save failed: {e}", "raw_response": response}
-                )
-                return None
+        with timer.stage("json_repair"):
+            extraction = extract_json(response)
+        rejected = []
+        while not extraction.data and len(rejected) < self.json_reprompts:
+            logger.warning(f"Invalid JSON for job {job_id} ({extraction.error}), asking again")
+            rejected.append({"response": response, "error": extraction.error})
+            retry_prompt = generate_json_retry_prompt(document_prompt, response, extraction.error)
+            response = self._request_fields(retry_prompt, job_id, timer, deadline)
+            from_cache = False
+            with timer.stage("json_repair"):
+                extraction = extract_json(response)
 
-        except Exception as e:
-            logger.error(f"Error processing job {job_id}: {e}")
-            self.db.update_job_status(
-                job_id,
-                status="failed",
-                debug_output={"error": f"Processing exception: {e}"}
-            )
-            return None
+        json_data = extraction.data
+        if extraction.fixes:
+            logger.info(f"Job {job_id}: repaired JSON in the response ({', '.join(extraction.fixes)})")
+        if not json_data:
+            logger.error(f"Invalid JSON for job {job_id}")
+            raise JobFailure(f"Invalid JSON: {extraction.error}", {
+                "raw_response": response,
+                "json_fixes": extraction.fixes,
+                "rejected_responses": rejected
+            })
+
+        if not from_cache:
+            self.cache.put(cache_key, self.llm.model, response)
+        return json_data, response
+
+    def _request_fields(self, prompt: str, job_id: int, timer: StageTimer, deadline: Optional[float]) -> str:
+        try:
+            return self._get_llm_response(prompt, job_id, system=EXTRACTION_INSTRUCTIONS, timer=timer,
+                                          deadline=deadline)
+        except LLMError as e:
+            raise JobFailure(str(e))
+
+    def close(self) -> None:
+        """Writes out any buffered Excel rows."""
+        if not self.excel_writer.flush():
+            logger.error(f"Excel export incomplete: {self.excel_writer.last_error}")
 
+    def run_job(self, job_id: int, resolved: Optional[Dict[str, str]] = None,
+                timer: Optional[StageTimer] = None, worker_id: Optional[str] = None) -> bool:
+        """
+        Processes a claimed job within the time budget and records the outcome: 'done', a
+        retry after a backoff, or (attempts used up) 'dead_letter'. Returns True on success.
+        resolved and timer carry over work run_batch already did (see process_job).
+
+        With the worker_id that claimed the job, the outcome is only recorded while the
+        claim is still held; if the job was reclaimed meanwhile, its result is dropped.
+        The Excel row is queued once the job is 'done'; its save is recorded later (see
+        _export_reporter).
+        """
+        deadline = time.monotonic() + self.time_budget if self.time_budget > 0 else None
+        try:
+            result, response, row = self.process_job(job_id, deadline, resolved, timer)
+        except JobFailure as failure:
+            self._record_failure(job_id, failure, worker_id)
+            return False
+        if not self.db.mark_job_completed(job_id, extracted_data=result,
+                                          debug_output={"raw_response": response} if response else None,
+                                          worker_id=worker_id):
+            logger.warning(f"Job {job_id} is no longer held by {worker_id}, dropping its result")
+            return False
+        self.excel_writer.submit_row(row, on_saved=self._export_reporter(job_id))
+        logger.info(f"Completed job {job_id}")
+        return True
 
-            inject_standardized_json_to_excel(json_data, self.template_path, self.output_path)
-            logger.info(f"Processed job {job_id}")
-            return json_data
+    def _export_reporter(self, job_id: int) -> SaveCallback:
+        """
+        Callback for excel_writer.submit_row: records on the job the file its row was saved
+        to, or, if the save failed, the export failure (the job turns 'failed'). The save's
+        duration is the job's excel_write stage; a batch of rows counts in full for each row.
+        """
+        def on_saved(error: Optional[Exception], seconds: float) -> None:
+            self.db.record_stage_timings(job_id, {"excel_write": seconds})
+            if error is None:
+                self.db.record_export(job_id, excel_file=self.output_path)
+            else:
+                logger.error(f"Excel row of job {job_id} was not saved: {error}")
+                self.db.record_export(job_id, error=f"Excel save failed: {error}")
+        return on_saved
 
+    def _record_failure(self, job_id: int, failure: JobFailure, worker_id: Optional[str] = None) -> None:
+        attempts = self.db.get_job_attempts(job_id)
+        if failure.permanent:
+            outcome = {"status": "failed"}
+            log, message = logger.error, f"Failed job {job_id}: {failure.error}"
+        elif attempts >= self.max_attempts:
+            outcome = {"status": "dead_letter"}
+            log, message = logger.error, f"Dead-lettered job {job_id} after {attempts} attempt(s): {failure.error}"
+        else:
+            outcome = {"retry_in": retry_delay(attempts, self.retry_base, self.retry_max)}
+            log, message = logger.warning, (f"Job {job_id} attempt {attempts}/{self.max_attempts} failed, "
+                                            f"retrying in {outcome['retry_in']:.0f}s: {failure.error}")
+        if self.db.record_job_failure(job_id, failure.error, failure.diagnostics, worker_id=worker_id, **outcome):
+            log(message)
+        else:
+            logger.warning(f"Job {job_id} is no longer held by {worker_id}, dropping its failure: {failure.error}")
+
+    def run_batch(self, job_ids: List[int], worker_id: Optional[str] = None) -> int:
+        """
+        Processes claimed jobs, packing the short ones into one batch prompt.
+
+        Jobs fully resolved by the rule-based extractors, too long, already
+        cached, or whose element of the batch
+        response is missing or invalid are processed on their own with run_job,
+        so every job is still completed, retried or dead-lettered individually.
+        worker_id is the claim's owner (see run_job).
+
+        Returns:
+            int: Number of jobs completed successfully
+        """
+        batch, singles, resolved, timers = [], [], {}, {}
+        for job_id in job_ids:
+            job_data = self.db.get_job_data(job_id) if len(job_ids) > 1 else None
+            if not job_data or not job_data.get("pdf_content") or not job_data.get("word_content"):
+                singles.append(job_id)
+                continue
+            timer = timers[job_id] = StageTimer()
+            resolved[job_id] = self._rule_fields(job_id, job_data["pdf_content"], job_data["word_content"], timer)
+            if not missing_fields(resolved[job_id]):
+                singles.append(job_id)  # no LLM call needed
+                continue
+            with timer.stage("prompt_build"):
+                compacted = compact_documents(job_data["pdf_content"], job_data["word_content"], self.token_budget)
+                # The key of the single-job prompt (see _llm_fields), so both paths share entries
+                single_prompt = self._generate_prompt(compacted.pdf_text, compacted.word_text,
+                                                      missing_fields(resolved[job_id]))
+            cache_key = self.cache.make_key(single_prompt, self.llm.model)
+            if compacted.report.compacted_tokens > self.batch_max_tokens or (
+                    not self.bypass_cache and self.cache.contains(cache_key)):
+                singles.append(job_id)
+                continue
+            batch.append((job_id, compacted, cache_key))
+
+        if len(batch) < 2:
+            singles.extend(job_id for job_id, _, _ in batch)
+            batch = []
+        completed, retried = 0, []
+        if batch:
+            self.db.touch_jobs(job_ids, worker_id)
+            completed, retried = self._process_batch(batch, resolved, timers, worker_id)
+        # The batch recorded its jobs' timings; only the jobs that never joined it hand theirs on
+        for job_id, _, _ in batch:
+            timers.pop(job_id)
+
+        succeeded = completed
+        queue = singles + retried
+        for position, job_id in enumerate(queue):
+            # The jobs still waiting in the queue are alive too; without a heartbeat they
+            # would go stale (and be reclaimed) while the ones before them run
+            self.db.touch_jobs(queue[position:], worker_id)
+            succeeded += self.run_job(job_id, resolved.get(job_id), timers.get(job_id), worker_id)
+        return succeeded
+
+    def _process_batch(self, batch: list, resolved: Dict[int, Dict[str, str]],
+                       timers: Dict[int, StageTimer], worker_id: Optional[str] = None) -> Tuple[int, List[int]]:
+        """
+        Runs one batch prompt and completes its jobs. Returns the number of jobs completed
+        and the IDs that need a single-job retry.
+        Shared stages (the request, parsing the answer) count in full for every job of the batch.
+        """
+        job_ids = [job_id for job_id, _, _ in batch]
+        try:
+            return self._run_batch_prompt(batch, resolved, timers, worker_id)
+        finally:
+            for job_id in job_ids:
+                self.db.record_stage_timings(job_id, timers[job_id].timings)
+
+    def _run_batch_prompt(self, batch: list, resolved: Dict[int, Dict[str, str]],
+                          timers: Dict[int, StageTimer], worker_id: Optional[str] = None) -> Tuple[int, List[int]]:
+        job_ids = [job_id for job_id, _, _ in batch]
+
+        def add_to_all(stage: str, seconds: float) -> None:
+            for job_id in job_ids:
+                timers[job_id].add(stage, seconds)
+
+        started = time.perf_counter()
+        documents = [(compacted.pdf_text, compacted.word_text) for _, compacted, _ in batch]
+        prompt_share = estimate_tokens(generate_batch_prompt(documents)) // len(batch)
+        document_prompt = generate_batch_document_prompt(documents)
+        add_to_all("prompt_build", time.perf_counter() - started)
+        for job_id, compacted, _ in batch:
+            self.db.record_prompt_stats(job_id, prompt_share, compacted.report.saved_tokens)
+
+        logger.info(f"Sending batch prompt for jobs {job_ids}")
+        try:
+            response = self.llm.generate(
+                document_prompt,
+                timeout=self.time_budget if self.time_budget > 0 else None,
+                on_progress=self._progress_reporter(*job_ids),
+                stop_on_json=False,
+                system=BATCH_EXTRACTION_INSTRUCTIONS,
+                keep_alive=self._keep_alive(),
+                on_timing=add_to_all
+            )
         except Exception as e:
-            logger.error(f"Error in job {job_id}: {e}")
-            return None
+            logger.error(f"Batch request for jobs {job_ids} failed, falling back to single jobs: {e}")
+            return 0, job_ids
+
+        started = time.perf_counter()
+        results = get_json_array(response, len(batch))
+        add_to_all("json_repair", time.perf_counter() - started)
+
+        completed, retry = 0, []
+        for (job_id, _, cache_key), json_data in zip(batch, results):
+            if not json_data:
+                logger.warning(f"No valid batch result for job {job_id}, retrying on its own")
+                retry.append(job_id)
+                continue
+            # The model's element as it answered, before the rule values are merged in
+            raw_response = json.dumps(json_data, ensure_ascii=False)
+            json_data.update(resolved.get(job_id, {}))
+            try:
+                row = self.excel_writer.build_row(json_data)
+            except Exception as e:
+                logger.warning(f"Invalid batch result for job {job_id} ({e}), retrying on its own")
+                retry.append(job_id)
+                continue
+            self.cache.put(cache_key, self.llm.model, raw_response)
+            if not self.db.update_job_status(
+                job_id,
+                status="done",
+                extracted_data=json_data,
+                debug_output={"raw_response": raw_response, "batch_jobs": job_ids},
+                worker_id=worker_id
+            ):
+                logger.warning(f"Job {job_id} is no longer held by {worker_id}, dropping its result")
+                continue
+            self.excel_writer.submit_row(row, on_saved=self._export_reporter(job_id))
+            completed += 1
+            logger.info(f"Completed job {job_id} (batch of {len(batch)})")
+        return completed, retry
+
+    def _drain_queue(self) -> int:
+        processed = 0
+        while True:
+            # One owner per sweep thread, so a claim can't be finished by another thread
+            worker_id = f"sweep-{os.getpid()}-{threading.current_thread().name}"
+            jobs = self.db.claim_next_jobs(self.batch_size, worker_id=worker_id)
+            if not jobs:
+                return processed
+            self.run_batch([job["id"] for job in jobs], worker_id)
+            processed += len(jobs)
 
     def process_all_pending_jobs(self):
+        """
+        Drains the queue once, keeping up to ``llm.max_in_flight`` jobs in progress.
+        Jobs are claimed one by one, so concurrent sweeps never share a job.
+        """
         try:
-            pending_jobs = self.db.get_pending_jobs()
-            if not pending_jobs:
+            concurrency = self.llm.max_in_flight
+            with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="job") as pool:
+                processed = sum(pool.map(lambda _: self._drain_queue(), range(concurrency)))
+
+            if not self.excel_writer.flush():
+                logger.error(f"Excel export incomplete: {self.excel_writer.last_error}")
+            if not processed:
                 logger.info("No pending jobs found")
-                return
-
-            logger.info(f"Found {len(pending_jobs)} jobs")
-            for job in pending_jobs:
-                job_id = job["id"]
-                result = self.process_job(job_id)
-                if result:
-                    self.db.mark_job_completed(job_id)
-                    logger.info(f"Completed job {job_id}")
-                else:
-                    self.db.mark_job_failed(job_id)
-                    logger.error(f"Failed job {job_id}")
+            else:
+                logger.info(f"Processed {processed} jobs")
         except Exception as e:
             logger.error(f"Error processing jobs: {e}")
@@ -0,0 +1,87 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+DEFAULT_BUSY_TIMEOUT_MS = 30000
+DEFAULT_SYNCHRONOUS = "NORMAL"
+DEFAULT_CACHED_STATEMENTS = 256
+
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", DEFAULT_BUSY_TIMEOUT_MS))
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", DEFAULT_SYNCHRONOUS)
+
+
+class ConnectionManager:
+    """
+    Hands out one long-lived SQLite connection per thread.
+
+    Connections run in WAL mode, so readers (the UI) never wait for a writer (the
+    worker) and vice versa. They use a busy timeout instead of failing on lock
+    contention and synchronous=NORMAL, which is durable under WAL except for the
+    last commits before a power loss. Because connections are reused, sqlite3's
+    per-connection statement cache keeps frequently used queries prepared.
+    Connections are in autocommit mode; use ``transaction()`` to group writes.
+    """
+
+    def __init__(self, db_path, busy_timeout_ms=SQLITE_BUSY_TIMEOUT_MS, synchronous=SQLITE_SYNCHRONOUS,
+                 cached_statements=DEFAULT_CACHED_STATEMENTS):
+        self.db_path = db_path
+        self.busy_timeout_ms = busy_timeout_ms
+        self.synchronous = synchronous
+        self.cached_statements = cached_statements
+        self._local = threading.local()
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout_ms / 1000,
+            isolation_level=None,
+            cached_statements=self.cached_statements
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        conn.execute(f"PRAGMA synchronous={self.synchronous}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+
+    def connection(self):
+        """Returns this thread's connection, opening it on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    @contextmanager
+    def reading(self):
+        """Yields this thread's connection for reads (each statement is its own snapshot)."""
+        yield self.connection()
+
+    @contextmanager
+    def transaction(self, immediate=False):
+        """
+        Runs the block in one transaction, committed on success and rolled back on error.
+
+        With immediate=True the write lock is taken up front (BEGIN IMMEDIATE), so
+        read-then-write sequences cannot race other writers. Nested use joins the
+        outer transaction.
+        """
+        conn = self.connection()
+        if conn.in_transaction:
+            yield conn
+            return
+        conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+        try:
+            yield conn
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        if conn.in_transaction:
+            conn.execute("COMMIT")
+
+    def close(self):
+        """Closes the calling thread's connection. Other threads' connections close with their thread."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            self._local.conn = None
+            conn.close()
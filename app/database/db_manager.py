@@ -1,39 +1,174 @@
 import sqlite3
 import json
-from datetime import datetime
+import zlib
+import hashlib
+from datetime import datetime, timezone
 import os
 
+from database.connection import ConnectionManager
+from database.migrations import migrate, SCHEMA_VERSION
+from metrics import bucket_label, format_eta
+
+
+# Job priorities: higher is claimed first
+PRIORITY_BULK = 0
+PRIORITY_INTERACTIVE = 10
+
+# Backpressure: pending jobs beyond which add_job/add_jobs refuse new work (0 = no
+# limit); interactive jobs may use INTERACTIVE_QUEUE_RESERVE slots more, so a
+# single upload still gets in while a bulk load fills the queue
+DEFAULT_MAX_QUEUE_DEPTH = 2000
+DEFAULT_INTERACTIVE_QUEUE_RESERVE = 50
+MAX_QUEUE_DEPTH = int(os.getenv("MAX_QUEUE_DEPTH", DEFAULT_MAX_QUEUE_DEPTH))
+INTERACTIVE_QUEUE_RESERVE = int(os.getenv("INTERACTIVE_QUEUE_RESERVE", DEFAULT_INTERACTIVE_QUEUE_RESERVE))
+
+# Most recent done jobs whose durations the ETA is estimated from
+ETA_SAMPLE_JOBS = 50
+
+# Attempts before a job is dead-lettered, and the wall-clock seconds one attempt
+# may take (see database.Status). A 'processing' job without a sign of life (claim,
+# attempt start, streamed progress) for the budget plus JOB_STALE_MARGIN belongs to
+# a worker that crashed or was stopped, and the next claim takes it back.
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_JOB_TIME_BUDGET = 600.0
+DEFAULT_STALE_MARGIN = 300.0
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", DEFAULT_MAX_ATTEMPTS))
+JOB_TIME_BUDGET = float(os.getenv("JOB_TIME_BUDGET", DEFAULT_JOB_TIME_BUDGET))
+JOB_STALE_MARGIN = float(os.getenv("JOB_STALE_MARGIN", DEFAULT_STALE_MARGIN))
+
+# Final job states: 'failed' for jobs that cannot succeed (e.g. no text), 'dead_letter'
+# for jobs that used up their attempts; both keep their diagnostics
+FAILED_STATUSES = ("failed", "dead_letter")
+FINAL_STATUSES = ("done",) + FAILED_STATUSES
+
+
+class QueueFullError(Exception):
+    """Raised by add_job/add_jobs when the jobs would take the queue past its maximum depth."""
+
+    def __init__(self, depth, max_depth, retry_after=None):
+        self.depth = depth
+        self.max_depth = max_depth
+        # Estimated seconds until there is room, or None without job history
+        self.retry_after = retry_after
+        message = f"Queue is full ({depth} jobs pending, limit {max_depth})"
+        if retry_after:
+            message += f"; room expected in {format_eta(retry_after)}"
+        super().__init__(message)
+
+
+def content_hash(data):
+    """SHA-256 hex digest of file bytes or text (text is hashed as UTF-8)."""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
 class DatabaseManager:
-    def __init__(self):
-        self.db_path = os.path.join(os.path.dirname(__file__), 'cv_data.db')
+    # Current UTC time with milliseconds, as stored in started_at/finished_at
+    _NOW = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+    # When a claimed job last showed it is alive (jobs left 'processing' before
+    # started_at existed fall back to their creation time)
+    _LAST_SEEN = "COALESCE(heartbeat_at, started_at, timestamp)"
+
+    # Pending jobs in claim order. Higher priorities go first; within a priority
+    # the submitters take turns (everyone's n-th oldest job ranks together), and
+    # a submitter with jobs already running (live ones, not orphaned) moves back by
+    # that many turns. Jobs waiting for a retry are left out until their retry_at
+    # has passed. Use _schedule(), which fills in the staleness cutoff.
+    _SCHEDULE = f"""
+        SELECT pending.id FROM (
+            SELECT id, priority, submitter,
+                   ROW_NUMBER() OVER (PARTITION BY priority, submitter ORDER BY id) AS turn
+            FROM cv_extractions
+            WHERE status = 'pending' AND (retry_at IS NULL OR retry_at <= {_NOW})
+        ) AS pending
+        LEFT JOIN (
+            SELECT submitter, COUNT(*) AS running FROM cv_extractions
+            WHERE status = 'processing' AND {_LAST_SEEN} >= {{live_since}} GROUP BY submitter
+        ) AS busy USING (submitter)
+        ORDER BY pending.priority DESC, pending.turn + COALESCE(busy.running, 0), pending.id
+    """
+
+    def __init__(self, db_path=None, max_queue_depth=MAX_QUEUE_DEPTH, max_attempts=JOB_MAX_ATTEMPTS,
+                 stale_after=JOB_TIME_BUDGET + JOB_STALE_MARGIN):
+        self.db_path = db_path or os.getenv("CV_DB_PATH") or os.path.join(os.path.dirname(__file__), 'cv_data.db')
+        self.max_queue_depth = max_queue_depth
+        self.max_attempts = max_attempts
+        # Seconds without a sign of life after which a 'processing' job is orphaned
+        self.stale_after = stale_after
+        self.connections = ConnectionManager(self.db_path)
         self.initialize_db()
 
     def initialize_db(self):
-        """Creates the database table if it does not exist."""
+        """Creates or upgrades the database schema (see database.migrations)."""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS cv_extractions (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        pdf_filename TEXT,
-                        word_filename TEXT,
-                        pdf_content TEXT,
-                        word_content TEXT,
-                        status TEXT DEFAULT 'pending',
-                        excel_file_path TEXT,
-                        debug_output TEXT,
-                        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-                    )
-                ''')
-                conn.commit()
-                print("Database initialized successfully!")
+            applied = migrate(self.connections)
+            # Quiet when the schema is already current (every process start)
+            if applied:
+                print(f"Database initialized successfully! (schema version {SCHEMA_VERSION}, "
+                      f"{applied} migration(s) applied)")
         except sqlite3.Error as e:
             print(f"Error initializing database: {e}")
+            raise
+
+    def _live_since(self):
+        """SQL time before which a 'processing' job counts as orphaned."""
+        return f"strftime('%Y-%m-%d %H:%M:%f', 'now', '-{self.stale_after:.3f} seconds')"
+
+    def _schedule(self):
+        return self._SCHEDULE.format(live_since=self._live_since())
+
+    @staticmethod
+    def _store_document(cursor, text):
+        """Stores text once (deduplicated by hash) and returns its hash."""
+        text_hash = content_hash(text)
+        cursor.execute(
+            "INSERT OR IGNORE INTO documents (text_hash, content, size) VALUES (?, ?, ?)",
+            (text_hash, zlib.compress(text.encode("utf-8")), len(text))
+        )
+        return text_hash
+
+    @staticmethod
+    def _load_document(cursor, text_hash):
+        row = cursor.execute("SELECT content FROM documents WHERE text_hash = ?", (text_hash,)).fetchone()
+        return zlib.decompress(row[0]).decode("utf-8") if row else None
+
+    def _resolve_contents(self, cursor, job):
+        """Fills pdf_content/word_content from the document store for hash-referenced jobs."""
+        for content_key, hash_key in (("pdf_content", "pdf_text_hash"), ("word_content", "word_text_hash")):
+            if job.get(content_key) is None and job.get(hash_key):
+                job[content_key] = self._load_document(cursor, job[hash_key])
+        return job
+
+    def get_text_for_file(self, file_hash):
+        """Returns the text previously extracted from a file with these bytes, or None."""
+        try:
+            with self.connections.reading() as conn:
+                cursor = conn.cursor()
+                row = cursor.execute(
+                    "SELECT text_hash FROM document_files WHERE file_hash = ?", (file_hash,)
+                ).fetchone()
+                return self._load_document(cursor, row[0]) if row else None
+        except sqlite3.Error as e:
+            print(f"Error looking up document: {e}")
+            return None
+
+    def remember_file_text(self, file_hash, filename, text):
+        """Records the text extracted from a file so identical uploads skip extraction."""
+        try:
+            with self.connections.transaction() as conn:
+                cursor = conn.cursor()
+                text_hash = self._store_document(cursor, text)
+                cursor.execute(
+                    "INSERT OR REPLACE INTO document_files (file_hash, text_hash, filename) VALUES (?, ?, ?)",
+                    (file_hash, text_hash, filename)
+                )
+        except sqlite3.Error as e:
+            print(f"Error storing document: {e}")
 
     def save_extraction(self, pdf_filename, word_filename, pdf_content, word_content, status="done", excel_file=None, debug_output=None):
         """Saves extraction results to the database (only Excel file path)."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.connections.transaction() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 INSERT INTO cv_extractions 
@@ -49,41 +184,82 @@ class DatabaseManager:
                 json.dumps(debug_output) if debug_output else None,
                 datetime.now().isoformat()
             ))
-            conn.commit()
             print("Extraction saved successfully!")
 
+    @staticmethod
+    def _listing_filter(status=None, search=None):
+        clauses, params = [], []
+        if status:
+            clauses.append("status = ?")
+            params.append(status)
+        if search:
+            clauses.append("(pdf_filename LIKE ? OR word_filename LIKE ?)")
+            params.extend([f"%{search}%"] * 2)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
 
-
-
-    def get_all_extractions(self):
-            """Fetch all extractions from the database (returns only Excel file path)."""
-            with sqlite3.connect(self.db_path) as conn:
+    def list_extractions(self, limit=25, offset=0, status=None, search=None):
+        """Fetch one page of job summaries (no document texts or debug output), newest first."""
+        where, params = self._listing_filter(status, search)
+        try:
+            with self.connections.reading() as conn:
                 cursor = conn.cursor()
-                cursor.execute('SELECT id, pdf_filename, word_filename, status, excel_file_path, debug_output, timestamp FROM cv_extractions ORDER BY timestamp DESC')
+                cursor.execute(f"""
+                    SELECT id, pdf_filename, word_filename, status, excel_file_path, timestamp,
+                           prompt_tokens, prompt_tokens_saved, attempts, retry_at
+                    FROM cv_extractions{where}
+                    ORDER BY timestamp DESC, id DESC
+                    LIMIT ? OFFSET ?
+                """, params + [limit, offset])
                 columns = [description[0] for description in cursor.description]
-                results = []
-                for row in cursor.fetchall():
-                    result_dict = dict(zip(columns, row))
+                return [dict(zip(columns, row)) for row in cursor.fetchall()]
+        except sqlite3.Error as e:
+            print(f"Error listing extractions: {e}")
+            return []
 
-                    # Remove extracted_data handling completely
-                    if "extracted_data" in result_dict:
-                        del result_dict["extracted_data"]  # Remove this key entirely
+    def count_extractions(self, status=None, search=None):
+        """Number of jobs matching the same filters as list_extractions."""
+        where, params = self._listing_filter(status, search)
+        try:
+            with self.connections.reading() as conn:
+                return conn.execute(f"SELECT COUNT(*) FROM cv_extractions{where}", params).fetchone()[0]
+        except sqlite3.Error as e:
+            print(f"Error counting extractions: {e}")
+            return 0
 
-                    results.append(result_dict)
-                return results
+    def get_debug_output(self, job_id):
+        """Fetch the (possibly large) debug output of a single job."""
+        try:
+            with self.connections.reading() as conn:
+                row = conn.execute("SELECT debug_output FROM cv_extractions WHERE id = ?", (job_id,)).fetchone()
+                return row[0] if row else None
+        except sqlite3.Error as e:
+            print(f"Error fetching debug output: {e}")
+            return None
 
+    def add_job(self, pdf_filename, word_filename, pdf_content, word_content,status="pending", stage_timings=None,
+                priority=PRIORITY_INTERACTIVE, submitter=""):
+        """
+        Adds a new job with both PDF and Word document data (texts go to the document store).
+        stage_timings ({stage: seconds}) records work done before queueing, e.g. text extraction.
+        submitter identifies who queued the job; submitters get fair turns within a priority.
 
-    def add_job(self, pdf_filename, word_filename, pdf_content, word_content,status="pending"):
-        """Adds a new job with both PDF and Word document data."""
+        Raises:
+            QueueFullError: The queue is at its maximum depth (nothing is added)
+        """
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.connections.transaction(immediate=True) as conn:
                 cursor = conn.cursor()
+                if status == "pending":
+                    self._check_queue_depth(cursor, 1, priority)
+                pdf_text_hash = self._store_document(cursor, pdf_content)
+                word_text_hash = self._store_document(cursor, word_content)
                 cursor.execute("""
-                    INSERT INTO cv_extractions (pdf_filename, word_filename, pdf_content, word_content, status)
-                    VALUES (?, ?, ?, ?, ?)
-                """, (pdf_filename, word_filename, pdf_content, word_content, status))
-                conn.commit()
+                    INSERT INTO cv_extractions
+                    (pdf_filename, word_filename, pdf_text_hash, word_text_hash, status, priority, submitter)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                """, (pdf_filename, word_filename, pdf_text_hash, word_text_hash, status, priority, submitter))
                 job_id = cursor.lastrowid
+                self._insert_stage_timings(cursor, job_id, stage_timings)
                 print(f"Job {job_id} added successfully!")
                 return job_id
         except sqlite3.Error as e:
@@ -94,10 +270,106 @@ class DatabaseManager:
 
 
 
+    def add_jobs(self, jobs, status="pending", priority=PRIORITY_BULK, submitter=""):
+        """
+        Adds many jobs in a single transaction (all or nothing).
+
+        Args:
+            jobs (list): Dicts with pdf_filename, word_filename, pdf_content and word_content,
+                optionally stage_timings (see add_job)
+            priority (int): Priority of all the jobs (bulk by default)
+            submitter (str): Who queued them (see add_job)
+
+        Returns:
+            list: The new job IDs in input order, or an empty list on error
+
+        Raises:
+            QueueFullError: The jobs do not fit into the queue (none are added)
+        """
+        try:
+            with self.connections.transaction(immediate=True) as conn:
+                cursor = conn.cursor()
+                if status == "pending":
+                    self._check_queue_depth(cursor, len(jobs), priority)
+                job_ids = []
+                for job in jobs:
+                    pdf_text_hash = self._store_document(cursor, job["pdf_content"])
+                    word_text_hash = self._store_document(cursor, job["word_content"])
+                    cursor.execute("""
+                        INSERT INTO cv_extractions
+                        (pdf_filename, word_filename, pdf_text_hash, word_text_hash, status, priority, submitter)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)
+                    """, (job["pdf_filename"], job["word_filename"], pdf_text_hash, word_text_hash, status,
+                          priority, submitter))
+                    job_ids.append(cursor.lastrowid)
+                    self._insert_stage_timings(cursor, cursor.lastrowid, job.get("stage_timings"))
+            print(f"{len(job_ids)} jobs added successfully!")
+            return job_ids
+        except sqlite3.Error as e:
+            print(f"Error adding jobs: {e}")
+            return []
+
+    def _check_queue_depth(self, cursor, new_jobs, priority):
+        if not self.max_queue_depth:
+            return
+        limit = self.max_queue_depth + (INTERACTIVE_QUEUE_RESERVE if priority >= PRIORITY_INTERACTIVE else 0)
+        depth = cursor.execute("SELECT COUNT(*) FROM cv_extractions WHERE status = 'pending'").fetchone()[0]
+        if depth + new_jobs > limit:
+            seconds_per_job = self._seconds_per_job(cursor)
+            retry_after = None
+            if seconds_per_job and new_jobs <= limit:
+                retry_after = (depth + new_jobs - limit) * seconds_per_job
+            raise QueueFullError(depth, limit, retry_after)
+
+    def _seconds_per_job(self, cursor):
+        """
+        Queue throughput estimate: mean duration of the last ETA_SAMPLE_JOBS done jobs,
+        divided by the live jobs running in parallel now (at least one). None without history.
+        """
+        job_ms = cursor.execute("""
+            SELECT AVG(duration_ms) FROM (
+                SELECT duration_ms FROM cv_extractions
+                WHERE status = 'done' AND duration_ms IS NOT NULL
+                ORDER BY finished_at DESC LIMIT ?
+            )
+        """, (ETA_SAMPLE_JOBS,)).fetchone()[0]
+        if job_ms is None:
+            return None
+        running = cursor.execute(f"""
+            SELECT COUNT(*) FROM cv_extractions
+            WHERE status = 'processing' AND {self._LAST_SEEN} >= {self._live_since()}
+        """).fetchone()[0]
+        return job_ms / 1000 / max(1, running)
+
+    def get_queue_etas(self, job_ids=None):
+        """
+        Queue place and estimated wait of pending jobs (all, or the given ones).
+
+        Returns:
+            dict: {job_id: (place in claim order starting at 1, estimated seconds until the
+            job is finished or None without job history)}
+        """
+        wanted = None if job_ids is None else set(job_ids)
+        if wanted is not None and not wanted:
+            return {}
+        try:
+            with self.connections.reading() as conn:
+                cursor = conn.cursor()
+                order = [row[0] for row in cursor.execute(self._schedule())]
+                seconds_per_job = self._seconds_per_job(cursor)
+        except sqlite3.Error as e:
+            print(f"Error estimating queue times: {e}")
+            return {}
+        return {
+            job_id: (place, place * seconds_per_job if seconds_per_job else None)
+            for place, job_id in enumerate(order, 1)
+            if wanted is None or job_id in wanted
+        }
+
     def get_extraction_by_id(self, extraction_id):
         """Fetch a specific extraction by ID."""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.connections.transaction() as conn:
                 cursor = conn.cursor()
                 cursor.execute('SELECT * FROM cv_extractions WHERE id = ?', (extraction_id,))
                 result = cursor.fetchone()
@@ -106,11 +378,14 @@ class DatabaseManager:
                     columns = [description[0] for description in cursor.description]
                     result_dict = dict(zip(columns, result))
 
+                    self._resolve_contents(cursor, result_dict)
+
                     # Fix: Only check extracted_data if it exists
                     if "extracted_data" in result_dict and result_dict["extracted_data"]:
                         result_dict["extracted_data"] = json.loads(result_dict["extracted_data"])
                     else:
                         result_dict["extracted_data"] = {}  # Safe fallback
+                    result_dict["rule_fields"] = json.loads(result_dict.get("rule_fields") or "{}")
 
                     return result_dict  # Return valid data
                 
@@ -120,60 +395,450 @@ class DatabaseManager:
         return None  # Ensure a return value
 
 
-    def update_job_status(self, job_id, status, extracted_data=None, excel_file=None, debug_output=None):
-        """Updates job status and optionally saves extracted data, Excel file path, and debug output."""
+    def update_job_status(self, job_id, status, extracted_data=None, excel_file=None, debug_output=None,
+                          worker_id=None):
+        """
+        Updates job status and optionally saves extracted data, Excel file path, and debug output;
+        values not given are left as they are (diagnostics of a failure are never wiped).
+        Final states (FINAL_STATUSES) also record finished_at and duration_ms.
+
+        Args:
+            worker_id (str, optional): Only update the job while this worker still holds
+                its claim (see _held_by), so a reclaimed job keeps its new owner's outcome
+
+        Returns:
+            bool: True if the job exists (and is still held by worker_id) and was updated
+        """
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.connections.transaction() as conn:
                 cursor = conn.cursor()
-                extracted_data_str = json.dumps(extracted_data) if extracted_data else "{}"
-                debug_output_str = json.dumps(debug_output) if debug_output else "{}"
+                extracted_data_str = json.dumps(extracted_data) if extracted_data else None
+                debug_output_str = json.dumps(debug_output) if debug_output else None
+                final = status in FINAL_STATUSES
 
                 cursor.execute("""
-                    UPDATE cv_extractions 
-                    SET status = ?, extracted_data = ?, excel_file_path = ?, debug_output = ?
-                    WHERE id = ?
-                """, (status, extracted_data_str, excel_file, debug_output_str, job_id))
-                conn.commit()
+                    UPDATE cv_extractions
+                    SET status = ?, extracted_data = COALESCE(?, extracted_data),
+                        excel_file_path = COALESCE(?, excel_file_path), debug_output = COALESCE(?, debug_output),
+                        finished_at = CASE WHEN ? THEN {now} ELSE finished_at END,
+                        duration_ms = CASE WHEN ? AND started_at IS NOT NULL
+                            THEN CAST(ROUND((julianday({now}) - julianday(started_at)) * 86400000) AS INTEGER)
+                            ELSE duration_ms END
+                    WHERE id = ?{held}
+                """.format(now=self._NOW, held=self._held_by(worker_id)),
+                    (status, extracted_data_str, excel_file, debug_output_str, final, final, job_id,
+                     *self._owner(worker_id)))
+                if cursor.rowcount == 0:
+                    print(f"Error updating job status: job {job_id} not found"
+                          + (f" or no longer held by {worker_id}" if worker_id else ""))
+                    return False
                 print(f"Job {job_id} updated to status: {status}!")
+                return True
         except sqlite3.Error as e:
             print(f"Error updating job status: {e}")
-    def get_pending_jobs(self):
-            """Fetch all jobs that are still pending."""
-            try:
-                with sqlite3.connect(self.db_path) as conn:
-                    cursor = conn.cursor()
-                    cursor.execute("""
-                        SELECT id, pdf_filename, word_filename, pdf_content, word_content, status 
-                        FROM cv_extractions WHERE status = 'pending'
-                    """)
-                    jobs = cursor.fetchall()
-
-                    # Convert results to a list of dictionaries
-                    jobs_list = []
-                    for job in jobs:
-                        jobs_list.append({
-                            "id": job[0],
-                            "pdf_filename": job[1],
-                            "word_filename": job[2],
-                            "pdf_content": job[3],
-                            "word_content": job[4],
-                            "status": job[5]
-                        })
-
-                    return jobs_list  # Returns a list of pending jobs
-
-            except sqlite3.Error as e:
-                print(f"Error fetching pending jobs: {e}")
-                return []
-        
+            return False
+
+    def record_job_failure(self, job_id, error, debug_output=None, retry_in=None, status="dead_letter",
+                           worker_id=None):
+        """
+        Records a failed attempt: appends the error to the job's attempt log and stores
+        debug_output (the failure's diagnostics, e.g. the raw response).
+
+        Args:
+            retry_in (float, optional): Seconds until the job may be claimed again; it goes
+                back to 'pending'. Without it the job ends in status.
+            status (str): Final status when not retried ('failed' or 'dead_letter')
+            worker_id (str, optional): Only record it while this worker still holds the job
+
+        Returns:
+            bool: True if the job exists (and is still held by worker_id) and was updated
+        """
+        held, owner = self._held_by(worker_id), self._owner(worker_id)
+        try:
+            with self.connections.transaction(immediate=True) as conn:
+                row = conn.execute(f"SELECT attempts, attempt_log FROM cv_extractions WHERE id = ?{held}",
+                                   (job_id, *owner)).fetchone()
+                if row is None:
+                    print(f"Error recording job failure: job {job_id} not found"
+                          + (f" or no longer held by {worker_id}" if worker_id else ""))
+                    return False
+                attempts, attempt_log = row
+                log = self._append_attempt(attempt_log, attempts, error)
+                debug_output_str = json.dumps(dict(debug_output or {}, error=error))
+                if retry_in is not None:
+                    conn.execute("""
+                        UPDATE cv_extractions
+                        SET status = 'pending', worker_id = NULL, attempt_log = ?, debug_output = ?,
+                            retry_at = strftime('%Y-%m-%d %H:%M:%f', 'now', ?)
+                        WHERE id = ?{held}
+                    """.format(held=held), (json.dumps(log), debug_output_str, f"+{retry_in:.3f} seconds",
+                                            job_id, *owner))
+                else:
+                    conn.execute("""
+                        UPDATE cv_extractions
+                        SET status = ?, attempt_log = ?, debug_output = ?, retry_at = NULL,
+                            finished_at = {now},
+                            duration_ms = CASE WHEN started_at IS NOT NULL
+                                THEN CAST(ROUND((julianday({now}) - julianday(started_at)) * 86400000) AS INTEGER)
+                                END
+                        WHERE id = ?{held}
+                    """.format(now=self._NOW, held=held), (status, json.dumps(log), debug_output_str,
+                                                            job_id, *owner))
+            next_step = f"retry in {retry_in:.0f}s" if retry_in is not None else status
+            print(f"Job {job_id} attempt {attempts} failed ({next_step}): {error}")
+            return True
+        except sqlite3.Error as e:
+            print(f"Error recording job failure: {e}")
+            return False
+
+    def record_export(self, job_id, excel_file=None, error=None):
+        """
+        Records the Excel export of a 'done' job: the file its row was saved to, or (with
+        error) that the save failed. A failed export turns the job 'failed' with the error
+        in its attempt log and debug output, so it can be retried from the UI.
+
+        Returns:
+            bool: True if the job exists, is 'done' and was updated
+        """
+        try:
+            with self.connections.transaction(immediate=True) as conn:
+                if error is None:
+                    cursor = conn.execute(
+                        "UPDATE cv_extractions SET excel_file_path = ? WHERE id = ? AND status = 'done'",
+                        (excel_file, job_id)
+                    )
+                    return cursor.rowcount > 0
+                row = conn.execute("SELECT attempts, attempt_log FROM cv_extractions WHERE id = ? AND status = 'done'",
+                                   (job_id,)).fetchone()
+                if row is None:
+                    return False
+                log = json.dumps(self._append_attempt(row[1], row[0], error))
+                conn.execute("""
+                    UPDATE cv_extractions
+                    SET status = 'failed', excel_file_path = NULL, attempt_log = ?,
+                        debug_output = json_set(COALESCE(NULLIF(debug_output, ''), '{}'), '$.error', ?)
+                    WHERE id = ?
+                """, (log, error, job_id))
+            print(f"Job {job_id} export failed: {error}")
+            return True
+        except sqlite3.Error as e:
+            print(f"Error recording job export: {e}")
+            return False
+
+    @staticmethod
+    def _append_attempt(attempt_log, attempt, error):
+        """The attempt log (JSON text or None) as a list, with one more failed attempt."""
+        log = json.loads(attempt_log) if attempt_log else []
+        log.append({"attempt": attempt, "error": error,
+                    "at": datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")})
+        return log
+
+    def _reclaim_stale_jobs(self, conn):
+        """
+        Takes back 'processing' jobs whose worker stopped (no sign of life since the
+        staleness cutoff). The lost attempt is logged and stays counted: the job goes
+        back to 'pending', or to 'dead_letter' once it used up max_attempts.
+        """
+        stale = conn.execute(f"""
+            SELECT id, attempts, attempt_log, worker_id FROM cv_extractions
+            WHERE status = 'processing' AND {self._LAST_SEEN} < {self._live_since()}
+        """).fetchall()
+        for job_id, attempts, attempt_log, worker_id in stale:
+            error = f"Worker {worker_id or 'unknown'} stopped before finishing the job"
+            log = json.dumps(self._append_attempt(attempt_log, attempts, error))
+            if attempts >= self.max_attempts:
+                # json_set keeps the partial response streamed so far
+                conn.execute("""
+                    UPDATE cv_extractions
+                    SET status = 'dead_letter', attempt_log = ?,
+                        debug_output = json_set(COALESCE(NULLIF(debug_output, ''), '{{}}'), '$.error', ?),
+                        finished_at = {now},
+                        duration_ms = CAST(ROUND((julianday({now}) - julianday(started_at)) * 86400000) AS INTEGER)
+                    WHERE id = ?
+                """.format(now=self._NOW), (log, error, job_id))
+            else:
+                conn.execute("""
+                    UPDATE cv_extractions SET status = 'pending', worker_id = NULL, attempt_log = ?
+                    WHERE id = ?
+                """, (log, job_id))
+        if stale:
+            print(f"Reclaimed {len(stale)} job(s) from stopped workers")
+        return len(stale)
+
+    @staticmethod
+    def _held_by(worker_id):
+        """WHERE clause suffix restricting an update to jobs worker_id still holds ('' without one)."""
+        return " AND status = 'processing' AND worker_id = ?" if worker_id else ""
+
+    @staticmethod
+    def _owner(worker_id):
+        """The parameters of _held_by's clause."""
+        return (worker_id,) if worker_id else ()
+
+    def touch_jobs(self, job_ids, worker_id=None):
+        """
+        Records a sign of life of claimed jobs, e.g. of those still waiting in a worker's
+        queue (only of those worker_id still holds, if given).
+        """
+        if not job_ids:
+            return
+        placeholders = ",".join("?" * len(job_ids))
+        try:
+            with self.connections.transaction() as conn:
+                conn.execute(
+                    f"UPDATE cv_extractions SET heartbeat_at = {self._NOW} "
+                    f"WHERE id IN ({placeholders}) AND status = 'processing'{self._held_by(worker_id)}",
+                    [*job_ids, *self._owner(worker_id)]
+                )
+        except sqlite3.Error as e:
+            print(f"Error updating job heartbeat: {e}")
+
+    def get_job_attempts(self, job_id):
+        """Number of times the job was claimed (0 if it does not exist)."""
+        try:
+            with self.connections.reading() as conn:
+                row = conn.execute("SELECT attempts FROM cv_extractions WHERE id = ?", (job_id,)).fetchone()
+                return row[0] if row else 0
+        except sqlite3.Error as e:
+            print(f"Error fetching job attempts: {e}")
+            return 0
+
+    def get_attempt_log(self, job_id):
+        """The errors of the job's failed attempts: [{"attempt", "error", "at"}], oldest first."""
+        try:
+            with self.connections.reading() as conn:
+                row = conn.execute("SELECT attempt_log FROM cv_extractions WHERE id = ?", (job_id,)).fetchone()
+                return json.loads(row[0]) if row and row[0] else []
+        except sqlite3.Error as e:
+            print(f"Error fetching attempt log: {e}")
+            return []
+
+    def requeue_jobs(self, job_ids=None):
+        """
+        Puts failed and dead-lettered jobs (all, or the given ones) back into the queue with
+        fresh attempts, reusing their stored texts, so nothing has to be uploaded again.
+        The attempt log and diagnostics are kept.
+
+        Returns:
+            int: Number of jobs requeued
+        """
+        where = f"status IN ({', '.join('?' * len(FAILED_STATUSES))})"
+        params = list(FAILED_STATUSES)
+        if job_ids is not None:
+            job_ids = list(job_ids)
+            if not job_ids:
+                return 0
+            where += f" AND id IN ({', '.join('?' * len(job_ids))})"
+            params += job_ids
+        try:
+            with self.connections.transaction() as conn:
+                cursor = conn.execute(f"""
+                    UPDATE cv_extractions
+                    SET status = 'pending', attempts = 0, retry_at = NULL, worker_id = NULL,
+                        finished_at = NULL, duration_ms = NULL
+                    WHERE {where}
+                """, params)
+                print(f"{cursor.rowcount} job(s) requeued")
+                return cursor.rowcount
+        except sqlite3.Error as e:
+            print(f"Error requeueing jobs: {e}")
+            return 0
+
+    def update_job_progress(self, job_id, partial_response, tail_chars=2000):
+        """Stores the tail of a streaming LLM response so the UI can show progress."""
+        try:
+            with self.connections.transaction() as conn:
+                conn.execute(f"""
+                    UPDATE cv_extractions SET debug_output = ?, heartbeat_at = {self._NOW}
+                    WHERE id = ? AND status = 'processing'
+                """, (json.dumps({
+                    "partial_response": partial_response[-tail_chars:],
+                    "received_chars": len(partial_response)
+                }), job_id))
+        except sqlite3.Error as e:
+            print(f"Error updating job progress: {e}")
+
+    def record_prompt_stats(self, job_id, prompt_tokens, tokens_saved):
+        """Stores the (estimated) prompt size of a job and the tokens saved by compaction."""
+        try:
+            with self.connections.transaction() as conn:
+                conn.execute("""
+                    UPDATE cv_extractions SET prompt_tokens = ?, prompt_tokens_saved = ?
+                    WHERE id = ?
+                """, (prompt_tokens, tokens_saved, job_id))
+        except sqlite3.Error as e:
+            print(f"Error recording prompt stats: {e}")
+
+    def record_rule_fields(self, job_id, fields):
+        """Stores the fields found by the rule-based extractors ({field: {value, confidence, source}})."""
+        try:
+            with self.connections.transaction() as conn:
+                conn.execute("UPDATE cv_extractions SET rule_fields = ? WHERE id = ?", (json.dumps(fields), job_id))
+        except sqlite3.Error as e:
+            print(f"Error recording rule fields: {e}")
+
+    @staticmethod
+    def _insert_stage_timings(cursor, job_id, timings):
+        for stage, seconds in (timings or {}).items():
+            duration_ms = seconds * 1000
+            cursor.execute("INSERT INTO stage_timings (job_id, stage, duration_ms) VALUES (?, ?, ?)",
+                           (job_id, stage, duration_ms))
+            cursor.execute("""
+                INSERT INTO stage_histogram (stage, le, observations, total_ms) VALUES (?, ?, 1, ?)
+                ON CONFLICT (stage, le) DO UPDATE
+                SET observations = observations + 1, total_ms = total_ms + excluded.total_ms
+            """, (stage, bucket_label(seconds), duration_ms))
+
+    def record_stage_timings(self, job_id, timings):
+        """Stores how long a job spent in each pipeline stage ({stage: seconds}, see metrics.STAGES)."""
+        if not timings:
+            return
+        try:
+            with self.connections.transaction() as conn:
+                self._insert_stage_timings(conn.cursor(), job_id, timings)
+        except sqlite3.Error as e:
+            print(f"Error recording stage timings: {e}")
+
+    def get_stage_timings(self, job_ids):
+        """Stage timings of the given jobs: {job_id: {stage: total duration_ms}}."""
+        job_ids = list(job_ids)
+        if not job_ids:
+            return {}
+        try:
+            with self.connections.reading() as conn:
+                rows = conn.execute(f"""
+                    SELECT job_id, stage, SUM(duration_ms) FROM stage_timings
+                    WHERE job_id IN ({", ".join("?" * len(job_ids))})
+                    GROUP BY job_id, stage
+                """, job_ids).fetchall()
+        except sqlite3.Error as e:
+            print(f"Error fetching stage timings: {e}")
+            return {}
+        timings = {}
+        for job_id, stage, duration_ms in rows:
+            timings.setdefault(job_id, {})[stage] = duration_ms
+        return timings
+
+    def get_job_statuses(self, job_ids):
+        """Status of the given jobs: {job_id: (status, duration_ms, pdf_filename)}."""
+        job_ids = list(job_ids)
+        statuses = {}
+        try:
+            with self.connections.reading() as conn:
+                # Chunked to stay below SQLite's limit on bound parameters
+                for start in range(0, len(job_ids), 500):
+                    chunk = job_ids[start:start + 500]
+                    rows = conn.execute(f"""
+                        SELECT id, status, duration_ms, pdf_filename FROM cv_extractions
+                        WHERE id IN ({", ".join("?" * len(chunk))})
+                    """, chunk).fetchall()
+                    statuses.update((row[0], tuple(row[1:])) for row in rows)
+        except sqlite3.Error as e:
+            print(f"Error fetching job statuses: {e}")
+        return statuses
+
+    def get_recent_stage_timings(self, minutes):
+        """(stage, duration_ms) of every timing recorded in the last minutes."""
+        try:
+            with self.connections.reading() as conn:
+                return conn.execute("""
+                    SELECT stage, duration_ms FROM stage_timings
+                    WHERE recorded_at >= strftime('%Y-%m-%d %H:%M:%f', 'now', ?)
+                """, (f"-{minutes} minutes",)).fetchall()
+        except sqlite3.Error as e:
+            print(f"Error fetching recent stage timings: {e}")
+            return []
+
+    def get_stage_histograms(self):
+        """Running stage histograms: {stage: {le: (observations, total_ms)}}, buckets not cumulative."""
+        try:
+            with self.connections.reading() as conn:
+                rows = conn.execute("SELECT stage, le, observations, total_ms FROM stage_histogram").fetchall()
+        except sqlite3.Error as e:
+            print(f"Error fetching stage histograms: {e}")
+            return {}
+        histograms = {}
+        for stage, le, observations, total_ms in rows:
+            histograms.setdefault(stage, {})[le] = (observations, total_ms)
+        return histograms
+
+    def get_finished_jobs(self, minutes):
+        """finished_at, status and duration_ms of the jobs finished in the last minutes (UTC times)."""
+        try:
+            with self.connections.reading() as conn:
+                cursor = conn.execute("""
+                    SELECT id, finished_at, status, duration_ms FROM cv_extractions
+                    WHERE finished_at >= strftime('%Y-%m-%d %H:%M:%f', 'now', ?)
+                    ORDER BY finished_at
+                """, (f"-{minutes} minutes",))
+                columns = [description[0] for description in cursor.description]
+                return [dict(zip(columns, row)) for row in cursor.fetchall()]
+        except sqlite3.Error as e:
+            print(f"Error fetching finished jobs: {e}")
+            return []
+
+    def count_jobs_by_status(self):
+        try:
+            with self.connections.reading() as conn:
+                return dict(conn.execute("SELECT status, COUNT(*) FROM cv_extractions GROUP BY status").fetchall())
+        except sqlite3.Error as e:
+            print(f"Error counting jobs: {e}")
+            return {}
+
+    def count_job_attempts(self):
+        """Total number of job claims (first attempts and retries)."""
+        try:
+            with self.connections.reading() as conn:
+                return conn.execute("SELECT COALESCE(SUM(attempts), 0) FROM cv_extractions").fetchone()[0]
+        except sqlite3.Error as e:
+            print(f"Error counting job attempts: {e}")
+            return 0
+
+    def claim_next_jobs(self, limit, worker_id=None):
+        """
+        Atomically moves up to limit pending jobs to 'processing' and returns them: the
+        highest priority first, taking turns between submitters, oldest first otherwise
+        (see _SCHEDULE). Each claim counts as an attempt and records started_at and the
+        claiming worker_id. Jobs orphaned by a stopped worker are taken back first (see
+        _reclaim_stale_jobs).
+        """
+        try:
+            # BEGIN IMMEDIATE takes the write lock up front, so concurrent workers
+            # (threads or processes) queue up here instead of claiming the same row.
+            with self.connections.transaction(immediate=True) as conn:
+                self._reclaim_stale_jobs(conn)
+                rows = conn.execute("""
+                    UPDATE cv_extractions
+                    SET status = 'processing', attempts = attempts + 1, started_at = {now},
+                        heartbeat_at = {now}, finished_at = NULL, duration_ms = NULL, worker_id = ?,
+                        retry_at = NULL
+                    WHERE id IN ({schedule} LIMIT ?)
+                    RETURNING id, pdf_filename, word_filename, pdf_content, word_content, status,
+                              pdf_text_hash, word_text_hash
+                """.format(now=self._NOW, schedule=self._schedule()), (worker_id, limit)).fetchall()
+
+            cursor = self.connections.connection().cursor()
+            # RETURNING gives no order guarantee
+            return [self._resolve_contents(cursor, {
+                "id": job[0],
+                "pdf_filename": job[1],
+                "word_filename": job[2],
+                "pdf_content": job[3],
+                "word_content": job[4],
+                "status": job[5],
+                "pdf_text_hash": job[6],
+                "word_text_hash": job[7]
+            }) for job in sorted(rows)]
+        except sqlite3.Error as e:
+            print(f"Error claiming job: {e}")
+            return []
+
     def get_job_data(self, job_id):
         """Alias for get_extraction_by_id to match expected method name."""
         return self.get_extraction_by_id(job_id)
 
-    def mark_job_completed(self, job_id):
-        """Mark a job as completed."""
-        self.update_job_status(job_id, status="done")
+    def mark_job_completed(self, job_id, extracted_data=None, debug_output=None, worker_id=None):
+        """Mark a job as completed (only while worker_id still holds it, if given)."""
+        return self.update_job_status(job_id, status="done", extracted_data=extracted_data, debug_output=debug_output,
+                                      worker_id=worker_id)
 
-    def mark_job_failed(self, job_id):
-        """Mark a job as failed."""
-        self.update_job_status(job_id, status="failed")
@@ -0,0 +1,137 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Optional, Dict, Any
+
+from database.connection import ConnectionManager
+from database.migrations import migrate
+
+# Eviction limits (entries / days); 0 disables the corresponding limit
+DEFAULT_MAX_ENTRIES = 5000
+DEFAULT_MAX_AGE_DAYS = 30
+
+CACHE_MAX_ENTRIES = int(os.getenv("EXTRACTION_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES))
+CACHE_MAX_AGE_DAYS = float(os.getenv("EXTRACTION_CACHE_MAX_AGE_DAYS", DEFAULT_MAX_AGE_DAYS))
+CACHE_BYPASS = os.getenv("EXTRACTION_CACHE_BYPASS", "0") == "1"
+
+
+class ExtractionCache:
+    """
+    Persistent cache of raw LLM responses keyed by a hash of (model, prompt).
+
+    The prompt embeds the instruction template, the CV text and the application
+    text, so a re-submitted document pair maps to the same key.
+    """
+
+    def __init__(self, db_path: str, max_entries: int = CACHE_MAX_ENTRIES,
+                 max_age_days: float = CACHE_MAX_AGE_DAYS):
+        self.db_path = db_path
+        self.connections = ConnectionManager(db_path)
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_days * 86400
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.initialize_cache()
+
+    def initialize_cache(self):
+        """Brings the database schema, which holds the cache table, up to date (see database.migrations)."""
+        try:
+            migrate(self.connections)
+        except sqlite3.Error as e:
+            print(f"Error initializing extraction cache: {e}")
+
+    @staticmethod
+    def make_key(prompt: str, model: str) -> str:
+        """Returns the content hash used as cache key."""
+        digest = hashlib.sha256()
+        digest.update(model.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(prompt.encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, cache_key: str) -> Optional[str]:
+        """Returns the cached response, or None on a miss or an expired entry."""
+        now = time.time()
+        try:
+            with self.connections.transaction() as conn:
+                row = conn.execute(
+                    'SELECT response, created_at FROM llm_cache WHERE cache_key = ?', (cache_key,)
+                ).fetchone()
+                if row and self.max_age_seconds and now - row[1] > self.max_age_seconds:
+                    conn.execute('DELETE FROM llm_cache WHERE cache_key = ?', (cache_key,))
+                    row = None
+                if row:
+                    conn.execute(
+                        'UPDATE llm_cache SET last_used_at = ?, hit_count = hit_count + 1 WHERE cache_key = ?',
+                        (now, cache_key)
+                    )
+        except sqlite3.Error as e:
+            print(f"Error reading extraction cache: {e}")
+            row = None
+
+        with self._lock:
+            if row:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return row[0] if row else None
+
+    def contains(self, cache_key: str) -> bool:
+        """Whether an unexpired response is cached; unlike get, no hit or miss is counted."""
+        try:
+            with self.connections.reading() as conn:
+                row = conn.execute('SELECT created_at FROM llm_cache WHERE cache_key = ?', (cache_key,)).fetchone()
+        except sqlite3.Error as e:
+            print(f"Error reading extraction cache: {e}")
+            return False
+        return row is not None and not (self.max_age_seconds and time.time() - row[0] > self.max_age_seconds)
+
+    def put(self, cache_key: str, model: str, response: str) -> None:
+        """Stores a response and evicts entries past the age/size limits."""
+        now = time.time()
+        try:
+            with self.connections.transaction() as conn:
+                conn.execute('''
+                    INSERT OR REPLACE INTO llm_cache (cache_key, model, response, created_at, last_used_at)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (cache_key, model, response, now, now))
+                self._evict(conn, now)
+        except sqlite3.Error as e:
+            print(f"Error writing extraction cache: {e}")
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        if self.max_age_seconds:
+            conn.execute('DELETE FROM llm_cache WHERE created_at < ?', (now - self.max_age_seconds,))
+        if self.max_entries:
+            # Least recently used entries go first
+            conn.execute('''
+                DELETE FROM llm_cache WHERE cache_key IN (
+                    SELECT cache_key FROM llm_cache
+                    ORDER BY last_used_at DESC
+                    LIMIT -1 OFFSET ?
+                )
+            ''', (self.max_entries,))
+
+    def clear(self) -> None:
+        """Removes every cached response."""
+        with self.connections.transaction() as conn:
+            conn.execute('DELETE FROM llm_cache')
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters of this process plus the current number of entries."""
+        try:
+            with self.connections.reading() as conn:
+                entries = conn.execute('SELECT COUNT(*) FROM llm_cache').fetchone()[0]
+        except sqlite3.Error:
+            entries = None
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": entries
+            }
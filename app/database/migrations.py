@@ -0,0 +1,214 @@
+"""
+Versioned schema migrations for the extraction database.
+
+The schema version is kept in SQLite's ``PRAGMA user_version``. ``migrate``
+applies every migration above the stored version, in order, each in its own
+transaction together with the version bump, so it is safe to call on every
+start-up and from several processes at once.
+
+Databases created before versioning (user_version 0) may already contain some
+of the tables and columns below, so migrations only create what is missing.
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _add_columns(conn, table, columns):
+    """Adds the columns the table does not have yet."""
+    existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    for name, declaration in columns.items():
+        if name not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {declaration}")
+
+
+def _create_base_tables(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS cv_extractions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            pdf_filename TEXT,
+            word_filename TEXT,
+            pdf_content TEXT,
+            word_content TEXT,
+            status TEXT DEFAULT 'pending',
+            excel_file_path TEXT,
+            debug_output TEXT,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def _add_document_store(conn):
+    # Extracted texts are stored once, compressed, and referenced by hash
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS documents (
+            text_hash TEXT PRIMARY KEY,
+            content BLOB,
+            size INTEGER,
+            created DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    # Uploaded file bytes hash -> extracted text, to skip re-parsing known files
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS document_files (
+            file_hash TEXT PRIMARY KEY,
+            text_hash TEXT REFERENCES documents(text_hash),
+            filename TEXT
+        )
+    ''')
+    _add_columns(conn, "cv_extractions", {
+        "pdf_text_hash": "TEXT",
+        "word_text_hash": "TEXT"
+    })
+
+
+def _add_listing_indexes(conn):
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_cv_extractions_status ON cv_extractions (status)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_cv_extractions_timestamp ON cv_extractions (timestamp)')
+
+
+def _add_job_state(conn):
+    _add_columns(conn, "cv_extractions", {
+        "extracted_data": "TEXT",
+        "attempts": "INTEGER NOT NULL DEFAULT 0",
+        "started_at": "DATETIME",
+        "finished_at": "DATETIME",
+        "worker_id": "TEXT",
+        "duration_ms": "INTEGER"
+    })
+    # Claims pick the oldest pending job: served from the index without sorting
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_cv_extractions_status_id ON cv_extractions (status, id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_cv_extractions_worker ON cv_extractions (worker_id, status)')
+    # Superseded by the (status, id) index
+    conn.execute('DROP INDEX IF EXISTS idx_cv_extractions_status')
+
+
+def _add_prompt_stats(conn):
+    _add_columns(conn, "cv_extractions", {
+        "prompt_tokens": "INTEGER",
+        "prompt_tokens_saved": "INTEGER"
+    })
+
+
+def _add_rule_fields(conn):
+    _add_columns(conn, "cv_extractions", {"rule_fields": "TEXT"})
+
+
+def _add_stage_timings(conn):
+    # One row per job and pipeline stage, for per-job and recent-window views
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS stage_timings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            job_id INTEGER NOT NULL,
+            stage TEXT NOT NULL,
+            duration_ms REAL NOT NULL,
+            recorded_at DATETIME NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_stage_timings_job ON stage_timings (job_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_stage_timings_recorded ON stage_timings (recorded_at)')
+    # Running histogram per stage (le = bucket upper bound), so a metrics scrape
+    # reads a few rows instead of every timing ever recorded
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS stage_histogram (
+            stage TEXT NOT NULL,
+            le TEXT NOT NULL,
+            observations INTEGER NOT NULL DEFAULT 0,
+            total_ms REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (stage, le)
+        ) WITHOUT ROWID
+    ''')
+    # Throughput over recent windows
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_cv_extractions_finished ON cv_extractions (finished_at)')
+
+
+def _add_scheduling(conn):
+    _add_columns(conn, "cv_extractions", {
+        "priority": "INTEGER NOT NULL DEFAULT 0",
+        "submitter": "TEXT NOT NULL DEFAULT ''"
+    })
+    # Claims rank the pending jobs per priority and submitter, oldest first
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_cv_extractions_schedule '
+                 'ON cv_extractions (status, priority, submitter, id)')
+
+
+def _add_retries(conn):
+    _add_columns(conn, "cv_extractions", {
+        # A failed job waiting for its next attempt is not claimed before retry_at
+        "retry_at": "DATETIME",
+        # JSON list of the errors of every failed attempt, kept across retries
+        "attempt_log": "TEXT"
+    })
+
+
+def _add_heartbeat(conn):
+    _add_columns(conn, "cv_extractions", {
+        # Last sign of life of a claimed job; a 'processing' job silent for too long
+        # belongs to a stopped worker and is claimed again
+        "heartbeat_at": "DATETIME"
+    })
+
+
+def _create_llm_cache(conn):
+    # Created by ExtractionCache itself before it was part of the schema
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS llm_cache (
+            cache_key TEXT PRIMARY KEY,
+            model TEXT,
+            response TEXT,
+            created_at REAL,
+            last_used_at REAL,
+            hit_count INTEGER DEFAULT 0
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used ON llm_cache (last_used_at)')
+
+
+# (version, description, function); versions must be consecutive and never reused
+MIGRATIONS = [
+    (1, "create cv_extractions", _create_base_tables),
+    (2, "content-addressed document store", _add_document_store),
+    (3, "listing indexes", _add_listing_indexes),
+    (4, "job state columns and worker indexes", _add_job_state),
+    (5, "prompt token statistics", _add_prompt_stats),
+    (6, "rule-based field results", _add_rule_fields),
+    (7, "stage timings", _add_stage_timings),
+    (8, "job priority and submitter", _add_scheduling),
+    (9, "job retries and attempt log", _add_retries),
+    (10, "job heartbeat", _add_heartbeat),
+    (11, "LLM response cache", _create_llm_cache),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(connections):
+    """
+    Brings the database up to SCHEMA_VERSION.
+
+    Args:
+        connections (ConnectionManager): Connections of the database to migrate
+
+    Returns:
+        int: Number of migrations applied
+    """
+    with connections.reading() as conn:
+        if get_schema_version(conn) >= SCHEMA_VERSION:
+            return 0
+
+    applied = 0
+    for version, description, upgrade in MIGRATIONS:
+        # The write lock is taken before re-reading the version, so concurrent
+        # start-ups apply each migration exactly once.
+        with connections.transaction(immediate=True) as conn:
+            if get_schema_version(conn) >= version:
+                continue
+            upgrade(conn)
+            conn.execute(f"PRAGMA user_version = {version}")
+        logger.info(f"Applied database migration {version}: {description}")
+        applied += 1
+    return applied
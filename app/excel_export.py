@@ -0,0 +1,385 @@
+"""
+Export of extracted applicant data into the Excel template.
+
+``ExcelBatchWriter`` keeps the output workbook and the next free row in memory,
+buffers any number of validated rows and saves them in one go: when ``max_batch``
+rows are pending, ``max_delay`` seconds after the first unsaved row, or on
+``flush()``/``close()`` (also registered for interpreter exit).
+
+``ExcelExportWriter`` is the single writer stage on top of it: producers only
+validate a record and enqueue its row, one thread owns the workbook. Saves go to
+a temporary file that is renamed over the export, under an inter-process lock,
+so a crash never leaves a truncated file and several worker processes can append
+to the same export.
+
+Rows that cannot be saved (openpyxl rejects a value, or the save itself fails)
+are appended to ``<export>.quarantine.jsonl`` and dropped from the buffer, so one
+bad row never blocks the rows submitted after it. A row's ``on_saved`` callback
+learns the outcome once its batch was saved or quarantined, and how long the save took.
+"""
+import os
+import json
+import time
+import queue
+import atexit
+import shutil
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import openpyxl
+
+from Utilities import find_next_empty_row, get_template_plan
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 20
+DEFAULT_FLUSH_INTERVAL = 10.0
+
+EXCEL_BATCH_SIZE = int(os.getenv("EXCEL_BATCH_SIZE", DEFAULT_BATCH_SIZE))
+EXCEL_FLUSH_INTERVAL = float(os.getenv("EXCEL_FLUSH_INTERVAL", DEFAULT_FLUSH_INTERVAL))
+
+# on_saved(error or None, seconds the row's batch took to save)
+SaveCallback = Callable[[Optional[Exception], float], None]
+
+
+@contextmanager
+def export_file_lock(path: str):
+    """Exclusive lock shared by all processes writing the given file."""
+    with open(f"{path}.lock", "a+b") as handle:
+        if fcntl:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+        else:
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+            else:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def save_workbook_atomic(wb, path: str) -> None:
+    """Saves to a temporary file next to path and renames it over path."""
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        wb.save(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _file_stamp(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class ExcelBatchWriter:
+    def __init__(self, template_path: str, output_path: str,
+                 max_batch: int = EXCEL_BATCH_SIZE, max_delay: float = EXCEL_FLUSH_INTERVAL):
+        self.template_path = template_path
+        self.output_path = output_path
+        self.max_batch = max(1, max_batch)
+        self.max_delay = max_delay
+
+        self._lock = threading.RLock()
+        self._wb = None
+        self._ws = None
+        self._next_row = None
+        self._stamp = None
+        self._pending: List[list] = []
+        self._callbacks: List[Optional[SaveCallback]] = []
+        self._timer: Optional[threading.Timer] = None
+        atexit.register(self.close)
+
+    @property
+    def plan(self):
+        return get_template_plan(self.template_path)
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    @property
+    def quarantine_path(self) -> str:
+        return f"{self.output_path}.quarantine.jsonl"
+
+    def _quarantine(self, rows: List[Tuple[list, Exception]]) -> None:
+        """Appends rows that could not be saved, with their error, to the quarantine file."""
+        stamp = time.strftime("%Y-%m-%d %H:%M:%S")
+        try:
+            with open(self.quarantine_path, "a", encoding="utf-8") as f:
+                for values, error in rows:
+                    f.write(json.dumps({"at": stamp, "error": str(error), "row": values},
+                                       ensure_ascii=False, default=str) + "\n")
+        except OSError as e:
+            logger.error(f"Could not quarantine {len(rows)} row(s): {e}")
+            return
+        logger.error(f"Quarantined {len(rows)} row(s) in {self.quarantine_path}")
+
+    def _open(self) -> None:
+        """(Re)loads the output workbook unless the in-memory copy is still current."""
+        if self._wb is not None and _file_stamp(self.output_path) == self._stamp:
+            return
+        if not os.path.exists(self.output_path):
+            if not os.path.exists(self.template_path):
+                raise FileNotFoundError(f"Template file not found at {self.template_path}")
+            shutil.copy(self.template_path, self.output_path)
+            logger.info(f"Created new output file from template at: {self.output_path}")
+        elif self._wb is not None:
+            logger.info(f"{self.output_path} was changed by another writer, reloading")
+
+        self._wb = openpyxl.load_workbook(self.output_path)
+        self._ws = self._wb.active
+        # Scan once per load; afterwards the next free row is tracked directly
+        self._next_row = find_next_empty_row(self._ws)
+        self._stamp = _file_stamp(self.output_path)
+
+    def add(self, json_data: Dict[str, Any]) -> None:
+        """
+        Buffers one applicant's row.
+
+        Raises:
+            ValueError: If the JSON data is missing required fields (nothing is buffered)
+        """
+        self.add_row(self.plan.build_row(json_data))
+
+    def add_row(self, values: list, on_saved: Optional[SaveCallback] = None) -> None:
+        """
+        Buffers an already built row (see TemplatePlan.build_row). on_saved is called
+        with None once the row is saved, or with the error once it was quarantined,
+        and the seconds its batch took to save.
+        """
+        with self._lock:
+            self._pending.append(values)
+            self._callbacks.append(on_saved)
+            if len(self._pending) >= self.max_batch:
+                self.flush()
+            elif self._timer is None and self.max_delay > 0:
+                self._timer = threading.Timer(self.max_delay, self._timed_flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self) -> None:
+        """
+        Appends all pending rows to the output file and saves it atomically.
+
+        Rows openpyxl rejects are quarantined and the others saved; if the save
+        fails, the whole batch is quarantined. Either way no row stays pending.
+
+        Raises:
+            Exception: The first rejected row's error or the failed save's, once quarantined
+        """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._pending:
+                return
+            started = time.perf_counter()
+            batch, self._pending = self._pending, []
+            callbacks, self._callbacks = self._callbacks, []
+            rejected = []
+            try:
+                with export_file_lock(self.output_path):
+                    self._open()
+                    first_row = row = self._next_row
+                    for index, values in enumerate(batch):
+                        try:
+                            for col_idx, value in enumerate(values, 1):
+                                self._ws.cell(row=row, column=col_idx, value=value)
+                        except Exception as e:
+                            # Clear what was written of the row; the next row reuses it
+                            for col_idx in range(1, len(values) + 1):
+                                self._ws.cell(row=row, column=col_idx).value = None
+                            rejected.append((index, values, e))
+                            continue
+                        row += 1
+                    if row > first_row:
+                        save_workbook_atomic(self._wb, self.output_path)
+                        self._stamp = _file_stamp(self.output_path)
+                    self._next_row = row
+            except Exception as e:
+                # The in-memory sheet may hold half-written rows; reload on the next flush.
+                self._wb = None
+                logger.error(f"Error saving Excel export: {e}")
+                self._quarantine([(values, e) for values in batch])
+                self._notify(callbacks, [e] * len(batch), time.perf_counter() - started)
+                raise
+            errors: List[Optional[Exception]] = [None] * len(batch)
+            for index, _, error in rejected:
+                errors[index] = error
+            seconds = time.perf_counter() - started
+            self._notify(callbacks, errors, seconds)
+            if row > first_row:
+                logger.info(f"Saved {row - first_row} row(s) to {self.output_path} "
+                            f"(rows {first_row}-{row - 1}) in {seconds:.2f}s")
+            if rejected:
+                logger.error(f"Excel rejected {len(rejected)} row(s): {rejected[0][2]}")
+                self._quarantine([(values, error) for _, values, error in rejected])
+                raise rejected[0][2]
+
+    @staticmethod
+    def _notify(callbacks: list, errors: List[Optional[Exception]], seconds: float) -> None:
+        for on_saved, error in zip(callbacks, errors):
+            if on_saved is None:
+                continue
+            try:
+                on_saved(error, seconds)
+            except Exception as e:
+                logger.error(f"Error reporting an Excel row's outcome: {e}")
+
+    def _timed_flush(self) -> None:
+        try:
+            self.flush()
+        except Exception:
+            pass  # already logged and quarantined
+
+    def close(self) -> None:
+        """Flushes pending rows and releases the workbook."""
+        with self._lock:
+            try:
+                self.flush()
+            finally:
+                self._pending, self._callbacks = [], []
+                self._wb = self._ws = self._next_row = self._stamp = None
+
+
+class ExcelExportWriter:
+    """
+    Single writer thread that owns the export workbook.
+
+    Producers call ``build_row`` and ``submit_row`` from any thread. The record is
+    validated and turned into a row in the caller (so invalid data fails that job
+    right away), and only the finished row crosses the queue. ``last_error`` holds the most recent save
+    error of the writer thread.
+    """
+
+    _STOP = object()
+
+    class _FlushRequest:
+        def __init__(self):
+            self.done = threading.Event()
+            self.error: Optional[Exception] = None
+
+    def __init__(self, template_path: str, output_path: str,
+                 max_batch: int = EXCEL_BATCH_SIZE, max_delay: float = EXCEL_FLUSH_INTERVAL):
+        self.max_delay = max_delay
+        # Time-based flushing is driven by the writer thread, not a timer
+        self._batch = ExcelBatchWriter(template_path, output_path, max_batch=max_batch, max_delay=0)
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self.last_error: Optional[Exception] = None
+        self._error_since_flush: Optional[Exception] = None
+        self._thread = threading.Thread(target=self._run, name="excel-export-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def build_row(self, json_data: Dict[str, Any]) -> list:
+        """
+        Validates a record and returns its row, ready for ``submit_row``.
+
+        Raises:
+            ValueError: If the JSON data is missing required fields
+        """
+        return self._batch.plan.build_row(json_data)
+
+    def submit_row(self, values: list, on_saved: Optional[SaveCallback] = None) -> None:
+        """
+        Queues a row built by ``build_row`` for the writer thread. on_saved is called
+        on that thread once the row is saved (with None) or quarantined (with the error),
+        with the seconds the save took.
+        """
+        self._queue.put((values, on_saved))
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Blocks until everything submitted so far is saved.
+
+        Returns:
+            bool: False on timeout, or if a save since the previous flush failed
+                (the error is in ``last_error``; the rows were quarantined)
+        """
+        if not self._thread.is_alive():
+            return False
+        request = self._FlushRequest()
+        self._queue.put(request)
+        if not request.done.wait(timeout):
+            return False
+        return request.error is None
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Saves outstanding rows and stops the writer thread."""
+        if self._thread.is_alive():
+            self._queue.put(self._STOP)
+            self._thread.join(timeout)
+
+    def _run(self) -> None:
+        oldest = None
+        while True:
+            wait = None
+            if oldest is not None:
+                wait = max(0.0, oldest + self.max_delay - time.monotonic())
+            try:
+                item = self._queue.get(timeout=wait)
+            except queue.Empty:
+                item = None
+
+            if isinstance(item, tuple):
+                try:
+                    self._batch.add_row(*item)
+                except Exception as e:
+                    self._record_error(e)  # a full batch failed to save; already logged and quarantined
+                if not self._batch.pending:
+                    oldest = None
+                elif oldest is None:
+                    oldest = time.monotonic()
+                continue
+
+            # Timeout, flush request or stop: save what we have
+            try:
+                self._batch.flush()
+            except Exception as e:
+                self._record_error(e)
+            oldest = None
+            if isinstance(item, self._FlushRequest):
+                item.error, self._error_since_flush = self._error_since_flush, None
+                item.done.set()
+            elif item is self._STOP:
+                try:
+                    self._batch.close()
+                except Exception:
+                    pass
+                return
+
+    def _record_error(self, error: Exception) -> None:
+        self.last_error = error
+        if self._error_since_flush is None:
+            self._error_since_flush = error
+
+
+_writers: Dict[str, ExcelExportWriter] = {}
+_writers_lock = threading.Lock()
+
+
+def get_export_writer(template_path: str, output_path: str) -> ExcelExportWriter:
+    """Returns the process-wide writer for an export file, starting it on first use."""
+    key = os.path.abspath(output_path)
+    with _writers_lock:
+        writer = _writers.get(key)
+        if writer is None:
+            writer = _writers[key] = ExcelExportWriter(template_path, output_path)
+        return writer
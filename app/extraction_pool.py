@@ -0,0 +1,186 @@
+"""
+Parallel text extraction for uploaded CVs and applications.
+
+Each document is parsed in its own short-lived child process (at most
+``max_workers`` at a time), so parsing uses all cores and a pathological PDF can
+be killed when it exceeds its per-file timeout without stalling the batch.
+Results are yielded as soon as each file finishes.
+
+When a document store (``DatabaseManager``) is passed, files whose bytes were
+parsed before are answered from it without extraction, and new texts are
+recorded in it. Documents may be given as bytes or as files spooled to disk
+(``upload_store.StoredFile``); the latter are read by the child process, so
+their contents never pass through the caller.
+"""
+import io
+import os
+import sys
+import time
+import logging
+import multiprocessing
+from collections import deque
+from multiprocessing.connection import wait
+from typing import Hashable, Iterable, Iterator, NamedTuple, Optional, Tuple, Union
+
+from Utilities import extract_text_from_pdf, extract_text_from_word
+from database.db_manager import content_hash
+from upload_store import StoredFile
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 60.0
+
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", os.cpu_count() or 2))
+EXTRACTION_TIMEOUT = float(os.getenv("EXTRACTION_TIMEOUT", DEFAULT_TIMEOUT))
+
+
+# File contents, or a file spooled to disk
+Source = Union[bytes, StoredFile]
+
+
+class ExtractionResult(NamedTuple):
+    key: Hashable
+    name: str
+    text: str
+    error: Optional[str]
+    seconds: float
+
+
+def _extract_stream(name: str, stream) -> str:
+    lower_name = name.lower()
+    if lower_name.endswith(".pdf"):
+        return extract_text_from_pdf(stream)
+    if lower_name.endswith(".docx"):
+        return extract_text_from_word(stream)
+    raise ValueError(f"Unsupported file type: {name}")
+
+
+def extract_document_text(name: str, data: bytes) -> str:
+    """Extracts text from PDF or Word file contents, based on the file name."""
+    return _extract_stream(name, io.BytesIO(data))
+
+
+def extract_source_text(name: str, source: Source) -> str:
+    """extract_document_text for bytes or a spooled file (parsed straight from disk)."""
+    if isinstance(source, StoredFile):
+        with open(source.path, "rb") as f:
+            return _extract_stream(name, f)
+    return extract_document_text(name, source)
+
+
+def _source_hash(source: Source) -> str:
+    return source.file_hash if isinstance(source, StoredFile) else content_hash(source)
+
+
+def extract_document_text_cached(name: str, data: Source, store=None) -> str:
+    """Like extract_document_text, but reuses the text of identical files from the store."""
+    if store is None:
+        return extract_source_text(name, data)
+    file_hash = _source_hash(data)
+    text = store.get_text_for_file(file_hash)
+    if text is None:
+        text = extract_source_text(name, data)
+        store.remember_file_text(file_hash, name, text)
+    return text
+
+
+def _extract_in_child(conn, name: str, data: Source) -> None:
+    try:
+        conn.send((extract_source_text(name, data), None))
+    except Exception as e:
+        conn.send(("", f"{type(e).__name__}: {e}"))
+    finally:
+        conn.close()
+
+
+def _get_context():
+    # Forking the Streamlit process (with its worker threads) is unsafe; a fork
+    # server starts children from a clean, single-threaded process instead.
+    if sys.platform != "win32":
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload(["Utilities"])
+        return context
+    return multiprocessing.get_context("spawn")
+
+
+def extract_documents_parallel(documents: Iterable[Tuple[Hashable, str, Source]],
+                               max_workers: int = EXTRACTION_WORKERS,
+                               timeout: float = EXTRACTION_TIMEOUT,
+                               store=None) -> Iterator[ExtractionResult]:
+    """
+    Extracts text from many documents in parallel, yielding results as they complete.
+
+    Args:
+        documents: (key, file name, file bytes or StoredFile) tuples; the key is passed through to the result
+        max_workers (int): Maximum number of files parsed at the same time
+        timeout (float): Seconds a single file may take before its process is killed
+        store (DatabaseManager, optional): Document store for skipping already parsed files
+
+    Yields:
+        ExtractionResult: One per document, in completion order. Failed or timed out
+        files carry an error message and empty text.
+    """
+    todo = deque()
+    # Identical files in one batch (e.g. the same application template) are parsed once
+    same_file: dict = {}
+    for key, name, data in documents:
+        file_hash = _source_hash(data)
+        if file_hash in same_file:
+            same_file[file_hash].append((key, name))
+            continue
+        if store is not None:
+            text = store.get_text_for_file(file_hash)
+            if text is not None:
+                yield ExtractionResult(key, name, text, None, 0.0)
+                continue
+        same_file[file_hash] = []
+        todo.append((key, name, data, file_hash))
+
+    context = _get_context()
+    running: dict = {}
+    max_workers = max(1, max_workers)
+
+    try:
+        while todo or running:
+            while todo and len(running) < max_workers:
+                key, name, data, file_hash = todo.popleft()
+                receiver, sender = context.Pipe(duplex=False)
+                process = context.Process(target=_extract_in_child, args=(sender, name, data), daemon=True)
+                process.start()
+                sender.close()
+                running[receiver] = (key, name, process, time.monotonic(), file_hash)
+
+            next_deadline = min(entry[3] for entry in running.values()) + timeout
+            for receiver in wait(list(running), timeout=max(0.0, next_deadline - time.monotonic())):
+                key, name, process, started, file_hash = running.pop(receiver)
+                try:
+                    text, error = receiver.recv()
+                except EOFError:
+                    text, error = "", f"Extraction process exited with code {process.exitcode}"
+                receiver.close()
+                process.join()
+                if store is not None and error is None:
+                    store.remember_file_text(file_hash, name, text)
+                seconds = time.monotonic() - started
+                yield ExtractionResult(key, name, text, error, seconds)
+                for duplicate_key, duplicate_name in same_file[file_hash]:
+                    yield ExtractionResult(duplicate_key, duplicate_name, text, error, seconds)
+
+            now = time.monotonic()
+            for receiver, (key, name, process, started, file_hash) in list(running.items()):
+                if now - started >= timeout:
+                    logger.warning(f"Text extraction for {name} timed out after {timeout:.0f}s")
+                    del running[receiver]
+                    process.kill()
+                    process.join()
+                    receiver.close()
+                    error = f"Timed out after {timeout:.0f}s"
+                    yield ExtractionResult(key, name, "", error, now - started)
+                    for duplicate_key, duplicate_name in same_file[file_hash]:
+                        yield ExtractionResult(duplicate_key, duplicate_name, "", error, now - started)
+    finally:
+        # Consumer stopped early or an error occurred: don't leave children behind
+        for receiver, (_, _, process, _, _) in running.items():
+            process.kill()
+            process.join()
+            receiver.close()
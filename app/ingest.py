@@ -0,0 +1,219 @@
+"""
+Headless intake of CV/application pairs from a directory or zip archive.
+
+Files are paired by name (see pairing.py), parsed in parallel child processes
+a chunk at a time (so only one chunk of file bytes is held in memory) and all
+pairs are queued in one transaction. With ``--wait`` the command follows the
+jobs until they finish and prints each completion; ``--run-worker`` also
+processes them in this process, for hosts without a running ``worker.py``.
+
+Run from the ``app`` directory:
+    python ingest.py /data/intake/2024-10-01
+    python ingest.py applications.zip --wait --run-worker
+    python ingest.py /data/intake --dry-run
+"""
+import os
+import sys
+import time
+import zipfile
+import getpass
+import argparse
+from typing import Callable, Dict, Iterator, List, NamedTuple, Tuple
+
+from pairing import SUPPORTED_EXTENSIONS, pair_documents
+from extraction_pool import extract_documents_parallel, EXTRACTION_WORKERS, EXTRACTION_TIMEOUT
+from shared_database import get_db
+from database.db_manager import (QueueFullError, PRIORITY_BULK, PRIORITY_INTERACTIVE,
+                                 FAILED_STATUSES, FINAL_STATUSES)
+from metrics import format_eta
+
+# Files parsed per chunk; bounds the file bytes held in memory at once
+DEFAULT_CHUNK_SIZE = 200
+DEFAULT_WAIT_INTERVAL = 2.0
+PRIORITIES = {"bulk": PRIORITY_BULK, "interactive": PRIORITY_INTERACTIVE}
+
+
+class SourceFile(NamedTuple):
+    name: str  # path relative to the source directory or inside the archive
+    read: Callable[[], bytes]
+
+
+def _skipped(name: str) -> bool:
+    parts = name.replace("\\", "/").split("/")
+    # Hidden files, macOS archive metadata and Office lock files
+    return any(part.startswith((".", "~$")) or part == "__MACOSX" for part in parts)
+
+
+def scan_source(path: str) -> List[SourceFile]:
+    """Lists the PDF/DOCX files of a directory (recursively) or zip archive, sorted by name."""
+    files = []
+    if zipfile.is_zipfile(path):
+        archive = zipfile.ZipFile(path)
+        for info in archive.infolist():
+            if not info.is_dir() and info.filename.lower().endswith(SUPPORTED_EXTENSIONS) \
+                    and not _skipped(info.filename):
+                files.append(SourceFile(info.filename, lambda info=info: archive.read(info)))
+    elif os.path.isdir(path):
+        for root, dirs, names in os.walk(path):
+            dirs[:] = [directory for directory in dirs if not _skipped(directory)]
+            for name in names:
+                full_path = os.path.join(root, name)
+                relative = os.path.relpath(full_path, path).replace(os.sep, "/")
+                if name.lower().endswith(SUPPORTED_EXTENSIONS) and not _skipped(relative):
+                    files.append(SourceFile(relative, lambda full_path=full_path: _read_file(full_path)))
+    else:
+        raise ValueError(f"Not a directory or zip archive: {path}")
+    return sorted(files, key=lambda source: source.name)
+
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _chunks(items: List, size: int) -> Iterator[List]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def extract_pairs(files: List[SourceFile], pairs: List[Tuple[int, int]], chunk_size: int = DEFAULT_CHUNK_SIZE,
+                  max_workers: int = EXTRACTION_WORKERS,
+                  timeout: float = EXTRACTION_TIMEOUT) -> Tuple[List[dict], Dict[int, str]]:
+    """
+    Extracts the texts of all pairs.
+
+    Returns:
+        tuple: (job dicts for DatabaseManager.add_jobs, {pair index: error} for pairs that failed)
+    """
+    texts, seconds, errors = {}, {}, {}
+    documents = [(index, role, file_index) for index, pair in enumerate(pairs)
+                 for role, file_index in zip(("cv", "application"), pair)]
+    done = 0
+    for chunk in _chunks(documents, max(2, chunk_size)):
+        batch = [((index, role), files[file_index].name, files[file_index].read())
+                 for index, role, file_index in chunk]
+        for result in extract_documents_parallel(batch, max_workers=max_workers, timeout=timeout, store=get_db()):
+            index, role = result.key
+            if result.error:
+                errors.setdefault(index, f"{result.name}: {result.error}")
+            else:
+                texts[result.key] = result.text
+                seconds[index] = seconds.get(index, 0.0) + result.seconds
+        done += len(chunk)
+        print(f"Extracted {done}/{len(documents)} files", flush=True)
+
+    jobs = []
+    for index, (cv_index, application_index) in enumerate(pairs):
+        if index in errors:
+            continue
+        cv_text, application_text = texts[(index, "cv")], texts[(index, "application")]
+        if not cv_text.strip() or not application_text.strip():
+            errors[index] = "empty or unreadable document"
+            continue
+        jobs.append({
+            "pdf_filename": files[cv_index].name,
+            "word_filename": files[application_index].name,
+            "pdf_content": cv_text,
+            "word_content": application_text,
+            "stage_timings": {"text_extraction": seconds.get(index, 0.0)}
+        })
+    return jobs, errors
+
+
+def wait_for_jobs(job_ids: List[int], interval: float = DEFAULT_WAIT_INTERVAL) -> Dict[int, str]:
+    """Polls the jobs until all are done or failed, printing each as it finishes. Returns {id: status}."""
+    remaining = set(job_ids)
+    finished: Dict[int, str] = {}
+    while remaining:
+        statuses = get_db().get_job_statuses(remaining)
+        # Jobs deleted meanwhile will never finish
+        remaining &= set(statuses)
+        for job_id, (status, duration_ms, filename) in sorted(statuses.items()):
+            if status in FINAL_STATUSES:
+                remaining.discard(job_id)
+                finished[job_id] = status
+                took = f" in {duration_ms / 1000:.1f}s" if duration_ms is not None else ""
+                print(f"[{len(finished)}/{len(job_ids)}] job {job_id} {status}{took}: {filename}", flush=True)
+        if remaining:
+            time.sleep(interval)
+    return finished
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Queue CV/application pairs from a directory or zip archive.")
+    parser.add_argument("source", help="Directory (searched recursively) or .zip archive")
+    parser.add_argument("--dry-run", action="store_true", help="Only show how the files would be paired")
+    parser.add_argument("--wait", action="store_true", help="Wait for the jobs and print each completion")
+    parser.add_argument("--run-worker", action="store_true",
+                        help="Process the jobs in this process (implies --wait)")
+    parser.add_argument("--priority", choices=sorted(PRIORITIES), default="bulk",
+                        help="Queue priority of the jobs (default: bulk)")
+    parser.add_argument("--submitter", default=f"ingest:{getpass.getuser()}",
+                        help="Name the jobs are queued under; submitters take turns (default: ingest:<user>)")
+    parser.add_argument("--extraction-workers", type=int, default=EXTRACTION_WORKERS,
+                        help=f"Files parsed at the same time (default: {EXTRACTION_WORKERS})")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                        help=f"Files read into memory per extraction round (default: {DEFAULT_CHUNK_SIZE})")
+    parser.add_argument("--interval", type=float, default=DEFAULT_WAIT_INTERVAL,
+                        help=f"Seconds between status polls with --wait (default: {DEFAULT_WAIT_INTERVAL})")
+    args = parser.parse_args()
+
+    try:
+        files = scan_source(args.source)
+    except (ValueError, OSError, zipfile.BadZipFile) as e:
+        parser.error(str(e))
+    pairing = pair_documents([source.name for source in files])
+    print(f"{len(files)} files: {len(pairing.pairs)} pairs, {len(pairing.unmatched)} unmatched")
+    for index in pairing.unmatched:
+        print(f"  unmatched: {files[index].name}")
+    if args.dry_run:
+        for cv_index, application_index in pairing.pairs:
+            print(f"  {files[cv_index].name}  +  {files[application_index].name}")
+        return
+    if not pairing.pairs:
+        sys.exit(1)
+
+    jobs, errors = extract_pairs(files, pairing.pairs, chunk_size=args.chunk_size,
+                                 max_workers=args.extraction_workers)
+    for index, error in sorted(errors.items()):
+        cv_index, application_index = pairing.pairs[index]
+        print(f"  skipped {files[cv_index].name} + {files[application_index].name}: {error}")
+
+    try:
+        job_ids = get_db().add_jobs(jobs, priority=PRIORITIES[args.priority], submitter=args.submitter) if jobs else []
+    except QueueFullError as e:
+        # The extracted texts are in the document store, so a retry skips parsing
+        print(f"{e}. Nothing was queued.")
+        sys.exit(1)
+    if jobs and not job_ids:
+        print("Failed to add the jobs to the queue")
+        sys.exit(1)
+    print(f"Queued {len(job_ids)} job(s)" + (f" (IDs {job_ids[0]}-{job_ids[-1]})" if job_ids else ""))
+    if job_ids:
+        place, eta = get_db().get_queue_etas([job_ids[-1]]).get(job_ids[-1], (None, None))
+        if place:
+            print(f"Last job is number {place} in the queue, estimated to finish in {format_eta(eta)}")
+
+    if not (args.wait or args.run_worker) or not job_ids:
+        return
+    worker = None
+    if args.run_worker:
+        from worker import Worker
+        worker = Worker()
+        worker.start()
+    try:
+        finished = wait_for_jobs(job_ids, interval=args.interval)
+    except KeyboardInterrupt:
+        print("Stopped waiting; queued jobs stay in the queue")
+        finished = {}
+    finally:
+        if worker:
+            worker.stop()
+    failed = sum(1 for status in finished.values() if status in FAILED_STATUSES)
+    print(f"{len(finished) - failed} done, {failed} failed")
+    if failed or len(finished) < len(job_ids):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,385 @@
+"""
+Linear-time extraction and repair of the JSON object in an LLM response.
+
+``extract_json`` finds the last complete top-level object after any
+``<think>`` block with one string-aware scan over the response, and parses it
+(``extract_json_objects`` parses all of them, e.g. the elements of a batch
+answer); if it does not parse, ``repair_json`` rewrites it in a second single
+pass, fixing what models commonly get wrong:
+
+- trailing, doubled or missing commas and missing colons
+- unquoted or single-quoted keys and strings, unquoted words as values
+- Python literals (True/False/None), raw line breaks and stray backslashes in strings
+- mismatched closing brackets
+- output cut off mid-object (closes the string and brackets, drops a dangling key)
+
+Every step looks at each character a bounded number of times, so the cost is
+O(n) in the response length whatever the input looks like.
+"""
+import re
+import json
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+THINK_OPEN = "<think>"
+THINK_CLOSE = "</think>"
+
+# Complete objects tried from the end of the response before giving up; prose
+# full of "{...}" would otherwise mean one parse attempt per pair of braces
+MAX_CANDIDATES = 16
+
+# Characters the object scan has to look at; everything else is skipped in C
+_SCAN_TOKENS = re.compile(r'[{}"\\]')
+_JSON_NUMBER = re.compile(r"-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][+-]?\d+)?")
+_JSON_LITERALS = {"true", "false", "null"}
+_PYTHON_LITERALS = {"True": "true", "False": "false", "None": "null"}
+_VALID_ESCAPES = set('"\\/bfnrtu')
+_CONTROL_ESCAPES = {"\n": "\\n", "\r": "\\r", "\t": "\\t", "\b": "\\b", "\f": "\\f"}
+_CLOSERS = {"{": "}", "[": "]"}
+# Where an unquoted key or bare value ends
+_KEY_END = set(':\n{}[],"')
+_BARE_VALUE_END = set(",}]\n\r")
+
+
+class JSONExtraction(NamedTuple):
+    data: Optional[Dict[str, Any]]
+    fixes: List[str]
+    start: int  # span of the object in the response (-1 if none was found)
+    end: int
+    error: Optional[str] = None  # why nothing parsed (None when data was found)
+
+
+def _scan_objects(text: str, pos: int, end: int) -> Tuple[List[Tuple[int, int]], Optional[int], List[Tuple[int, int]]]:
+    """
+    Finds the top-level {...} spans in text[pos:end]; braces inside JSON strings do not count.
+
+    Returns (complete spans, start of an object left open at the end or None,
+    complete direct children of that open object).
+    """
+    complete, children = [], []
+    start = child_start = None
+    depth = 0
+    in_string = False
+    skip = -1
+    for match in _SCAN_TOKENS.finditer(text, pos, end):
+        i = match.start()
+        if i == skip:
+            continue  # escaped character
+        ch = match.group()
+        if start is None:
+            # Prose between objects: quotes and backslashes mean nothing here
+            if ch == "{":
+                start, depth, children = i, 1, []
+            continue
+        if in_string:
+            if ch == "\\":
+                skip = i + 1
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == "{":
+            depth += 1
+            if depth == 2:
+                child_start = i
+        elif ch == "}":
+            depth -= 1
+            if depth == 1 and child_start is not None:
+                children.append((child_start, i + 1))
+                child_start = None
+            elif depth == 0:
+                complete.append((start, i + 1))
+                start = None
+    return complete, start, children if start is not None else []
+
+
+class _Repairer:
+    """One pass over a candidate object, writing a repaired copy to ``out``."""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.out: List[str] = []
+        self.fixes: List[str] = []
+        self.stack: List[str] = []
+        # What the grammar allows next: "value", "key", "colon" or "after" (a value)
+        self.expect = "value"
+        self.comma_at = None  # out index of a comma not yet followed by a member
+        self.member_at = None  # out index where the current object member began
+
+    def fix(self, description: str) -> None:
+        if description not in self.fixes:
+            self.fixes.append(description)
+
+    def run(self) -> Tuple[str, List[str]]:
+        text, n, i = self.text, len(self.text), 0
+        while i < n:
+            ch = text[i]
+            if ch.isspace():
+                self.out.append(ch)
+                i += 1
+            elif ch in "}]":
+                i = self._close(i)
+                if not self.stack:
+                    break
+            elif self.expect == "key":
+                i = self._key(i)
+            elif self.expect == "colon":
+                if ch != ":":
+                    self.fix("inserted missing colons")
+                else:
+                    i += 1
+                self.out.append(":")
+                self.expect = "value"
+            elif self.expect == "value":
+                i = self._value(i)
+            else:
+                i = self._after_value(i)
+        if self.stack:
+            self._close_truncated()
+        return "".join(self.out).rstrip(), self.fixes
+
+    def _emit_significant(self, token: str) -> None:
+        self.comma_at = None
+        self.out.append(token)
+
+    def _open(self, ch: str) -> None:
+        self._emit_significant(ch)
+        self.stack.append(ch)
+        self.expect = "key" if ch == "{" else "value"
+
+    def _close(self, i: int) -> int:
+        if not self.stack:
+            return i + 1
+        if self.comma_at is not None:
+            del self.out[self.comma_at]
+            self.comma_at = None
+            self.fix("removed trailing commas")
+        elif self.expect in ("colon", "value") and self.stack[-1] == "{":
+            if self.expect == "colon":
+                self.out.append(":")
+            self.out.append("null")
+            self.fix("filled missing values")
+        opener = self.stack.pop()
+        if _CLOSERS[opener] != self.text[i]:
+            self.fix("fixed mismatched brackets")
+        self.out.append(_CLOSERS[opener])
+        self.expect = "after"
+        return i + 1
+
+    def _key(self, i: int) -> int:
+        ch = self.text[i]
+        self.member_at = len(self.out)
+        if ch in "\"'":
+            i = self._string(i)
+        elif ch == ",":
+            self.fix("removed extra commas")
+            return i + 1
+        else:
+            j = i
+            while j < len(self.text) and self.text[j] not in _KEY_END:
+                j += 1
+            key = self.text[i:j].strip()
+            if j < len(self.text) and self.text[j] != ":" or not key:
+                # Not a key: drop the whole run, so it is not scanned again
+                self.fix("removed stray characters")
+                return max(j, i + 1)
+            self._emit_significant(json.dumps(key, ensure_ascii=False))
+            self.fix("quoted keys")
+            i = j
+        self.expect = "colon"
+        return i
+
+    def _value(self, i: int) -> int:
+        ch = self.text[i]
+        if ch in "{[":
+            self._open(ch)
+            return i + 1
+        if ch in "\"'":
+            i = self._string(i)
+        elif ch == ",":
+            if self.stack[-1] == "[":
+                self.fix("removed extra commas")
+                return i + 1
+            self._emit_significant("null")
+            self.fix("filled missing values")
+        else:
+            j = i
+            while j < len(self.text) and self.text[j] not in _BARE_VALUE_END:
+                j += 1
+            raw = self.text[i:j].strip()
+            if raw in _JSON_LITERALS or _JSON_NUMBER.fullmatch(raw):
+                self._emit_significant(raw)
+            elif raw in _PYTHON_LITERALS:
+                self._emit_significant(_PYTHON_LITERALS[raw])
+                self.fix("replaced Python literals")
+            else:
+                self._emit_significant(json.dumps(raw, ensure_ascii=False))
+                self.fix("quoted bare values")
+            i = j
+        self.expect = "after"
+        return i
+
+    def _after_value(self, i: int) -> int:
+        ch = self.text[i]
+        if ch == ",":
+            self.comma_at = len(self.out)
+            self.out.append(",")
+            self.expect = "key" if self.stack[-1] == "{" else "value"
+            return i + 1
+        if ch in "\"'{[" or ch.isalnum() or ch in "-_":
+            # The next member started without a separator
+            self.comma_at = None
+            self.out.append(",")
+            self.fix("inserted missing commas")
+            self.expect = "key" if self.stack[-1] == "{" else "value"
+            return i
+        self.fix("removed stray characters")
+        return i + 1
+
+    def _string(self, i: int) -> int:
+        """Copies the string starting at i as a valid JSON string and returns the index after it."""
+        text, n = self.text, len(self.text)
+        quote = text[i]
+        if quote == "'":
+            self.fix("replaced single quotes")
+        parts = ['"']
+        j = i + 1
+        while j < n:
+            ch = text[j]
+            if ch == quote:
+                parts.append('"')
+                self._emit_significant("".join(parts))
+                return j + 1
+            if ch == "\\":
+                following = text[j + 1] if j + 1 < n else ""
+                if following and following in _VALID_ESCAPES:
+                    parts.append(ch + following)
+                elif following == "'":
+                    parts.append("'")
+                else:
+                    parts.append("\\\\" + following)
+                    self.fix("escaped stray backslashes")
+                j += 2
+                continue
+            if ch == '"':
+                parts.append('\\"')  # inside a single-quoted string
+            elif ch in _CONTROL_ESCAPES or ord(ch) < 0x20:
+                parts.append(_CONTROL_ESCAPES.get(ch, f"\\u{ord(ch):04x}"))
+                self.fix("escaped control characters in strings")
+            else:
+                parts.append(ch)
+            j += 1
+        # Cut off inside the string
+        parts.append('"')
+        self._emit_significant("".join(parts))
+        self.fix("closed unterminated string")
+        return n
+
+    def _close_truncated(self) -> None:
+        """Ends an object that was cut off: completes or drops the last member, closes the brackets."""
+        while self.out and self.out[-1].isspace():
+            self.out.pop()
+        if self.stack[-1] == "{" and self.expect == "colon":
+            # Only a key arrived: drop it together with its comma
+            del self.out[self.member_at:]
+            self.fix("dropped incomplete member")
+            self.expect = "after"
+            while self.out and self.out[-1].isspace():
+                self.out.pop()
+            if self.out and self.out[-1] == ",":
+                self.out.pop()
+        elif self.stack[-1] == "{" and self.expect == "value":
+            self.out.append("null")
+            self.fix("filled missing values")
+        if self.out and self.out[-1] == ",":
+            self.out.pop()
+        self.comma_at = None
+        self.out.extend(_CLOSERS[opener] for opener in reversed(self.stack))
+        self.fix("closed unclosed brackets")
+        self.stack = []
+
+
+def repair_json(text: str) -> Tuple[str, List[str]]:
+    """
+    Rewrites one JSON object with common LLM defects fixed.
+
+    Returns:
+        tuple: (repaired JSON text, descriptions of the fixes applied, empty if none)
+    """
+    return _Repairer(text).run()
+
+
+def _parse_object(text: str) -> Tuple[Optional[Dict[str, Any]], List[str], Optional[str]]:
+    """(object or None, fixes applied, error message or None)."""
+    # RecursionError: nesting deeper than the json module handles
+    try:
+        data, fixes = json.loads(text), []
+    except (json.JSONDecodeError, RecursionError):
+        repaired, fixes = repair_json(text)
+        try:
+            data = json.loads(repaired)
+        except json.JSONDecodeError as e:
+            return None, fixes, f"{e.msg} (line {e.lineno}, column {e.colno}) even after repair"
+        except RecursionError:
+            return None, fixes, "objects nested too deeply"
+    if not isinstance(data, dict):
+        return None, fixes, f"expected a JSON object, got {type(data).__name__}"
+    if not data:
+        return None, fixes, "the JSON object is empty"
+    return data, fixes, None
+
+
+def _answer_span(response_text: str) -> Tuple[int, int]:
+    """The part of the response after the last ``</think>`` and before an unclosed ``<think>``."""
+    think_end = response_text.rfind(THINK_CLOSE)
+    pos = think_end + len(THINK_CLOSE) if think_end != -1 else 0
+    end = response_text.find(THINK_OPEN, pos)
+    return pos, end if end != -1 else len(response_text)
+
+
+def extract_json(response_text: str) -> JSONExtraction:
+    """
+    Finds and parses the JSON object an LLM answered with.
+
+    Only text after the last ``</think>`` (and before an unclosed ``<think>``) is
+    searched, so drafts in the model's reasoning are never taken. The last complete
+    top-level object that parses (as is or repaired) wins; if there is none and
+    the response ends inside an object, that truncated object is repaired, and
+    failing that its last complete nested object is used.
+    """
+    response_text = response_text or ""
+    pos, end = _answer_span(response_text)
+    complete, open_start, children = _scan_objects(response_text, pos, end)
+    candidates = complete[:-MAX_CANDIDATES - 1:-1]
+    if open_start is not None:
+        candidates.append((open_start, end))
+        candidates.extend(children[:-MAX_CANDIDATES - 1:-1])
+
+    if not candidates:
+        inside_think = end < len(response_text)
+        error = "the answer ended inside a <think> block" if inside_think else "no JSON object in the answer"
+        return JSONExtraction(None, [], -1, -1, error)
+    first_error = None
+    for start, end in candidates:
+        data, fixes, error = _parse_object(response_text[start:end])
+        if data is not None:
+            return JSONExtraction(data, fixes, start, end)
+        first_error = first_error or error
+    return JSONExtraction(None, [], -1, -1, first_error)
+
+
+def extract_json_objects(response_text: str) -> List[JSONExtraction]:
+    """
+    Parses every top-level JSON object of the answer, in order, each repaired like
+    extract_json's (an object cut off at the end of the response included). Objects
+    that do not parse even after repair come back with data None and their error.
+    """
+    response_text = response_text or ""
+    pos, end = _answer_span(response_text)
+    complete, open_start, _ = _scan_objects(response_text, pos, end)
+    if open_start is not None:
+        complete.append((open_start, end))
+    extractions = []
+    for start, stop in complete:
+        data, fixes, error = _parse_object(response_text[start:stop])
+        extractions.append(JSONExtraction(data, fixes, start, stop, error))
+    return extractions
@@ -0,0 +1,238 @@
+"""
+Thread-safe client for the Ollama generate API.
+
+One ``LLMClient`` is shared by all job threads: it keeps a pooled keep-alive
+``requests.Session``, caps the number of requests in flight, enforces a deadline
+per request (including the time spent waiting for a free slot) and retries
+transient failures with exponential backoff.
+
+Static instructions can be passed as ``system`` prompt: they then form an
+identical prefix for every request, which the server keeps processed in its KV
+cache, and only the per-job text has to be prefilled. ``keep_alive`` controls
+how long the server keeps the model loaded after a request, and ``warmup``
+loads it (and processes the system prefix) before the first job arrives.
+
+In streaming mode the NDJSON token stream is fed to an ``IncrementalJSONDetector``
+and the connection is closed as soon as a complete JSON object has arrived, which
+makes Ollama stop generating.
+"""
+import os
+import json
+import time
+import random
+import logging
+import threading
+from typing import Callable, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+
+from Utilities import IncrementalJSONDetector
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# API setup
+DEFAULT_API_URL = "http://localhost:11434/api/generate"
+DEFAULT_MODEL = "deepseek-r1:14b"
+OLLAMA_API_URL = os.getenv("OLLAMA_API_URL", DEFAULT_API_URL)
+MODEL_NAME = os.getenv("OLLAMA_MODEL", DEFAULT_MODEL)
+
+# Match the server's OLLAMA_NUM_PARALLEL so every parallel slot on the GPU stays busy.
+DEFAULT_MAX_IN_FLIGHT = 2
+DEFAULT_TIMEOUT = 3000
+DEFAULT_CONNECT_TIMEOUT = 10
+DEFAULT_BACKOFF_BASE = 2.0
+DEFAULT_BACKOFF_MAX = 60.0
+
+MAX_IN_FLIGHT = int(os.getenv("LLM_MAX_IN_FLIGHT", os.getenv("OLLAMA_NUM_PARALLEL", DEFAULT_MAX_IN_FLIGHT)))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", DEFAULT_TIMEOUT))
+MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 3))
+LLM_STREAM = os.getenv("LLM_STREAM", "1") == "1"
+# How long the server keeps the model loaded after a request while jobs are
+# queued (Ollama duration string or seconds); when idle the server default applies.
+LLM_KEEP_ALIVE = os.getenv("LLM_KEEP_ALIVE", "30m")
+
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
+    """Raised when the LLM API cannot produce a response."""
+
+
+class LLMTimeoutError(LLMError):
+    """Raised when a request runs past its deadline."""
+
+
+class LLMClient:
+    def __init__(self, api_url: str = OLLAMA_API_URL, model: str = MODEL_NAME,
+                 max_in_flight: int = MAX_IN_FLIGHT, timeout: float = LLM_TIMEOUT,
+                 max_retries: int = MAX_RETRIES, backoff_base: float = DEFAULT_BACKOFF_BASE,
+                 stream: bool = LLM_STREAM):
+        self.api_url = api_url
+        self.model = model
+        self.max_in_flight = max(1, max_in_flight)
+        self.timeout = timeout
+        self.max_retries = max(0, max_retries)
+        self.backoff_base = backoff_base
+        self.stream = stream
+
+        self._slots = threading.BoundedSemaphore(self.max_in_flight)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_in_flight)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"Content-Type": "application/json"})
+
+    def generate(self, prompt: str, timeout: Optional[float] = None,
+                 on_progress: Optional[Callable[[str], None]] = None, stop_on_json: bool = True,
+                 system: Optional[str] = None, keep_alive: Optional[str] = None,
+                 on_timing: Optional[Callable[[str, float], None]] = None) -> str:
+        """
+        Sends a prompt and returns the model's response text.
+
+        Args:
+            prompt (str): The full prompt
+            timeout (float, optional): Deadline in seconds for the whole call, including
+                queueing for a free slot and all retries. Defaults to the client timeout.
+            on_progress (callable, optional): Called with the text received so far while
+                streaming
+            stop_on_json (bool): Stop streaming at the first complete JSON object. Disable
+                for responses holding several objects (batch prompts).
+            system (str, optional): System prompt, for instructions shared by all requests
+            keep_alive (str, optional): How long the server keeps the model loaded afterwards
+            on_timing (callable, optional): Called with ("llm_queue_wait", seconds) once a
+                slot is free and ("llm_generation", seconds) when the call ends
+
+        Raises:
+            LLMTimeoutError: If the deadline passes before a response arrives
+            LLMError: If the API keeps failing after all retries
+        """
+        deadline = time.monotonic() + (timeout or self.timeout)
+        payload = {"model": self.model, "prompt": prompt, "stream": self.stream}
+        if system is not None:
+            payload["system"] = system
+        if keep_alive is not None:
+            payload["keep_alive"] = keep_alive
+
+        queued = time.perf_counter()
+        if not self._slots.acquire(timeout=self._remaining(deadline)):
+            raise LLMTimeoutError("Timed out waiting for a free LLM slot")
+        started = time.perf_counter()
+        if on_timing:
+            on_timing("llm_queue_wait", started - queued)
+        try:
+            return self._post_with_retries(payload, deadline, on_progress, stop_on_json)
+        finally:
+            self._slots.release()
+            if on_timing:
+                on_timing("llm_generation", time.perf_counter() - started)
+
+    def _post_with_retries(self, payload: dict, deadline: float,
+                           on_progress: Optional[Callable[[str], None]] = None,
+                           stop_on_json: bool = True) -> str:
+        attempt = 0
+        while True:
+            if self._remaining(deadline) <= 0:
+                raise LLMTimeoutError("LLM request deadline exceeded")
+            try:
+                logger.info("Sending request to LLM API...")
+                response = self.session.post(
+                    self.api_url,
+                    json=payload,
+                    stream=payload["stream"],
+                    timeout=(DEFAULT_CONNECT_TIMEOUT, self._remaining(deadline))
+                )
+                if response.status_code == 200:
+                    if payload["stream"]:
+                        return self._read_stream(response, deadline, on_progress, stop_on_json)
+                    return response.json().get("response", "")
+                error = LLMError(f"API returned {response.status_code}: {response.text}")
+                retryable = response.status_code in RETRYABLE_STATUS_CODES
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+                error = LLMError(f"LLM request failed: {e}")
+                retryable = True
+
+            remaining = self._remaining(deadline)
+            if not retryable or attempt >= self.max_retries:
+                logger.error(str(error))
+                raise error
+            if remaining <= 0:
+                raise LLMTimeoutError(f"LLM request deadline exceeded after {attempt + 1} attempts")
+
+            delay = min(self.backoff_base * (2 ** attempt), DEFAULT_BACKOFF_MAX, remaining)
+            delay *= random.uniform(0.5, 1.0)
+            attempt += 1
+            logger.warning(f"{error} - retrying in {delay:.1f}s (attempt {attempt}/{self.max_retries})")
+            time.sleep(delay)
+
+    def _read_stream(self, response: requests.Response, deadline: float,
+                     on_progress: Optional[Callable[[str], None]] = None, stop_on_json: bool = True) -> str:
+        """Reads NDJSON chunks until the model is done or (with stop_on_json) a complete JSON object has arrived."""
+        detector = IncrementalJSONDetector()
+        try:
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if chunk.get("error"):
+                    raise LLMError(f"API stream error: {chunk['error']}")
+
+                if detector.feed(chunk.get("response", "")) is not None and stop_on_json:
+                    logger.info("Complete JSON object received, stopping generation early")
+                    break
+                if on_progress:
+                    on_progress(detector.buffer)
+                if chunk.get("done"):
+                    break
+                if self._remaining(deadline) <= 0:
+                    raise LLMTimeoutError("LLM request deadline exceeded while streaming")
+        finally:
+            # Closing an unfinished stream drops the connection, which aborts generation.
+            response.close()
+        return detector.buffer
+
+    def warmup(self, system: Optional[str] = None, keep_alive: Optional[str] = LLM_KEEP_ALIVE,
+               timeout: Optional[float] = None) -> bool:
+        """
+        Loads the model and, if given, processes the system prompt once, so the first
+        job does not pay for the cold load. Returns False if the server is unreachable.
+        """
+        payload = {"model": self.model, "prompt": "", "stream": False}
+        if system is not None:
+            # One generated token is enough to get the prefix into the KV cache
+            payload.update(prompt=".", system=system, options={"num_predict": 1})
+        if keep_alive is not None:
+            payload["keep_alive"] = keep_alive
+        started = time.monotonic()
+        try:
+            response = self.session.post(self.api_url, json=payload,
+                                         timeout=(DEFAULT_CONNECT_TIMEOUT, timeout or self.timeout))
+            response.raise_for_status()
+        except requests.RequestException as e:
+            logger.warning(f"Model warmup failed: {e}")
+            return False
+        logger.info(f"Model {self.model} warmed up in {time.monotonic() - started:.1f}s")
+        return True
+
+    @staticmethod
+    def _remaining(deadline: float) -> float:
+        return max(0.0, deadline - time.monotonic())
+
+    def close(self) -> None:
+        self.session.close()
+
+
+_default_client: Optional[LLMClient] = None
+_default_client_lock = threading.Lock()
+
+
+def get_llm_client() -> LLMClient:
+    """Returns the process-wide client (one HTTP session and in-flight limit for all callers)."""
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = LLMClient()
+        return _default_client
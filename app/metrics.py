@@ -0,0 +1,134 @@
+"""
+Per-job stage timings and their export as Prometheus metrics.
+
+Every job records how long it spent in each stage of the pipeline (``STAGES``);
+``StageTimer`` collects them while the job runs and the database keeps both the
+individual timings and a cumulative histogram per stage. Because everything is
+read back from the database, ``render_prometheus`` reports the work of all
+worker processes sharing it, whichever process serves the endpoint (see
+``metrics_server.py``).
+"""
+import time
+import math
+import statistics
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Pipeline stages, in order
+STAGES = (
+    "text_extraction",   # PDF/Word parsing before the job is queued
+    "rule_extraction",   # rule-based fields
+    "prompt_build",      # compaction and prompt generation
+    "llm_queue_wait",    # waiting for a free LLM slot
+    "llm_generation",    # request until the answer is complete (retries included)
+    "json_repair",       # finding and repairing the JSON in the answer
+    "excel_write",       # saving the row's batch to the export (on the export writer's thread)
+)
+
+# Histogram bucket upper bounds in seconds; LLM stages take minutes on slow GPUs
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+METRIC_PREFIX = "cv_extraction"
+
+
+class StageTimer:
+    """Collects the seconds one job spends per stage; repeated stages add up."""
+
+    def __init__(self):
+        self.timings: Dict[str, float] = {}
+
+    def add(self, stage: str, seconds: float) -> None:
+        self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+
+def bucket_label(seconds: float) -> str:
+    """The ``le`` label of the smallest histogram bucket holding the value."""
+    for bound in STAGE_BUCKETS:
+        if seconds <= bound:
+            return _format_number(bound)
+    return "+Inf"
+
+
+def _format_number(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def format_eta(seconds: Optional[float]) -> str:
+    """Rough duration for queue estimates ("unknown" without one)."""
+    if seconds is None:
+        return "unknown"
+    if seconds < 60:
+        return "under a minute"
+    if seconds < 3600:
+        return f"~{seconds / 60:.0f} min"
+    return f"~{seconds / 3600:.1f} h"
+
+
+def _stage_order(stage: str) -> Tuple[int, str]:
+    return (STAGES.index(stage) if stage in STAGES else len(STAGES), stage)
+
+
+def summarize_timings(rows: Iterable[Tuple[str, float]]) -> List[Dict[str, float]]:
+    """
+    Count, mean, median, 95th percentile and total per stage from (stage, duration_ms) rows,
+    in STAGES order (unknown stages last).
+    """
+    durations: Dict[str, List[float]] = {}
+    for stage, duration_ms in rows:
+        durations.setdefault(stage, []).append(duration_ms)
+
+    summary = []
+    for stage in sorted(durations, key=_stage_order):
+        values = sorted(durations[stage])
+        summary.append({
+            "stage": stage,
+            "count": len(values),
+            "mean_ms": round(statistics.fmean(values), 1),
+            "median_ms": round(statistics.median(values), 1),
+            "p95_ms": round(values[min(len(values) - 1, int(len(values) * 0.95))], 1),
+            "total_ms": round(sum(values), 1),
+        })
+    return summary
+
+
+def render_prometheus(db) -> str:
+    """Renders job counts and stage histograms in the Prometheus text exposition format."""
+    lines = [
+        f"# HELP {METRIC_PREFIX}_jobs Jobs by current status.",
+        f"# TYPE {METRIC_PREFIX}_jobs gauge",
+    ]
+    for status, count in sorted(db.count_jobs_by_status().items()):
+        lines.append(f'{METRIC_PREFIX}_jobs{{status="{status}"}} {count}')
+
+    lines += [
+        f"# HELP {METRIC_PREFIX}_job_attempts_total Job claims, including retries.",
+        f"# TYPE {METRIC_PREFIX}_job_attempts_total counter",
+        f"{METRIC_PREFIX}_job_attempts_total {db.count_job_attempts()}",
+        f"# HELP {METRIC_PREFIX}_stage_duration_seconds Time jobs spent per pipeline stage.",
+        f"# TYPE {METRIC_PREFIX}_stage_duration_seconds histogram",
+    ]
+    histograms = db.get_stage_histograms()
+    for stage in sorted(histograms, key=_stage_order):
+        buckets = histograms[stage]
+        # Every configured bound is always listed, so the series stay stable between scrapes
+        bounds = {_format_number(bound) for bound in STAGE_BUCKETS} | (set(buckets) - {"+Inf"})
+        cumulative = 0
+        for le in sorted(bounds, key=float):
+            cumulative += buckets.get(le, (0, 0.0))[0]
+            lines.append(f'{METRIC_PREFIX}_stage_duration_seconds_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+        count = sum(observations for observations, _ in buckets.values())
+        total_seconds = sum(total_ms for _, total_ms in buckets.values()) / 1000
+        lines.append(f'{METRIC_PREFIX}_stage_duration_seconds_bucket{{stage="{stage}",le="+Inf"}} {count}')
+        lines.append(f'{METRIC_PREFIX}_stage_duration_seconds_sum{{stage="{stage}"}} {total_seconds:.6f}')
+        lines.append(f'{METRIC_PREFIX}_stage_duration_seconds_count{{stage="{stage}"}} {count}')
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,55 @@
+"""
+HTTP endpoint exposing the extraction metrics for Prometheus.
+
+Reads everything from the shared database, so one server covers all worker
+processes (and the Streamlit app's embedded worker).
+
+Run from the ``app`` directory:
+    python metrics_server.py --port 9108
+"""
+import os
+import argparse
+
+import uvicorn
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+
+from metrics import render_prometheus, summarize_timings
+from shared_database import get_db
+
+DEFAULT_PORT = 9108
+METRICS_HOST = os.getenv("METRICS_HOST", "0.0.0.0")
+METRICS_PORT = int(os.getenv("METRICS_PORT", DEFAULT_PORT))
+
+# Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+api = FastAPI(title="CV extraction metrics")
+
+
+@api.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return PlainTextResponse(render_prometheus(get_db()), media_type=CONTENT_TYPE)
+
+
+@api.get("/stages")
+def stages(minutes: int = 60):
+    """Per-stage timing summary of the last minutes, as JSON."""
+    return {"minutes": minutes, "stages": summarize_timings(get_db().get_recent_stage_timings(minutes))}
+
+
+@api.get("/health")
+def health():
+    return {"status": "ok"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve extraction metrics for Prometheus.")
+    parser.add_argument("--host", default=METRICS_HOST)
+    parser.add_argument("--port", type=int, default=METRICS_PORT)
+    args = parser.parse_args()
+    uvicorn.run(api, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Pairing of uploaded CVs with their job applications by file name.
+
+Files are matched in three rounds, each only looking at what is still unpaired:
+
+1. same applicant key: the file name without extension, role words ("cv",
+   "application", ...), separators and case, in the same folder
+   (``Jane_Doe_CV.pdf`` + ``jane-doe application.docx``)
+2. same folder: a folder left with exactly one CV and one application
+   (one folder per applicant, whatever the files are called); files outside
+   any folder only if there are just those two (a plain two-file upload), as
+   the top level of a larger upload holds several applicants
+3. applicant name: a CV and an application whose names share at least two
+   words, all words of the shorter name (``Doe, Jane - Lebenslauf.pdf`` +
+   ``Application Jane Doe 2024.docx``); numbers do not count here, and
+   a file with two equally good partners is left alone
+
+A file's role comes from words in its name; without one, PDFs count as CVs and
+Word files can be either. Anything ambiguous stays unmatched rather than
+risking a CV being processed with somebody else's application.
+"""
+import os
+import re
+from collections import defaultdict
+from typing import Dict, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+SUPPORTED_EXTENSIONS = (".pdf", ".docx")
+
+CV_WORDS = {"cv", "resume", "lebenslauf", "curriculum", "vitae"}
+APPLICATION_WORDS = {"application", "applicationform", "bewerbung", "motivation", "cover", "letter",
+                     "anschreiben", "form", "statement"}
+# Words that say nothing about the applicant
+NOISE_WORDS = {"and", "the", "of", "for", "final", "signed", "scan", "copy", "new", "updated", "version", "v"}
+
+# Round 3: name words two files must share
+MIN_SHARED_WORDS = 2
+
+_WORD = re.compile(r"[^\W_]+")
+
+
+class PairingResult(NamedTuple):
+    pairs: List[Tuple[int, int]]  # (cv index, application index) into the given names
+    unmatched: List[int]
+
+
+def _words(name: str) -> List[str]:
+    stem = os.path.splitext(os.path.basename(name))[0]
+    return _WORD.findall(stem.lower())
+
+
+def document_role(name: str) -> Optional[str]:
+    """'cv', 'application' or None (could be either) for a file name."""
+    words = set(_words(name))
+    is_cv, is_application = bool(words & CV_WORDS), bool(words & APPLICATION_WORDS)
+    if is_cv != is_application:
+        return "cv" if is_cv else "application"
+    if name.lower().endswith(".pdf"):
+        return "cv"
+    return None
+
+
+def applicant_words(name: str) -> List[str]:
+    """The words of a file name that identify the applicant (role and noise words removed)."""
+    return [word for word in _words(name) if word not in CV_WORDS | APPLICATION_WORDS | NOISE_WORDS]
+
+
+def _folder(name: str) -> str:
+    return os.path.dirname(name.replace("\\", "/"))
+
+
+def _pair_group(indexes: Sequence[int], roles: Dict[int, Optional[str]]) -> Optional[Tuple[int, int]]:
+    """The (cv, application) pair of a group holding exactly two files with compatible roles."""
+    if len(indexes) != 2:
+        return None
+    first, second = indexes
+    role_first, role_second = roles[first], roles[second]
+    if role_first == "cv" and role_second != "cv" or role_second == "application" and role_first is None:
+        return first, second
+    if role_second == "cv" and role_first != "cv" or role_first == "application" and role_second is None:
+        return second, first
+    return None
+
+
+def pair_documents(names: Sequence[str]) -> PairingResult:
+    """
+    Pairs CVs with applications by file name (see the module docstring).
+
+    Args:
+        names: File names or relative paths; files that are not PDF/DOCX stay unmatched
+
+    Returns:
+        PairingResult: Index pairs in input order of the CV, and the indexes left over
+    """
+    roles = {index: document_role(name) for index, name in enumerate(names)
+             if name.lower().endswith(SUPPORTED_EXTENSIONS)}
+    open_indexes: Set[int] = set(roles)
+    pairs: List[Tuple[int, int]] = []
+
+    def take(pair: Optional[Tuple[int, int]]) -> None:
+        if pair:
+            pairs.append(pair)
+            open_indexes.difference_update(pair)
+
+    # 1. Same applicant key in the same folder
+    by_key = defaultdict(list)
+    for index in sorted(open_indexes):
+        key = " ".join(applicant_words(names[index]))
+        if key:
+            by_key[(_folder(names[index]), key)].append(index)
+    for indexes in by_key.values():
+        take(_pair_group(indexes, roles))
+
+    # 2. A folder with exactly two files left; the top level only if it holds two files at all
+    by_folder = defaultdict(list)
+    for index in sorted(open_indexes):
+        by_folder[_folder(names[index])].append(index)
+    top_level = [index for index in roles if not _folder(names[index])]
+    if len(top_level) != 2:
+        by_folder.pop("", None)
+    for indexes in by_folder.values():
+        take(_pair_group(indexes, roles))
+
+    # 3. Same applicant name, when the match is unambiguous
+    words = {index: {word for word in applicant_words(names[index]) if not word.isdigit()}
+             for index in open_indexes}
+    applications_with_word = defaultdict(list)
+    for index in sorted(open_indexes):
+        if roles[index] != "cv":
+            for word in words[index]:
+                applications_with_word[word].append(index)
+    matches = defaultdict(list)
+    for cv in sorted(open_indexes):
+        if roles[cv] == "application":
+            continue
+        shared_counts = defaultdict(int)
+        for word in words[cv]:
+            for application in applications_with_word[word]:
+                shared_counts[application] += 1
+        for application, shared in shared_counts.items():
+            if application != cv and shared >= MIN_SHARED_WORDS and (roles[cv] or roles[application]) \
+                    and shared == min(len(words[cv]), len(words[application])):
+                matches[cv].append(application)
+                matches[application].append(cv)
+    for cv in sorted(open_indexes):
+        if roles[cv] != "application" and len(matches[cv]) == 1:
+            application = matches[cv][0]
+            if len(matches[application]) == 1 and application in open_indexes:
+                take((cv, application))
+
+    pairs.sort()
+    return PairingResult(pairs, sorted(open_indexes | (set(range(len(names))) - set(roles))))
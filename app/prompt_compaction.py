@@ -0,0 +1,251 @@
+"""
+Compaction of CV and application texts before they are put into the prompt.
+
+Extracted PDF text carries a lot that costs prefill time without helping the
+extraction: runs of whitespace, headers and footers repeated on every page, page
+numbers and declaration/consent boilerplate. ``compact_documents`` removes those
+and, if the texts are still above the token budget, keeps the sections that
+matter for the extracted fields (personal details, education, languages,
+experience) and truncates or drops the rest (publications, references, ...).
+
+Token counts are a local estimate (``estimate_tokens``), close enough to the
+model tokenizer for budgeting without loading it.
+"""
+import os
+import re
+from collections import Counter
+from typing import List, NamedTuple, Tuple
+
+from Utilities import PAGE_BREAK
+
+# Token budget for CV + application text together (0 = no truncation).
+# The instructions of generate_prompt come on top (~600 tokens).
+DEFAULT_TOKEN_BUDGET = 6000
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", DEFAULT_TOKEN_BUDGET))
+
+TRUNCATION_MARKER = "[...]"
+
+# Lines at the top/bottom of a page that recur on at least half of the pages
+# (and at least two) are running headers or footers; only their first
+# occurrence is kept, since headers often carry the applicant's name
+FURNITURE_EDGE_LINES = 2
+MIN_FURNITURE_PAGES = 2
+
+# Texts stored before PAGE_BREAK became a marker line separate pages with form feeds
+_PAGE_SPLIT = re.compile(f"{re.escape(PAGE_BREAK)}|\f")
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+_PAGE_NUMBER_PATTERN = re.compile(r"^(?:page|seite)?\s*[-–]?\s*\d{1,3}\s*(?:(?:of|/|von)\s*\d{1,3})?\s*[-–]?$", re.IGNORECASE)
+_BOILERPLATE_PATTERNS = [
+    re.compile(pattern, re.IGNORECASE) for pattern in (
+        r"^references (?:are )?available (?:up)?on request\.?$",
+        r"^curriculum vitae$",
+        r"^(?:i )?hereby (?:declare|confirm|certify)\b",
+        r"\bconsent to the processing of (?:my )?personal data\b",
+        r"\bgdpr\b.*\bconsent\b|\bconsent\b.*\bgdpr\b",
+    )
+]
+
+# Section headings (matched at the start of a short line) and their priority;
+# higher priority sections are kept first when the text exceeds the budget.
+SECTION_PRIORITIES: List[Tuple[int, re.Pattern]] = [
+    (5, re.compile(r"^(?:personal|contact)\b|^(?:about me|profile|summary)\b", re.IGNORECASE)),
+    (5, re.compile(r"^(?:education|academic|qualifications?|degrees?)\b", re.IGNORECASE)),
+    (5, re.compile(r"^(?:languages?|language skills)\b", re.IGNORECASE)),
+    (4, re.compile(r"^(?:research|work|professional)?\s*(?:experience|employment|positions?)\b", re.IGNORECASE)),
+    (4, re.compile(r"^(?:research|projects?|thesis)\b", re.IGNORECASE)),
+    (3, re.compile(r"^(?:skills|competences|competencies|technical skills|computer skills)\b", re.IGNORECASE)),
+    (3, re.compile(r"^(?:motivation|cover letter|statement)\b", re.IGNORECASE)),
+    (1, re.compile(r"^(?:awards?|honou?rs|grants?|scholarships?|certificates?|courses?|training)\b", re.IGNORECASE)),
+    (0, re.compile(r"^(?:publications?|talks|presentations|posters|conferences?|teaching)\b", re.IGNORECASE)),
+    (0, re.compile(r"^(?:references?|referees|hobbies|interests|activities|volunteer)\b", re.IGNORECASE)),
+]
+
+
+class Section(NamedTuple):
+    priority: int
+    lines: List[str]
+
+
+class CompactionReport(NamedTuple):
+    original_tokens: int
+    compacted_tokens: int
+    truncated_sections: int
+    dropped_sections: int
+
+    @property
+    def saved_tokens(self) -> int:
+        return self.original_tokens - self.compacted_tokens
+
+
+class CompactedDocuments(NamedTuple):
+    pdf_text: str
+    word_text: str
+    report: CompactionReport
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimates the number of model tokens: one per punctuation mark and short word,
+    long words are split roughly every six characters like BPE vocabularies do.
+    """
+    return sum(1 + (len(piece) - 1) // 6 for piece in _TOKEN_PATTERN.findall(text))
+
+
+def normalize_whitespace(text: str) -> str:
+    """Collapses runs of spaces, trims lines and keeps at most one blank line in a row."""
+    lines = [re.sub(r"\s+", " ", line).strip() for line in text.replace("\r", "\n").split("\n")]
+    text = "\n".join(lines)
+    return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+
+def _furniture_key(line: str) -> str:
+    # Digits are masked so "Page 2" and "Page 3" count as the same footer
+    return re.sub(r"\d+", "#", line.strip().lower())
+
+
+def _edge_indexes(lines: List[str]) -> List[int]:
+    filled = [index for index, line in enumerate(lines) if line.strip()]
+    # A set: on short pages the top and bottom lines overlap
+    return sorted(set(filled[:FURNITURE_EDGE_LINES] + filled[-FURNITURE_EDGE_LINES:]))
+
+
+def strip_page_furniture(text: str) -> str:
+    """
+    Removes running headers/footers, page numbers and boilerplate lines.
+
+    Pages are separated by PAGE_BREAK (see extract_text_from_pdf), which is removed
+    with them; texts without page breaks only lose page numbers and boilerplate.
+    """
+    pages = [page.split("\n") for page in _PAGE_SPLIT.split(text)]
+    edge_counts = Counter()
+    for lines in pages:
+        edge_counts.update({_furniture_key(lines[index]) for index in _edge_indexes(lines)})
+    min_pages = max(MIN_FURNITURE_PAGES, (len(pages) + 1) // 2)
+
+    kept, seen = [], set()
+    for lines in pages:
+        furniture = set()
+        for index in _edge_indexes(lines):
+            key = _furniture_key(lines[index])
+            if edge_counts[key] >= min_pages:
+                if key in seen:
+                    furniture.add(index)
+                seen.add(key)
+        for index, line in enumerate(lines):
+            stripped = line.strip()
+            if index in furniture or _PAGE_NUMBER_PATTERN.match(stripped):
+                continue
+            if any(pattern.search(stripped) for pattern in _BOILERPLATE_PATTERNS):
+                continue
+            kept.append(line)
+    return "\n".join(kept)
+
+
+def _heading_priority(line: str):
+    if not line or len(line) > 50:
+        return None
+    heading = line.rstrip(":").strip()
+    for priority, pattern in SECTION_PRIORITIES:
+        if pattern.match(heading):
+            return priority
+    return None
+
+
+def split_sections(text: str) -> List[Section]:
+    """Splits text at recognized section headings; text before the first one is high priority."""
+    sections = [Section(5, [])]
+    for line in text.split("\n"):
+        priority = _heading_priority(line)
+        if priority is not None:
+            sections.append(Section(priority, [line]))
+        else:
+            sections[-1].lines.append(line)
+    return [section for section in sections if any(section.lines)]
+
+
+def _cut_line(line: str, budget: int) -> str:
+    """The longest prefix of line ending at a token boundary that fits in budget tokens."""
+    end = 0
+    for match in _TOKEN_PATTERN.finditer(line):
+        budget -= estimate_tokens(match.group())
+        if budget < 0:
+            break
+        end = match.end()
+    return line[:end]
+
+
+def fit_to_budget(text: str, budget: int) -> Tuple[str, int, int]:
+    """
+    Keeps the highest priority sections of text within budget tokens.
+
+    Sections keep their original order; a section that only partly fits is cut at
+    a line boundary, or inside the first line that does not fit (so a long
+    one-line text is shortened, not dropped). Returns (text, truncated sections,
+    dropped sections).
+    """
+    sections = split_sections(text)
+    costs = [[estimate_tokens(line) + 1 for line in section.lines] for section in sections]
+    if budget <= 0 or sum(map(sum, costs)) <= budget:
+        return text, 0, 0
+
+    remaining = budget
+    kept_lines = [0] * len(sections)
+    cut_lines = [""] * len(sections)
+    # Stable sort: among equal priorities the earlier section wins
+    for index in sorted(range(len(sections)), key=lambda i: -sections[i].priority):
+        for line, cost in zip(sections[index].lines, costs[index]):
+            if cost > remaining:
+                cut_lines[index] = _cut_line(line, remaining - 1)
+                if cut_lines[index]:
+                    remaining -= estimate_tokens(cut_lines[index]) + 1
+                break
+            remaining -= cost
+            kept_lines[index] += 1
+
+    parts, truncated, dropped = [], 0, 0
+    for section, count, cut in zip(sections, kept_lines, cut_lines):
+        if count == 0 and not cut:
+            dropped += 1
+            continue
+        parts.extend(section.lines[:count])
+        if cut:
+            parts.append(cut)
+        if count < len(section.lines):
+            truncated += 1
+            parts.append(TRUNCATION_MARKER)
+    return "\n".join(parts), truncated, dropped
+
+
+def compact_text(text: str) -> str:
+    """Page furniture removal and whitespace normalization, without truncation."""
+    return normalize_whitespace(strip_page_furniture(text or ""))
+
+
+def compact_documents(pdf_text: str, word_text: str, budget: int = PROMPT_TOKEN_BUDGET) -> CompactedDocuments:
+    """
+    Compacts the CV and application text for the prompt.
+
+    The budget is shared: a text below half of it leaves the rest to the other one.
+    """
+    original_tokens = estimate_tokens(pdf_text or "") + estimate_tokens(word_text or "")
+    pdf_text, word_text = compact_text(pdf_text), compact_text(word_text)
+    truncated = dropped = 0
+
+    if budget > 0:
+        pdf_tokens, word_tokens = estimate_tokens(pdf_text), estimate_tokens(word_text)
+        if pdf_tokens + word_tokens > budget:
+            half = budget // 2
+            pdf_budget = max(half, budget - word_tokens)
+            word_budget = max(half, budget - pdf_tokens)
+            pdf_text, pdf_truncated, pdf_dropped = fit_to_budget(pdf_text, pdf_budget)
+            word_text, word_truncated, word_dropped = fit_to_budget(word_text, word_budget)
+            truncated = pdf_truncated + word_truncated
+            dropped = pdf_dropped + word_dropped
+
+    report = CompactionReport(
+        original_tokens=original_tokens,
+        compacted_tokens=estimate_tokens(pdf_text) + estimate_tokens(word_text),
+        truncated_sections=truncated,
+        dropped_sections=dropped
+    )
+    return CompactedDocuments(pdf_text, word_text, report)
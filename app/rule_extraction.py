@@ -0,0 +1,228 @@
+"""
+Deterministic pre-extraction of fields the documents state explicitly.
+
+Application forms and many CVs contain lines like ``E-Mail: jane@doe.org`` or
+``Nationality: German``; e-mail addresses, dates and English test scores have a
+fixed shape. ``extract_rule_fields`` pulls these out with precompiled patterns
+and lookups, each with a confidence score. Fields at or above the confidence
+threshold are taken as they are; the LLM is only asked for the rest, and not at
+all when nothing is left.
+
+Skipping the LLM needs every field labeled, which in practice takes a filled-in
+application form: free-text answers (languages, skills, research) only count as
+confident there, a CV's one-line summary of them does not (see FREE_TEXT_FIELDS).
+For a plain CV the rules narrow the prompt instead.
+"""
+import os
+import re
+from typing import Dict, List, NamedTuple, Optional
+
+from Utilities import PROMPT_FIELDS, ENGLISH_TEST_THRESHOLDS, european_countries
+
+DEFAULT_MIN_CONFIDENCE = 0.8
+RULE_MIN_CONFIDENCE = float(os.getenv("RULE_MIN_CONFIDENCE", DEFAULT_MIN_CONFIDENCE))
+RULE_EXTRACTION = os.getenv("RULE_EXTRACTION", "1") == "1"
+
+
+class FieldValue(NamedTuple):
+    value: str
+    confidence: float
+    source: str
+
+
+# Labels (normalized: lower case, hyphens/brackets/slashes as spaces, no "?") that introduce a field
+FIELD_LABELS = {
+    "Full-name": ["full name", "name", "applicant name", "name of applicant", "applicant"],
+    "Date-of-birth": ["date of birth", "birth date", "birthdate", "dob", "born", "born on"],
+    "Gender": ["gender", "sex"],
+    "Nationality": ["nationality", "citizenship"],
+    "Country-Contact": ["country contact", "country of residence", "current country", "country"],
+    "E-Mail": ["e mail", "email", "e mail address", "email address"],
+    "Phone-number": ["phone number", "phone", "telephone", "tel", "mobile", "mobile phone", "cell phone"],
+    "Holds-Master-Degree": ["holds master degree", "master degree", "master's degree", "masters degree"],
+    "Year-of-graduation-Master": ["year of graduation master", "master graduation year", "year of master graduation"],
+    "Languages": ["languages", "language skills"],
+    "Skills and competences": ["skills and competences", "skills", "competences"],
+    "Research Experience": ["research experience"],
+    "Holds-Doctoral-Degree": ["holds doctoral degree", "doctoral degree", "phd degree", "phd"],
+    "Fits mobility rules": ["fits mobility rules", "mobility rules", "mobility rule"],
+    "English Proficiency": ["english proficiency"],
+    "Visa required": ["visa required", "visa needed", "requires visa"],
+}
+# Languages besides English; a CEFR level after one of them is not English's
+OTHER_LANGUAGES = [
+    "german", "french", "spanish", "italian", "portuguese", "dutch", "polish", "czech", "russian",
+    "ukrainian", "greek", "turkish", "swedish", "danish", "norwegian", "finnish", "hungarian",
+    "romanian", "arabic", "hebrew", "persian", "farsi", "hindi", "urdu", "bengali", "chinese",
+    "mandarin", "cantonese", "japanese", "korean", "vietnamese", "indonesian", "swahili"
+]
+
+_LABEL_TO_FIELD = {}
+for _field in PROMPT_FIELDS:
+    for _label in FIELD_LABELS.get(_field.rstrip("?"), []):
+        _LABEL_TO_FIELD[_label] = _field
+
+# Free-text fields: a one-line labeled value in a CV is often a summary of what the
+# model finds in the whole document, so it stays below the default threshold; the
+# application form asks for exactly these answers, so there it is taken as is
+FREE_TEXT_FIELDS = {"Languages", "Skills and competences", "Research Experience"}
+FREE_TEXT_CONFIDENCE = 0.6
+FORM_FREE_TEXT_CONFIDENCE = 0.85
+
+YES_NO_FIELDS = {"Holds-Master-Degree", "Holds-Doctoral-Degree", "Fits mobility rules?",
+                 "English Proficiency?", "Visa required?"}
+
+EUROPEAN_NATIONALITIES = [
+    "austrian", "belgian", "bulgarian", "croatian", "cypriot", "czech", "danish", "estonian",
+    "finnish", "french", "german", "greek", "hungarian", "irish", "italian", "latvian",
+    "lithuanian", "luxembourgish", "maltese", "dutch", "polish", "portuguese", "romanian",
+    "slovak", "slovenian", "spanish", "swedish", "norwegian", "swiss", "icelandic", "liechtensteiner"
+]
+
+# The value ends at the line or page end; a form feed (page break in texts stored
+# before PAGE_BREAK was a marker line) never joins it with the next page
+_LABEL_LINE = re.compile(r"^[ \t•*·-]*([A-Za-z][A-Za-z' ()/-]{0,40}?)\s*\??\s*[:：][^\S\f]*(\S[^\f\n]*?)[ \t\r]*(?=\f|$)",
+                         re.MULTILINE)
+_EMAIL = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)*\.[A-Za-z]{2,}")
+_PHONE = re.compile(r"\+?\(?\d[\d\s()/.-]{6,}\d")
+_DATE = re.compile(
+    r"\b\d{4}-\d{1,2}-\d{1,2}\b"
+    r"|\b\d{1,2}[./-]\d{1,2}[./-](?:\d{4}|\d{2})\b"
+    r"|\b\d{1,2}(?:st|nd|rd|th)?\.?\s+[A-Za-z]{3,9}\.?\s+\d{4}\b"
+    r"|\b[A-Za-z]{3,9}\.?\s+\d{1,2}(?:st|nd|rd|th)?,?\s+\d{4}\b"
+)
+_YEAR = re.compile(r"\b(?:19|20)\d{2}\b")
+_NAME = re.compile(r"^[^\W\d_]+(?:[ '-][^\W\d_]+\.?){1,4}$")
+# A level belongs to English if nothing but plain words separate them: the window
+# stops at a list separator or the name of another language, and "C1 English" does
+# not count when English has its own level right after ("German C1 English B2")
+_OTHER_LANGUAGE = r"\b(?:" + "|".join(OTHER_LANGUAGES) + r")\b"
+_ENGLISH_CEFR = re.compile(
+    rf"\benglish\b(?:(?!{_OTHER_LANGUAGE})[^\n,;]){{0,40}}?\b(c1|c2)\b"
+    rf"|\b(c1|c2)\b(?:(?!{_OTHER_LANGUAGE})[^\n,;]){{0,20}}?\benglish\b(?![^\n,;]{{0,10}}?\b[abc][12]\b)",
+    re.IGNORECASE
+)
+_ENGLISH_TESTS = [
+    (re.compile(rf"\b{exam}\b[^0-9\n]{{0,30}}(\d+(?:\.\d+)?)", re.IGNORECASE), threshold)
+    for exam, threshold in ENGLISH_TEST_THRESHOLDS.items()
+]
+_EUROPEAN = re.compile(r"\b(?:" + "|".join(map(re.escape, european_countries + EUROPEAN_NATIONALITIES)) + r")\b",
+                       re.IGNORECASE)
+_YES = {"yes", "y", "true", "ja", "1"}
+_NO = {"no", "n", "false", "nein", "0"}
+_GENDERS = {"male": "Male", "m": "Male", "man": "Male", "female": "Female", "f": "Female", "woman": "Female",
+            "diverse": "Diverse", "non-binary": "Diverse", "other": "Other"}
+
+
+def _normalize_label(label: str) -> str:
+    return re.sub(r"[\s()/_-]+", " ", label.lower()).strip()
+
+
+def _labeled_value(field: str, value: str, free_text_confidence: float = FREE_TEXT_CONFIDENCE) -> Optional[FieldValue]:
+    """Validates the value given after a field's label; None if it does not fit the field."""
+    if value.lower() in ("unknown", "n/a", "na", "-", "none"):
+        return None
+    if field in YES_NO_FIELDS:
+        answer = value.lower().rstrip(".")
+        if answer in _YES:
+            return FieldValue("Yes", 0.95, "label")
+        if answer in _NO:
+            return FieldValue("No", 0.95, "label")
+        return None
+    if field == "E-Mail":
+        match = _EMAIL.search(value)
+        return FieldValue(match.group(0), 0.98, "label") if match else None
+    if field == "Phone-number":
+        match = _PHONE.search(value)
+        if match and sum(ch.isdigit() for ch in match.group(0)) >= 7:
+            return FieldValue(match.group(0).strip(), 0.95, "label")
+        return None
+    if field == "Date-of-birth":
+        match = _DATE.search(value)
+        return FieldValue(match.group(0), 0.95, "label") if match else None
+    if field == "Year-of-graduation-Master":
+        match = _YEAR.search(value)
+        return FieldValue(match.group(0), 0.9, "label") if match else None
+    if field == "Gender":
+        gender = _GENDERS.get(value.lower().rstrip("."))
+        return FieldValue(gender, 0.95, "label") if gender else None
+    if field == "Full-name":
+        return FieldValue(value, 0.9, "label") if _NAME.match(value) else None
+    if field in ("Nationality", "Country-Contact"):
+        return FieldValue(value, 0.9, "label") if len(value) <= 40 and not any(ch.isdigit() for ch in value) else None
+    # FREE_TEXT_FIELDS
+    return FieldValue(value, free_text_confidence, "label")
+
+
+def _labeled_fields(text: str, free_text_confidence: float = FREE_TEXT_CONFIDENCE) -> Dict[str, FieldValue]:
+    fields = {}
+    for match in _LABEL_LINE.finditer(text):
+        field = _LABEL_TO_FIELD.get(_normalize_label(match.group(1)))
+        if field is None or field in fields:
+            continue
+        value = _labeled_value(field, match.group(2), free_text_confidence)
+        if value is not None:
+            fields[field] = value
+    return fields
+
+
+def _english_proficiency(text: str) -> Optional[FieldValue]:
+    if _ENGLISH_CEFR.search(text):
+        return FieldValue("Yes", 0.9, "cefr level")
+    for pattern, threshold in _ENGLISH_TESTS:
+        for match in pattern.finditer(text):
+            try:
+                if float(match.group(1)) >= threshold:
+                    return FieldValue("Yes", 0.9, "test score")
+            except ValueError:
+                continue
+    return None
+
+
+def _visa_required(nationality: FieldValue) -> FieldValue:
+    if _EUROPEAN.search(nationality.value):
+        return FieldValue("No", min(nationality.confidence, 0.9), "nationality")
+    # Anything unrecognized counts as non-European, which is less certain
+    return FieldValue("Yes", min(nationality.confidence, 0.75), "nationality")
+
+
+def extract_rule_fields(pdf_text: str, word_text: str) -> Dict[str, FieldValue]:
+    """
+    Extracts the fields the CV and application state explicitly.
+
+    Labeled application-form values win over CV values; e-mail addresses, English
+    test results and the visa requirement (from the nationality) are also found
+    without labels.
+
+    Returns:
+        dict: Field name (as in PROMPT_FIELDS) -> FieldValue, only for fields found
+    """
+    pdf_text, word_text = pdf_text or "", word_text or ""
+    fields = _labeled_fields(pdf_text)
+    fields.update(_labeled_fields(word_text, FORM_FREE_TEXT_CONFIDENCE))
+    combined = f"{word_text}\n{pdf_text}"
+
+    if "E-Mail" not in fields:
+        addresses = list(dict.fromkeys(address.lower() for address in _EMAIL.findall(combined)))
+        if addresses:
+            # Several different addresses: unclear which one is the applicant's
+            fields["E-Mail"] = FieldValue(addresses[0], 0.9 if len(addresses) == 1 else 0.6, "pattern")
+
+    if "English Proficiency?" not in fields:
+        english = _english_proficiency(combined)
+        if english:
+            fields["English Proficiency?"] = english
+
+    if "Visa required?" not in fields and "Nationality" in fields:
+        fields["Visa required?"] = _visa_required(fields["Nationality"])
+    return fields
+
+
+def resolved_fields(fields: Dict[str, FieldValue], min_confidence: float = RULE_MIN_CONFIDENCE) -> Dict[str, str]:
+    """The values confident enough to skip asking the LLM, in PROMPT_FIELDS order."""
+    return {field: fields[field].value for field in PROMPT_FIELDS
+            if field in fields and fields[field].confidence >= min_confidence}
+
+
+def missing_fields(resolved: Dict[str, str]) -> List[str]:
+    return [field for field in PROMPT_FIELDS if field not in resolved]
@@ -1,5 +1,30 @@
-import os
-import sys
+"""
+The process-wide DatabaseManager.
+
+It is created on first use rather than at import, so processes that only import
+modules using it (e.g. text extraction children) never open the database or
+run the schema check. ``from shared_database import db`` still works and
+returns the shared instance.
+"""
+import threading
+from typing import Optional
 
 from database.db_manager import DatabaseManager
-db = DatabaseManager()
+
+_db: Optional[DatabaseManager] = None
+_db_lock = threading.Lock()
+
+
+def get_db() -> DatabaseManager:
+    """Returns the shared DatabaseManager, creating it on first use."""
+    global _db
+    with _db_lock:
+        if _db is None:
+            _db = DatabaseManager()
+        return _db
+
+
+def __getattr__(name):
+    if name == "db":
+        return get_db()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
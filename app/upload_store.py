@@ -0,0 +1,90 @@
+"""
+Content-addressed spool for uploaded files.
+
+Uploads are copied to disk in fixed-size chunks and stored under their SHA-256
+hash, so the same file uploaded twice is kept once and text extraction can read
+it from disk (in a child process) instead of receiving a copy of the bytes.
+Files not touched for ``UPLOAD_MAX_AGE_HOURS`` are removed by ``prune_uploads``.
+"""
+import os
+import time
+import hashlib
+import tempfile
+import logging
+from typing import BinaryIO, NamedTuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_UPLOAD_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "uploads")
+DEFAULT_MAX_AGE_HOURS = 24
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", DEFAULT_UPLOAD_DIR)
+UPLOAD_MAX_AGE_HOURS = float(os.getenv("UPLOAD_MAX_AGE_HOURS", DEFAULT_MAX_AGE_HOURS))
+
+# Bytes copied per read while spooling
+CHUNK_SIZE = 1024 * 1024
+
+
+class StoredFile(NamedTuple):
+    name: str  # original file name; decides how the file is parsed
+    file_hash: str  # SHA-256 hex digest of the contents (same as content_hash)
+    path: str
+    size: int
+
+
+def _path_for(file_hash: str, directory: str) -> str:
+    return os.path.join(directory, file_hash[:2], file_hash)
+
+
+def spool_upload(fileobj: BinaryIO, name: str, directory: str = UPLOAD_DIR) -> StoredFile:
+    """
+    Copies a file object (e.g. a Streamlit UploadedFile) into the store.
+
+    Returns:
+        StoredFile: Where the contents are stored; an existing copy is reused
+    """
+    os.makedirs(directory, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    fileobj.seek(0)
+    handle, temp_path = tempfile.mkstemp(dir=directory, suffix=".part")
+    try:
+        with os.fdopen(handle, "wb") as out:
+            for chunk in iter(lambda: fileobj.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+        file_hash = digest.hexdigest()
+        path = _path_for(file_hash, directory)
+        if os.path.exists(path):
+            os.utime(path)  # keep it from being pruned
+            os.remove(temp_path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    finally:
+        fileobj.seek(0)
+    return StoredFile(name, file_hash, path, size)
+
+
+def prune_uploads(max_age_hours: float = UPLOAD_MAX_AGE_HOURS, directory: str = UPLOAD_DIR) -> int:
+    """Removes stored files (and leftover partial copies) older than max_age_hours. Returns the count."""
+    if max_age_hours <= 0 or not os.path.isdir(directory):
+        return 0
+    cutoff = time.time() - max_age_hours * 3600
+    removed = 0
+    for root, _, names in os.walk(directory):
+        for name in names:
+            path = os.path.join(root, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+            except OSError as e:
+                logger.warning(f"Could not prune {path}: {e}")
+    if removed:
+        logger.info(f"Pruned {removed} spooled upload(s) older than {max_age_hours:g}h")
+    return removed
@@ -0,0 +1,144 @@
+"""
+Long-running extraction worker.
+
+Claims pending jobs from ``cv_extractions`` and processes them on a fixed pool of
+threads. Every claim is a single ``UPDATE ... RETURNING`` (pending -> processing),
+so several worker processes can share one SQLite file without processing a job twice.
+
+Run from the ``app`` directory:
+    python worker.py --workers 4
+"""
+import os
+import socket
+import argparse
+import logging
+import threading
+from typing import List, Optional
+
+from database.Status import Status
+from llm_client import MAX_IN_FLIGHT
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POLL_INTERVAL = 5.0
+MIN_POLL_INTERVAL = 0.5
+
+# By default run as many jobs as the LLM client lets into the server at once.
+WORKER_COUNT = int(os.getenv("WORKER_COUNT", MAX_IN_FLIGHT))
+POLL_INTERVAL = float(os.getenv("WORKER_POLL_INTERVAL", DEFAULT_POLL_INTERVAL))
+# Load the model when the worker starts instead of on the first job
+WARMUP = os.getenv("LLM_WARMUP", "1") == "1"
+
+
+class Worker:
+    def __init__(self, worker_count: int = WORKER_COUNT, poll_interval: float = POLL_INTERVAL,
+                 status: Optional[Status] = None, warmup: bool = WARMUP):
+        self.status = status or Status()
+        self.db = self.status.db
+        self.worker_count = max(1, worker_count)
+        self.poll_interval = max(MIN_POLL_INTERVAL, poll_interval)
+        self.warmup = warmup
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}"
+        self._stop_event = threading.Event()
+        self._wakeup = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def start(self) -> None:
+        """Starts the worker threads. Calling start on a running worker is a no-op."""
+        if self.is_running():
+            return
+        self._stop_event.clear()
+        if self.warmup:
+            # In the background: jobs are claimed meanwhile and simply wait for the model
+            threading.Thread(target=self.status.warmup, name=f"{self.worker_id}-warmup", daemon=True).start()
+        self._threads = [
+            threading.Thread(target=self._run_loop, name=f"{self.worker_id}-{slot}", daemon=True)
+            for slot in range(self.worker_count)
+        ]
+        for thread in self._threads:
+            thread.start()
+        logger.info(f"Worker {self.worker_id} started with {self.worker_count} threads")
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Asks all threads to finish their current job and exit."""
+        self._stop_event.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self.status.close()
+        logger.info(f"Worker {self.worker_id} stopped")
+
+    def notify(self) -> None:
+        """Wakes idle threads, e.g. right after a job was added in the same process."""
+        self._wakeup.set()
+
+    def is_running(self) -> bool:
+        return any(thread.is_alive() for thread in self._threads)
+
+    def wait(self) -> None:
+        """Blocks until the worker is stopped (Ctrl+C stops it)."""
+        try:
+            while self.is_running():
+                self._stop_event.wait(1.0)
+        except KeyboardInterrupt:
+            logger.info("Interrupted, finishing running jobs...")
+            self.stop()
+
+    def _run_loop(self) -> None:
+        idle_delay = MIN_POLL_INTERVAL
+        while not self._stop_event.is_set():
+            # The thread's name (worker_id plus its slot) owns the claim, so a job reclaimed
+            # by another thread of this worker is still told apart
+            owner = threading.current_thread().name
+            jobs = self.db.claim_next_jobs(self.status.batch_size, worker_id=owner)
+            if not jobs:
+                # Idle: back off up to poll_interval, but wake early on notify()/stop().
+                self._wakeup.wait(idle_delay)
+                self._wakeup.clear()
+                idle_delay = min(idle_delay * 2, self.poll_interval)
+                continue
+
+            idle_delay = MIN_POLL_INTERVAL
+            job_ids = [job["id"] for job in jobs]
+            try:
+                self.status.run_batch(job_ids, owner)
+            except Exception as e:
+                logger.error(f"Unexpected error in worker loop for jobs {job_ids}: {e}")
+
+
+_embedded_worker: Optional[Worker] = None
+_embedded_lock = threading.Lock()
+
+
+def start_embedded_worker(worker_count: int = WORKER_COUNT) -> Worker:
+    """Starts one in-process worker per interpreter, however often the caller re-runs."""
+    global _embedded_worker
+    with _embedded_lock:
+        if _embedded_worker is None:
+            _embedded_worker = Worker(worker_count=worker_count)
+        _embedded_worker.start()
+        return _embedded_worker
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Process pending CV extraction jobs.")
+    parser.add_argument("--workers", type=int, default=WORKER_COUNT,
+                        help=f"Number of jobs processed concurrently (default: {WORKER_COUNT})")
+    parser.add_argument("--poll-interval", type=float, default=POLL_INTERVAL,
+                        help=f"Maximum seconds between queue polls when idle (default: {POLL_INTERVAL})")
+    parser.add_argument("--no-warmup", action="store_true",
+                        help="Do not load the model before the first job")
+    parser.add_argument("--requeue-failed", action="store_true",
+                        help="Put failed and dead-lettered jobs back into the queue before starting")
+    args = parser.parse_args()
+
+    worker = Worker(worker_count=args.workers, poll_interval=args.poll_interval,
+                    warmup=WARMUP and not args.no_warmup)
+    if args.requeue_failed:
+        worker.db.requeue_jobs()
+    worker.start()
+    worker.wait()
+
+
+if __name__ == "__main__":
+    main()
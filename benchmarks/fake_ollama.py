@@ -0,0 +1,192 @@
+"""
+Local stand-in for the Ollama generate API.
+
+Answers /api/generate with a plausible extraction result after a configurable
+delay: ``latency`` seconds before the first token (prefill), then tokens at
+``token_rate`` per second, optionally preceded by a ``<think>`` block. With
+probability ``malformed_rate`` the JSON has an unquoted key, with probability
+``truncated_rate`` it is cut off before the closing brace. Streaming (NDJSON) and
+non-streaming requests, batch prompts (JSON array) and warmup requests are
+supported.
+
+Run standalone to point the app at it:
+    python benchmarks/fake_ollama.py --port 11435 --latency 0.5 --token-rate 40
+    OLLAMA_API_URL=http://127.0.0.1:11435/api/generate streamlit run app/app.py
+"""
+import re
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Characters per generated token
+TOKEN_CHARS = 4
+
+_NAME = re.compile(r"^Full name:\s*(.+)$", re.MULTILINE)
+_EMAIL = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)*\.[A-Za-z]{2,}")
+_APPLICANTS = re.compile(r"There are (\d+) applicants")
+_REQUESTED_FIELDS = re.compile(r'^- "([^"]+)"$', re.MULTILINE)
+
+
+class FakeOllama:
+    def __init__(self, latency: float = 0.2, token_rate: float = 200.0, malformed_rate: float = 0.0,
+                 truncated_rate: float = 0.0, think_tokens: int = 0, seed: int = 0,
+                 host: str = "127.0.0.1", port: int = 0):
+        self.latency = latency
+        self.token_rate = token_rate
+        self.malformed_rate = malformed_rate
+        self.truncated_rate = truncated_rate
+        self.think_tokens = think_tokens
+        self.requests = 0
+        self.aborted = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/api/generate"
+
+    def start(self) -> "FakeOllama":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-ollama", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _answer(self, prompt: str) -> str:
+        """Builds the response text for a prompt (extraction result, maybe broken)."""
+        with self._lock:
+            malformed = self._random.random() < self.malformed_rate
+            truncated = self._random.random() < self.truncated_rate
+
+        def record(name: str, email: str, number=None) -> dict:
+            data = {"Applicant": number} if number is not None else {}
+            fields = _REQUESTED_FIELDS.findall(prompt.split("CV TEXT:", 1)[0]) or [
+                "Full-name", "Date-of-birth", "Nationality", "E-Mail", "Holds-Master-Degree",
+                "Languages", "English Proficiency?", "Visa required?"]
+            for field in fields:
+                data[field] = "Unknown"
+            data.update({"Full-name": name, "E-Mail": email})
+            return data
+
+        names = _NAME.findall(prompt) or ["Test Applicant"]
+        emails = _EMAIL.findall(prompt) or ["unknown@example.org"]
+        batch = _APPLICANTS.search(prompt)
+        if batch:
+            count = int(batch.group(1))
+            answer = json.dumps([
+                record(names[i % len(names)], emails[i % len(emails)], i + 1) for i in range(count)
+            ], indent=2)
+        else:
+            answer = json.dumps(record(names[0], emails[0]), indent=2)
+
+        if malformed:
+            answer = answer.replace('"E-Mail"', "E-Mail", 1)
+        if truncated:
+            # As when a model hits its output limit
+            answer = answer[:-10]
+        if self.think_tokens:
+            answer = "<think>\n" + "hmm " * self.think_tokens + "\n</think>\n" + answer
+        return answer
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                with fake._lock:
+                    fake.requests += 1
+                prompt = body.get("prompt", "")
+                if not prompt.strip():
+                    # Warmup / model load request
+                    self._send_json({"model": body.get("model"), "response": "", "done": True})
+                    return
+
+                answer = fake._answer(f"{body.get('system', '')}\n{prompt}")
+                time.sleep(fake.latency)
+                if body.get("stream", True):
+                    self._stream(body, answer)
+                else:
+                    time.sleep(len(answer) / TOKEN_CHARS / fake.token_rate)
+                    self._send_json({"model": body.get("model"), "response": answer, "done": True})
+
+            def _send_json(self, payload: dict) -> None:
+                data = json.dumps(payload).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _stream(self, body: dict, answer: str) -> None:
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                delay = 1.0 / fake.token_rate
+                try:
+                    for start in range(0, len(answer), TOKEN_CHARS):
+                        self._chunk({"model": body.get("model"), "response": answer[start:start + TOKEN_CHARS],
+                                     "done": False})
+                        time.sleep(delay)
+                    self._chunk({"model": body.get("model"), "response": "", "done": True})
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    # Client stopped reading (early stop on complete JSON)
+                    with fake._lock:
+                        fake.aborted += 1
+                    self.close_connection = True
+
+            def _chunk(self, payload: dict) -> None:
+                data = json.dumps(payload).encode() + b"\n"
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                self.wfile.flush()
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a fake Ollama generate API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds before the first token")
+    parser.add_argument("--token-rate", type=float, default=200.0, help="Generated tokens per second")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="Share of responses with an unquoted key")
+    parser.add_argument("--truncated-rate", type=float, default=0.0, help="Share of responses cut off early")
+    parser.add_argument("--think-tokens", type=int, default=0, help="Length of a <think> block before the JSON")
+    args = parser.parse_args()
+
+    server = FakeOllama(latency=args.latency, token_rate=args.token_rate, malformed_rate=args.malformed_rate,
+                        truncated_rate=args.truncated_rate, think_tokens=args.think_tokens,
+                        host=args.host, port=args.port)
+    print(f"Fake Ollama listening on {server.url}")
+    server.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
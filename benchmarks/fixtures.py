@@ -0,0 +1,152 @@
+"""
+Synthetic CV and application documents for the benchmarks.
+
+PDFs are written by hand (one Helvetica text stream per page) so no PDF library
+beyond the one under test is needed; DOCX files are written with python-docx.
+Content is generated from a seed, so every run parses the same documents.
+"""
+import io
+import random
+from typing import List
+
+import docx
+
+FIRST_NAMES = ["Anna", "Jonas", "Maria", "Luca", "Sofia", "Mehmet", "Chen", "Priya", "Olga", "Tomas"]
+LAST_NAMES = ["Schmidt", "Rossi", "Kowalski", "Novak", "Garcia", "Yilmaz", "Wang", "Sharma", "Ivanova", "Dubois"]
+NATIONALITIES = ["German", "Italian", "Polish", "Czech", "Spanish", "Turkish", "Chinese", "Indian", "Russian", "French"]
+SKILLS = ["Python", "R", "SQL", "Nextflow", "PyTorch", "Docker", "statistics", "NLP", "ontologies", "GWAS"]
+TOPICS = ["single-cell transcriptomics", "knowledge graphs", "clinical NLP", "protein structure prediction",
+          "federated learning", "variant calling", "neuroimaging", "drug repurposing"]
+
+# Pages per synthetic CV for each fixture size
+SIZES = {"small": 1, "medium": 4, "large": 20}
+
+
+def _pdf_escape(line: str) -> str:
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_pdf(pages: List[List[str]]) -> bytes:
+    """Builds a minimal PDF with one text line per entry of each page."""
+    objects = []
+
+    def add(body: bytes) -> int:
+        objects.append(body)
+        return len(objects)
+
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    pages_id = len(pages) * 2 + 2
+    page_ids = []
+    for lines in pages:
+        text = "BT /F1 10 Tf 12 TL 40 800 Td " + " ".join(f"({_pdf_escape(line)}) '" for line in lines) + " ET"
+        content = add(b"<< /Length %d >>\nstream\n" % len(text) + text.encode("latin-1") + b"\nendstream")
+        page_ids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 595 842] /Contents %d 0 R "
+            b"/Resources << /Font << /F1 %d 0 R >> >> >>" % (pages_id, content, font)
+        ))
+    kids = b" ".join(b"%d 0 R" % page_id for page_id in page_ids)
+    add(b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_ids)))
+    catalog = add(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id)
+
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog, xref)
+    return out
+
+
+def make_docx(paragraphs: List[str]) -> bytes:
+    document = docx.Document()
+    for paragraph in paragraphs:
+        document.add_paragraph(paragraph)
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+
+class Applicant:
+    def __init__(self, seed: int):
+        rng = random.Random(seed)
+        self.rng = rng
+        self.first_name = rng.choice(FIRST_NAMES)
+        self.last_name = rng.choice(LAST_NAMES)
+        self.full_name = f"{self.first_name} {self.last_name}"
+        self.nationality = rng.choice(NATIONALITIES)
+        self.email = f"{self.first_name.lower()}.{self.last_name.lower()}{seed}@example.org"
+        self.birth_year = rng.randint(1985, 2000)
+        self.master_year = self.birth_year + rng.randint(23, 27)
+
+    def cv_pages(self, page_count: int) -> List[List[str]]:
+        rng = self.rng
+        header = f"{self.full_name} - Curriculum Vitae"
+        first = [
+            header,
+            "Personal",
+            f"Email: {self.email}",
+            f"Nationality: {self.nationality}",
+            f"Born {rng.randint(1, 28)}.{rng.randint(1, 12)}.{self.birth_year}",
+            "",
+            "Education",
+            f"MSc Bioinformatics, {self.master_year}",
+            f"BSc Computer Science, {self.master_year - 2}",
+            "",
+            "Languages",
+            f"English {rng.choice(['B2', 'C1', 'C2'])}, {self.nationality} native",
+        ]
+        pages = [first]
+        for number in range(1, page_count):
+            lines = [header, "Research Experience" if number == 1 else "Publications"]
+            for _ in range(45):
+                topic = rng.choice(TOPICS)
+                lines.append(f"{rng.randint(2015, 2024)}: work on {topic} using {rng.choice(SKILLS)} and {rng.choice(SKILLS)}")
+            lines.append(f"Page {number + 1} of {page_count}")
+            pages.append(lines)
+        return pages
+
+    def cv_pdf(self, page_count: int) -> bytes:
+        return make_pdf(self.cv_pages(page_count))
+
+    def application_paragraphs(self) -> List[str]:
+        rng = self.rng
+        return [
+            f"Full name: {self.full_name}",
+            f"E-Mail: {self.email}",
+            f"Nationality: {self.nationality}",
+            f"Holds Master Degree: {rng.choice(['yes', 'no'])}",
+            "Motivation",
+            f"I would like to join the network to work on {rng.choice(TOPICS)}. " * rng.randint(3, 10),
+        ]
+
+    def application_docx(self) -> bytes:
+        return make_docx(self.application_paragraphs())
+
+    def application_text(self) -> str:
+        return "\n".join(self.application_paragraphs())
+
+    def cv_text(self, page_count: int) -> str:
+        return "\f".join("\n".join(lines) for lines in self.cv_pages(page_count))
+
+    def expected_json(self) -> dict:
+        return {
+            "Full-name": self.full_name,
+            "Date-of-birth": "Unknown",
+            "Gender": "Unknown",
+            "Nationality": self.nationality,
+            "Country-Contact": "Unknown",
+            "E-Mail": self.email,
+            "Phone-number": "Unknown",
+            "Holds-Master-Degree": "Yes",
+            "Year-of-graduation-Master": str(self.master_year),
+            "Languages": "English",
+            "Skills and competences": ", ".join(SKILLS[:3]),
+            "Research Experience": "Yes",
+            "Holds-Doctoral-Degree": "No",
+            "Fits mobility rules?": "Yes",
+            "English Proficiency?": "Yes",
+            "Visa required?": "No"
+        }
@@ -0,0 +1,155 @@
+"""
+Fuzz test for the JSON extraction of LLM responses (app/json_repair.py).
+
+Feeds extract_json random mutations of real-looking answers and hand-made
+pathological inputs (deep nesting, thousands of stray braces, unterminated
+strings, backslash runs, long <think> blocks) and fails if any call raises,
+returns something other than a dict or None, or takes longer than the time
+bound. Each call runs under an interval timer, so a catastrophic case is
+stopped and reported instead of hanging the run:
+    python benchmarks/fuzz_json.py
+    python benchmarks/fuzz_json.py --iterations 20000 --seed 7 --max-seconds 0.2
+"""
+import os
+import sys
+import json
+import time
+import random
+import signal
+import argparse
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCHMARKS_DIR), "app"))
+sys.path.insert(0, BENCHMARKS_DIR)
+
+from fixtures import Applicant  # noqa: E402
+from json_repair import extract_json  # noqa: E402
+
+# Characters that matter to the scanner and the repair pass
+SYNTAX = '{}[]",:\'\\ \n'
+# Size of the pathological inputs (characters); far more than a model answers with
+PATHOLOGICAL_SIZE = 100_000
+
+
+class CallTimeout(Exception):
+    pass
+
+
+def _on_alarm(signum, frame):
+    raise CallTimeout()
+
+
+def pathological_inputs(size: int):
+    """Named inputs that break backtracking or quadratic parsers."""
+    record = json.dumps(Applicant(seed=3).expected_json(), indent=2)
+    return {
+        "open_braces": "{" * size,
+        "close_braces": "}" * size,
+        "alternating_braces": "{}" * (size // 2),
+        "deep_nesting": '{"a":' * (size // 5) + "1" + "}" * (size // 5),
+        "deep_arrays": '{"a":' + "[" * size,
+        "unterminated_string": '{"a": "' + "x" * size,
+        "backslashes": '{"a": "' + "\\" * size + '"}',
+        "quotes": '{"a": ' + '"' * size,
+        "unquoted_key_no_colon": "{" + "a" * size,
+        "stray_commas": "{" + "," * size + "}",
+        "braces_in_prose": "Let me think {about} this {case " * (size // 30) + record,
+        "think_with_braces": "<think>" + "{ draft " * (size // 8) + "</think>" + record,
+        "unclosed_think": "<think>" + "{" * size,
+        "nested_truncated": '{"x": {"y": {"z": "' + "w" * size,
+        "many_small_objects": '{"a": 1} ' * (size // 9),
+        "single_quotes": "{" + "'a': 'b', " * (size // 10),
+        "truncated_record": (record * (size // len(record)))[:-7],
+    }
+
+
+def mutate(text: str, rng: random.Random) -> str:
+    chars = list(text)
+    for _ in range(rng.randint(1, 8)):
+        action = rng.random()
+        position = rng.randrange(len(chars) + 1)
+        if action < 0.3 and chars:
+            del chars[min(position, len(chars) - 1)]
+        elif action < 0.6:
+            chars.insert(position, rng.choice(SYNTAX))
+        elif action < 0.8:
+            chars[position:position] = rng.choice(SYNTAX) * rng.randint(2, 200)
+        else:
+            chars = chars[:position]  # truncation
+    return "".join(chars)
+
+
+def random_response(rng: random.Random) -> str:
+    record = json.dumps(Applicant(seed=rng.randrange(10_000)).expected_json(), indent=rng.choice([None, 2]))
+    parts = []
+    if rng.random() < 0.3:
+        parts.append("<think>" + mutate("Checking {the} CV for " * rng.randint(1, 50), rng) + "</think>")
+    if rng.random() < 0.3:
+        parts.append("Here is the result:\n```json\n")
+    parts.append(mutate(record, rng) if rng.random() < 0.8 else record)
+    return "".join(parts)
+
+
+def check(name: str, text: str, max_seconds: float, failures: list) -> float:
+    """Runs extract_json on text under the time bound; records failures. Returns the seconds taken."""
+    use_timer = hasattr(signal, "setitimer")
+    if use_timer:
+        signal.setitimer(signal.ITIMER_REAL, max_seconds * 10)
+    started = time.perf_counter()
+    try:
+        result = extract_json(text)
+        if result.data is not None and not isinstance(result.data, dict):
+            failures.append((name, f"returned {type(result.data).__name__}"))
+    except CallTimeout:
+        failures.append((name, f"stopped after {max_seconds * 10:.1f}s"))
+    except Exception as e:
+        failures.append((name, f"{type(e).__name__}: {e}"))
+    finally:
+        if use_timer:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+    seconds = time.perf_counter() - started
+    if seconds > max_seconds and not (failures and failures[-1][0] == name):
+        failures.append((name, f"took {seconds:.3f}s (bound {max_seconds}s, {len(text)} chars)"))
+    return seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fuzz the JSON extraction of LLM responses.")
+    parser.add_argument("--iterations", type=int, default=5000, help="Random mutated responses")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-seconds", type=float, default=0.5,
+                        help=f"Time bound per call, also for the {PATHOLOGICAL_SIZE}-character inputs")
+    args = parser.parse_args()
+
+    if hasattr(signal, "SIGALRM"):
+        signal.signal(signal.SIGALRM, _on_alarm)
+    failures = []
+
+    slowest = (0.0, None)
+    for name, text in pathological_inputs(PATHOLOGICAL_SIZE).items():
+        seconds = check(name, text, args.max_seconds, failures)
+        # Twice the input gets twice the bound: linear, not quadratic, growth passes
+        doubled = check(f"{name} (x2)", text + text, args.max_seconds * 2, failures)
+        print(f"{name:24} {seconds * 1000:8.1f} ms   x2: {doubled * 1000:8.1f} ms")
+        slowest = max(slowest, (seconds, name))
+
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    for iteration in range(args.iterations):
+        text = random_response(rng)
+        seconds = check(f"random #{iteration}", text, args.max_seconds, failures)
+        if failures and failures[-1][0] == f"random #{iteration}":
+            print(f"Failing input #{iteration}: {text[:200]!r}")
+        slowest = max(slowest, (seconds, f"random #{iteration}"))
+    print(f"{args.iterations} random responses in {time.perf_counter() - started:.1f}s, "
+          f"slowest call {slowest[0] * 1000:.1f} ms ({slowest[1]})")
+
+    if failures:
+        for name, reason in failures:
+            print(f"FAIL {name}: {reason}")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+"""
+Benchmarks for the intake -> LLM -> Excel pipeline.
+
+Measures each stage on its own and the whole pipeline against the fake Ollama
+server, and writes the results as JSON so runs can be compared over time:
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --quick --only pdf json
+    python benchmarks/run_benchmarks.py --jobs 50 --latency 0.5 --malformed-rate 0.1
+
+Nothing outside a temporary directory is written except the results file; the
+app's database and Excel export are not touched.
+"""
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import platform
+import statistics
+import tempfile
+from datetime import datetime
+from typing import Callable, Dict, List
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(os.path.dirname(BENCHMARKS_DIR), "app")
+RESULTS_DIR = os.path.join(BENCHMARKS_DIR, "results")
+sys.path.insert(0, APP_DIR)
+sys.path.insert(0, BENCHMARKS_DIR)
+
+from fixtures import Applicant, SIZES  # noqa: E402
+from fake_ollama import FakeOllama  # noqa: E402
+
+TEMPLATE_PATH = os.path.join(APP_DIR, "extractions", "ExcelTemplate.xlsx")
+EXCEL_ROW_COUNTS = [10, 100, 1000]
+
+
+def measure(func: Callable[[], object], repeat: int, warmup: int = 1) -> Dict[str, float]:
+    """Runs func warmup + repeat times and returns timing statistics in milliseconds."""
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        "runs": repeat,
+        "min_ms": round(samples[0], 3),
+        "median_ms": round(statistics.median(samples), 3),
+        "mean_ms": round(statistics.fmean(samples), 3),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+        "max_ms": round(samples[-1], 3),
+    }
+
+
+def bench_pdf(args) -> Dict[str, dict]:
+    from Utilities import extract_text_from_pdf
+
+    results = {}
+    for size, pages in SIZES.items():
+        data = Applicant(seed=pages).cv_pdf(pages)
+        stats = measure(lambda: extract_text_from_pdf(io.BytesIO(data)), repeat=args.repeat)
+        stats.update(pages=pages, bytes=len(data))
+        results[size] = stats
+    return results
+
+
+def bench_json(args) -> Dict[str, dict]:
+    from Utilities import get_json
+
+    record = json.dumps(Applicant(seed=1).expected_json(), indent=2)
+    responses = {
+        "clean": record,
+        "fenced": f"Here you go:\n```json\n{record}\n```",
+        "think": "<think>\n" + "Let me look at the CV {maybe}. " * 500 + "\n</think>\n" + record,
+        "trailing_comma": record[:-2] + ",\n}",
+        "malformed": record.replace('"E-Mail"', "E-Mail", 1),
+        "large_prose": "The applicant " * 20000 + record,
+    }
+    return {name: dict(measure(lambda: get_json(text), repeat=args.repeat), chars=len(text))
+            for name, text in responses.items()}
+
+
+def _prefilled_export(path: str, rows: int) -> None:
+    from excel_export import ExcelBatchWriter
+
+    writer = ExcelBatchWriter(TEMPLATE_PATH, path, max_batch=rows + 1, max_delay=0)
+    for seed in range(rows):
+        writer.add(Applicant(seed=seed).expected_json())
+    writer.close()
+
+
+def bench_excel(args, workdir: str) -> Dict[str, dict]:
+    from Utilities import inject_standardized_json_to_excel
+    from excel_export import ExcelBatchWriter
+
+    logging.getLogger("myapp").setLevel(logging.WARNING)
+    logging.getLogger("excel_export").setLevel(logging.WARNING)
+    record = Applicant(seed=12345).expected_json()
+    results = {}
+    for rows in EXCEL_ROW_COUNTS[:2] if args.quick else EXCEL_ROW_COUNTS:
+        base = os.path.join(workdir, f"export_{rows}.xlsx")
+        _prefilled_export(base, rows)
+        target = os.path.join(workdir, f"export_{rows}_run.xlsx")
+        shutil.copy(base, target)
+        single = measure(lambda: inject_standardized_json_to_excel(record, TEMPLATE_PATH, target),
+                         repeat=max(3, args.repeat // 10))
+
+        # The batch writer saves once per batch; report the cost per row
+        batch_size = 20
+        shutil.copy(base, target)
+        writer = ExcelBatchWriter(TEMPLATE_PATH, target, max_batch=batch_size + 1, max_delay=0)
+
+        def batch():
+            for _ in range(batch_size):
+                writer.add(record)
+            writer.flush()
+
+        batched = measure(batch, repeat=max(3, args.repeat // 10))
+        writer.close()
+        results[f"{rows}_rows"] = {
+            "existing_rows": rows,
+            "inject_single": single,
+            "batch_writer_per_row_ms": round(batched["median_ms"] / batch_size, 3),
+        }
+    return results
+
+
+def bench_end_to_end(args, workdir: str) -> Dict[str, object]:
+    # The app modules read their configuration at import time
+    os.environ["CV_DB_PATH"] = os.path.join(workdir, "bench.db")
+    # database.Status creates the export when imported
+    os.environ["OUTPUT_EXCEL_PATH"] = os.path.join(workdir, "end_to_end.xlsx")
+    os.environ.setdefault("LLM_MAX_IN_FLIGHT", str(args.concurrency))
+    logging.disable(logging.INFO)
+
+    from llm_client import LLMClient
+    from database.Status import Status
+
+    with FakeOllama(latency=args.latency, token_rate=args.token_rate, malformed_rate=args.malformed_rate,
+                    truncated_rate=args.truncated_rate, think_tokens=args.think_tokens).start() as server:
+        llm = LLMClient(api_url=server.url, max_in_flight=args.concurrency, max_retries=0)
+        # One attempt per job: a retry would wait out its backoff after the sweep ended
+        status = Status(llm=llm, bypass_cache=True, batch_size=args.batch_size, max_attempts=1)
+
+        applicants = [Applicant(seed=seed) for seed in range(args.jobs)]
+        status.db.add_jobs([{
+            "pdf_filename": f"cv_{index}.pdf",
+            "word_filename": f"application_{index}.docx",
+            "pdf_content": applicant.cv_text(SIZES["medium"]),
+            "word_content": applicant.application_text()
+        } for index, applicant in enumerate(applicants)])
+
+        started = time.perf_counter()
+        status.process_all_pending_jobs()
+        seconds = time.perf_counter() - started
+        requests_sent = server.requests
+
+    counts = {state: status.db.count_extractions(status=state) for state in ("done", "failed", "dead_letter")}
+    logging.disable(logging.NOTSET)
+    return {
+        "jobs": args.jobs,
+        "seconds": round(seconds, 3),
+        "jobs_per_minute": round(args.jobs / seconds * 60, 2),
+        "done": counts["done"],
+        "failed": counts["failed"] + counts["dead_letter"],
+        "llm_requests": requests_sent,
+        "settings": {
+            "latency": args.latency,
+            "token_rate": args.token_rate,
+            "malformed_rate": args.malformed_rate,
+            "truncated_rate": args.truncated_rate,
+            "think_tokens": args.think_tokens,
+            "concurrency": args.concurrency,
+            "batch_size": args.batch_size,
+        },
+    }
+
+
+BENCHMARKS = {
+    "pdf": lambda args, workdir: bench_pdf(args),
+    "json": lambda args, workdir: bench_json(args),
+    "excel": bench_excel,
+    "end_to_end": bench_end_to_end,
+}
+
+
+def run(args) -> dict:
+    selected: List[str] = args.only or list(BENCHMARKS)
+    results = {
+        "started": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "quick": args.quick,
+        "benchmarks": {},
+    }
+    with tempfile.TemporaryDirectory(prefix="cv-bench-") as workdir:
+        for name in selected:
+            print(f"Running {name}...", flush=True)
+            started = time.perf_counter()
+            results["benchmarks"][name] = BENCHMARKS[name](args, workdir)
+            print(f"  {name} finished in {time.perf_counter() - started:.1f}s", flush=True)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the CV extraction pipeline.")
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), help="Run only these benchmarks")
+    parser.add_argument("--quick", action="store_true", help="Fewer repetitions and jobs, skip 1000-row Excel")
+    parser.add_argument("--repeat", type=int, default=50, help="Repetitions per component measurement")
+    parser.add_argument("--jobs", type=int, default=40, help="Jobs in the end-to-end run")
+    parser.add_argument("--concurrency", type=int, default=2, help="LLM requests in flight (end-to-end)")
+    parser.add_argument("--batch-size", type=int, default=1, help="Applicants per LLM request (end-to-end)")
+    parser.add_argument("--latency", type=float, default=0.2, help="Fake server seconds to first token")
+    parser.add_argument("--token-rate", type=float, default=200.0, help="Fake server tokens per second")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="Fake server share of unquoted-key JSON")
+    parser.add_argument("--truncated-rate", type=float, default=0.0, help="Fake server share of cut-off JSON")
+    parser.add_argument("--think-tokens", type=int, default=0, help="Fake server <think> block length")
+    parser.add_argument("--output", help="Results file (default: benchmarks/results/<timestamp>.json)")
+    args = parser.parse_args()
+    if args.quick:
+        args.repeat = min(args.repeat, 10)
+        args.jobs = min(args.jobs, 10)
+
+    results = run(args)
+    output = args.output or os.path.join(RESULTS_DIR, f"{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(json.dumps(results["benchmarks"], indent=2))
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()